@@ -8,6 +8,7 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
+from executors import auth_pool, run_in_pool
 
 # JWT Configuration
 SECRET_KEY = "your_generated_secret_here"  # Replace with your actual secret
@@ -20,6 +21,7 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 class Token(BaseModel):
     access_token: str
@@ -35,6 +37,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the auth pool; bcrypt takes hundreds of ms."""
+    return await run_in_pool(auth_pool, verify_password, plain_password, hashed_password)
+
 def create_token(data: dict, expires_delta: timedelta) -> str:
     # Create header
     header = {
@@ -108,4 +114,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except ValueError:
         raise credentials_exception
     
-    return token_data.email 
\ No newline at end of file
+    return token_data.email 
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[str]:
+    """The user for a bearer token, or None without one; a bad token is
+    still rejected."""
+    if token is None:
+        return None
+    return await get_current_user(token)
@@ -0,0 +1,172 @@
+"""Several GET endpoints answered in one round trip.
+
+POST /batch takes sub-requests such as
+
+    {"requests": [{"id": "market", "path": "/market/analysis", "params": {"classes": "crypto"}},
+                  {"path": "/signals"}, {"path": "/users/me"}]}
+
+and answers each against the same snapshot version. The token is checked
+and the snapshot looked up once for the whole batch. Snapshot-derived
+sub-responses reuse the JSON bodies the single endpoints cache per
+version, and are spliced into the batch body without being parsed or
+re-serialized.
+
+Each sub-request is resolved in two steps. On the event loop, its
+parameters are validated and demand is recorded; this step returns a
+builder. All builders then run together in one CPU pool call.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from charts import CHART_RANGES, MAX_CHART_POINTS
+from copy_trade import get_available_traders
+from executors import run_cpu
+from market import chart_version, get_chart, record_demand
+from responses import snapshot_bodies
+from signals import get_snapshot_signals
+from snapshot import MarketProjection, MarketSnapshot
+from wire import encode_json
+
+MAX_BATCH_REQUESTS = 16
+
+
+class BatchContext(NamedTuple):
+    snapshot: MarketSnapshot
+    # None when the batch carried no bearer token
+    user: Optional[str]
+
+
+class RawJSON(bytes):
+    """A body that is already JSON, spliced into the batch as is."""
+
+
+# Builders run on the CPU pool and return a JSON-serializable value or RawJSON
+Builder = Callable[[], Any]
+BatchHandler = Callable[[BatchContext, Dict[str, Any]], Builder]
+
+
+def _cached_json(name: str, snapshot: MarketSnapshot, build: Callable[[MarketSnapshot], Any],
+                 version: Optional[int] = None) -> RawJSON:
+    return RawJSON(snapshot_bodies.get(name, snapshot, build, version=version).body)
+
+
+def _bool_param(params: Dict[str, Any], name: str, default: Optional[bool]) -> Optional[bool]:
+    value = params.get(name, default)
+    if isinstance(value, str):
+        if value.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f"{name} must be true or false")
+        return value.lower() in ('true', '1')
+    return value if value is None else bool(value)
+
+
+def _market(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    record_demand()
+    return lambda: _cached_json('market', ctx.snapshot, MarketSnapshot.as_dict)
+
+
+def _market_analysis(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    projection = MarketProjection.from_query(
+        params.get('classes'), params.get('symbols'), params.get('fields'),
+        _bool_param(params, 'charts', True), _bool_param(params, 'all', None),
+    )
+    record_demand(projection.classes)
+    return lambda: _cached_json(projection.key, ctx.snapshot, lambda snapshot: snapshot.project(projection))
+
+
+def _market_chart(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    asset_class, symbol = params.get('asset_class'), params.get('symbol')
+    range_ = params.get('range', '1m')
+    if not asset_class or not symbol:
+        raise ValueError("asset_class and symbol are required")
+    if range_ not in CHART_RANGES:
+        raise ValueError(f"range must be one of {', '.join(CHART_RANGES)}")
+    try:
+        points = int(params.get('points', 100))
+    except (TypeError, ValueError):
+        raise ValueError("points must be an integer")
+    if not 2 <= points <= MAX_CHART_POINTS:
+        raise ValueError(f"points must be between 2 and {MAX_CHART_POINTS}")
+    return lambda: _cached_json(f'chart-{asset_class}-{symbol}-{range_}-{points}', ctx.snapshot,
+                                lambda _: get_chart(asset_class, symbol, range_, points),
+                                chart_version(asset_class, symbol))
+
+
+def _signals(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    return lambda: _cached_json('signals', ctx.snapshot, get_snapshot_signals)
+
+
+def _traders(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    return get_available_traders
+
+
+def _users_me(ctx: BatchContext, params: Dict[str, Any]) -> Builder:
+    if ctx.user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return lambda: {'email': ctx.user}
+
+
+BATCH_HANDLERS: Dict[str, BatchHandler] = {
+    '/': _market,
+    '/market/analysis': _market_analysis,
+    '/market/chart': _market_chart,
+    '/signals': _signals,
+    '/copy-trade/traders': _traders,
+    '/users/me': _users_me,
+}
+
+
+def _error(status_code: int, detail: str) -> Tuple[int, Any]:
+    return status_code, {'detail': detail}
+
+
+def _resolve(ctx: BatchContext, path: str, params: Dict[str, Any]) -> Tuple[int, Any]:
+    """(status, builder) for a sub-request, or (status, error body)."""
+    handler = BATCH_HANDLERS.get(path)
+    if handler is None:
+        return _error(status.HTTP_404_NOT_FOUND, f"{path} cannot be batched")
+    try:
+        return status.HTTP_200_OK, handler(ctx, params)
+    except HTTPException as e:
+        return _error(e.status_code, e.detail)
+    except ValueError as e:
+        return _error(status.HTTP_400_BAD_REQUEST, str(e))
+
+
+def _build_all(resolved: List[Tuple[Optional[str], int, Any]]) -> List[Tuple[Optional[str], int, Any]]:
+    results = []
+    for request_id, status_code, value in resolved:
+        if status_code == status.HTTP_200_OK:
+            try:
+                value = value()
+            except KeyError as e:
+                status_code, value = _error(status.HTTP_404_NOT_FOUND, str(e).strip("'"))
+            except Exception as e:
+                print(f"Batch sub-request {request_id} failed: {e}")
+                status_code, value = _error(status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal error")
+        results.append((request_id, status_code, value))
+    return results
+
+
+def _encode_item(request_id: Optional[str], status_code: int, value: Any) -> bytes:
+    body = bytes(value) if isinstance(value, RawJSON) else encode_json(value)
+    return b''.join((b'{"id":', encode_json(request_id), b',"status":',
+                     str(status_code).encode(), b',"body":', body, b'}'))
+
+
+def _encode(snapshot: MarketSnapshot, results: List[Tuple[Optional[str], int, Any]]) -> bytes:
+    return b''.join((
+        b'{"version":', str(snapshot.version).encode(), b',"responses":[',
+        b','.join(_encode_item(*result) for result in results),
+        b']}',
+    ))
+
+
+def _build_and_encode(snapshot: MarketSnapshot, resolved: List[Tuple[Optional[str], int, Any]]) -> bytes:
+    return _encode(snapshot, _build_all(resolved))
+
+
+async def run_batch(ctx: BatchContext, requests: List[Tuple[Optional[str], str, Dict[str, Any]]]) -> bytes:
+    """The JSON body answering (id, path, params) sub-requests, in order."""
+    resolved = [(request_id, *_resolve(ctx, path, params)) for request_id, path, params in requests]
+    return await run_cpu(_build_and_encode, ctx.snapshot, resolved)
@@ -0,0 +1,54 @@
+"""Cost of a chart request by range, with and without the LTTB pyramid.
+
+For a 20,000 bar history, compares a direct LTTB pass over the bars in
+range against ChartPyramid.query, and times appending one bar to the
+pyramid.
+
+Run from the backend directory:
+
+    python benchmarks/chart_benchmark.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from charts import ChartPyramid, lttb
+
+BARS = 20000
+POINTS = 100
+# Bars in range, standing in for 1d .. all at one bar per minute
+RANGES = {'1d': 1440, '1w': 10080, 'all': BARS}
+
+
+def bench(func, number: int = 20) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    rng = np.random.default_rng(0)
+    ts = np.arange(BARS, dtype=np.int64) * 60
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, BARS)))
+    pyramid = ChartPyramid(ts, closes)
+
+    print(f"{'range':>6} {'bars':>7} {'direct ms':>10} {'pyramid ms':>11}")
+    for name, bars in RANGES.items():
+        start = int(ts[-bars])
+        direct = bench(lambda: lttb(ts[-bars:], closes[-bars:], POINTS))
+        pyramid_time = bench(lambda: pyramid.query(start, POINTS))
+        print(f'{name:>6} {bars:>7} {direct * 1e3:>10.2f} {pyramid_time * 1e3:>11.2f}')
+
+    state = {'ts': int(ts[-1])}
+
+    def append_bar():
+        state['ts'] += 60
+        pyramid.extend(np.array([state['ts']]), np.array([closes[-1]]))
+
+    print(f'append one bar: {bench(append_bar, number=200) * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Event loop lag while the API serves logins and market polls.
+
+Sends concurrent /token logins mixed with /market/analysis polls through
+the ASGI app in-process and reports loop lag from LoopLagMonitor, for:
+
+- inline: the old handler, hashing and verifying bcrypt on the loop
+- pooled: the current handler, verifying on the auth pool against the
+  hash computed at startup
+
+Run from the backend directory:
+
+    python benchmarks/loop_lag_benchmark.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ALPHA_VANTAGE_API_KEY', 'demo')
+
+import httpx
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi import Depends, HTTPException
+
+import main
+from auth import get_password_hash, verify_password
+from executors import LoopLagMonitor
+
+LOGINS = 20
+POLLS = 200
+CREDENTIALS = {'username': 'test@example.com', 'password': 'password123'}
+
+
+@main.app.post('/benchmark/token-inline')
+async def inline_login(form_data: OAuth2PasswordRequestForm = Depends()):
+    hashed = get_password_hash('password123')
+    if form_data.username != 'test@example.com' or not verify_password(form_data.password, hashed):
+        raise HTTPException(status_code=401)
+    return {'ok': True}
+
+
+async def run(client: httpx.AsyncClient, login_path: str):
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    monitor.reset()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client.post(login_path, data=CREDENTIALS) for _ in range(LOGINS)),
+        *(client.get('/market/analysis') for _ in range(POLLS)),
+    )
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return elapsed, monitor.stats()
+
+
+async def amain():
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            await client.get('/market/analysis')
+            print(f"{'handler':>8} {'total s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+            for name, path in (('inline', '/benchmark/token-inline'), ('pooled', '/token')):
+                elapsed, stats = await run(client, path)
+                print(f"{name:>8} {elapsed:>8.2f} {stats['p50_ms']:>11.1f} {stats['p99_ms']:>11.1f} "
+                      f"{stats['max_ms']:>11.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(amain())
@@ -0,0 +1,89 @@
+"""Cost per symbol of parsing an Alpha Vantage daily series.
+
+Compares, as the history grows:
+
+- legacy: the original per-symbol parse (latest price, change, 24 closes)
+- full: parse_time_series converting the whole history to OHLCV columns
+- incremental: parse_time_series(since=...) converting only the new bar,
+  which is what a refresh against the store does
+
+Run from the backend directory:
+
+    python benchmarks/parse_benchmark.py
+"""
+from datetime import date, timedelta
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from parsing import chart_window, parse_time_series, price_change
+
+HISTORY_LENGTHS = (100, 1000, 5000, 20000)
+
+
+def make_series(n: int, seed: int = 0):
+    """A TIME_SERIES_DAILY payload body with n bars, newest first."""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    today = date(2024, 1, 1)
+    return {
+        (today - timedelta(days=i)).isoformat(): {
+            '1. open': f'{close * 0.99:.4f}',
+            '2. high': f'{close * 1.01:.4f}',
+            '3. low': f'{close * 0.98:.4f}',
+            '4. close': f'{close:.4f}',
+            '5. volume': str(int(rng.integers(1e5, 1e7))),
+        }
+        for i, close in enumerate(closes)
+    }
+
+
+def legacy_parse(data):
+    """The per-symbol parse fetch_crypto/fetch_stocks used to do."""
+    latest_data = list(data.values())[0]
+    historical_data = list(data.values())[:24]
+    chart_data = [float(d['4. close']) for d in historical_data]
+    current_price = float(latest_data['4. close'])
+    prev_price = float(list(data.values())[1]['4. close'])
+    change = ((current_price - prev_price) / prev_price) * 100
+    volume = 0
+    if '5. volume' in latest_data:
+        volume = float(latest_data['5. volume'])
+    elif '6. volume' in latest_data:
+        volume = float(latest_data['6. volume'])
+    return current_price, change, volume, chart_data
+
+
+def full_parse(data):
+    bars = parse_time_series(data)
+    return float(bars['close'][-1]), price_change(bars), chart_window(bars, 24)
+
+
+def incremental_parse(data, since):
+    return parse_time_series(data, since)
+
+
+def bench(func, data, repeat: int = 5) -> float:
+    number = max(1, 20000 // len(data))
+    return min(timeit.repeat(lambda: func(data), number=number, repeat=repeat)) / number
+
+
+def main():
+    print(f"{'bars':>8} {'legacy us':>10} {'full us':>10} {'us/bar':>7} {'incremental us':>15}")
+    for n in HISTORY_LENGTHS:
+        data = make_series(n)
+        # The store already holds everything but the newest bar
+        since = int(parse_time_series(data)['ts'][-2])
+        legacy = bench(legacy_parse, data)
+        full = bench(full_parse, data)
+        incremental = bench(lambda d: incremental_parse(d, since), data)
+        print(f'{n:>8} {legacy * 1e6:>10.1f} {full * 1e6:>10.1f} {full * 1e6 / n:>7.2f} '
+              f'{incremental * 1e6:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Simulated class refresh time by process pool size.
+
+Refreshes one asset class of a synthetic universe (5,000 symbols by
+default) through refresh_class_async, which publishes a snapshot, with
+0 workers (generated inline) and with growing shard pools. Pools are
+warmed up first, so worker start-up is not timed.
+
+Run from the backend directory:
+
+    python benchmarks/refresh_benchmark.py [symbols] [workers ...]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYMBOLS = 5000
+WORKERS = (0, 1, 2, 4)
+REPEAT = 3
+
+
+def write_universe(symbols: int) -> str:
+    universe = {
+        'crypto': {f'SYM{i}': f'SYM{i}' for i in range(symbols)},
+        'forex': {'EURUSD': ['EUR', 'USD']},
+        'stocks': {'SPX': 'SPX'},
+    }
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(universe, f)
+    return path
+
+
+async def time_refresh(market, workers: int) -> float:
+    market.shutdown_shard_pool()
+    market.MARKET_REFRESH_WORKERS = workers
+    await market.refresh_class_async('crypto')
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await market.refresh_class_async('crypto')
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def run(symbols: int, workers):
+    import market
+
+    print(f'{symbols} symbols, {os.cpu_count()} cpus, shards of {market.MARKET_SHARD_SIZE}')
+    inline = None
+    for count in workers:
+        elapsed = await time_refresh(market, count)
+        inline = elapsed if inline is None else inline
+        print(f'{count:>3} workers: {elapsed * 1e3:8.1f} ms  {inline / elapsed:5.2f}x')
+    market.shutdown_shard_pool()
+
+
+def main(symbols: int = SYMBOLS, workers=WORKERS):
+    path = write_universe(symbols)
+    os.environ['SYMBOL_UNIVERSE_PATH'] = path
+    os.environ.setdefault('ALPHA_VANTAGE_API_KEY', 'benchmark')
+    os.environ['MARKET_DATA_PROVIDER'] = 'simulator'
+    try:
+        asyncio.run(run(symbols, workers))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:1], *([args[1:]] if len(args) > 1 else []))
@@ -0,0 +1,52 @@
+"""Simulator throughput, in bars generated per second.
+
+Times SimulatedProvider.bulk on a (symbols, bars) universe, which draws
+every path from one generator. Also times the per-symbol block path
+(bars), which shards use and which is reproducible per bar.
+
+Run from the backend directory:
+
+    python benchmarks/simulator_benchmark.py [symbols] [bars]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers import SimulatedProvider
+
+SYMBOLS = 2000
+BARS = 20000
+BLOCK_SYMBOLS = 200
+
+
+def bench(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(symbols: int = SYMBOLS, bars: int = BARS):
+    simulator = SimulatedProvider(epoch=0)
+    bulk = bench(lambda: simulator.bulk('crypto', symbols, bars))
+
+    def per_symbol():
+        for i in range(BLOCK_SYMBOLS):
+            simulator.bars('crypto', f'SYM{i}', 0, bars - 1)
+
+    # Block offsets are cached after the first pass, as in a running server
+    per_symbol()
+    blocks = bench(per_symbol)
+
+    print(f'{symbols} symbols x {bars} bars')
+    print(f'{"bulk":>12}: {bulk:8.2f} s  {symbols * bars / bulk / 1e6:6.1f} M bars/s')
+    print(f'{"per symbol":>12}: {blocks * symbols / BLOCK_SYMBOLS:8.2f} s  '
+          f'{BLOCK_SYMBOLS * bars / blocks / 1e6:6.1f} M bars/s (timed over {BLOCK_SYMBOLS} symbols)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import threading
+import time
+
+
+class CacheEntry:
+    def __init__(self, value: Any, ttl: float):
+        self.value = value
+        self.ttl = ttl
+        self.stored_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    @property
+    def expired(self) -> bool:
+        return self.age >= self.ttl
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    The first caller runs func; callers arriving while it is in flight
+    block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.value
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight.
+
+    The loader runs as its own task, so a caller being cancelled does not
+    cancel the fetch for everyone else waiting on it.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    """Bounded LRU cache with per-key TTLs and stale-while-revalidate.
+
+    A fresh entry is returned as is. An expired entry is still returned
+    immediately while a single background thread reloads it, so callers
+    never wait on the loader once a key has been populated. Only a miss
+    calls the loader inline, and concurrent misses on the same key share
+    a single call.
+    """
+
+    def __init__(self, max_entries: int = 256, default_ttl: float = 300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._refreshing = set()
+        # Strong references to background refresh tasks until they finish
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'evictions': 0,
+        }
+
+    def _lookup(self, key: str):
+        """Return (found, needs_refresh, value) and update the counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, False, None
+            self._entries.move_to_end(key)
+            if not entry.expired:
+                self._stats['hits'] += 1
+                return True, False, entry.value
+            self._stats['stale'] += 1
+            if key in self._refreshing:
+                return True, False, entry.value
+            self._refreshing.add(key)
+            return True, True, entry.value
+
+    def get(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, loading it on a miss."""
+        ttl = self.default_ttl if ttl is None else ttl
+        found, refresh, value = self._lookup(key)
+        if found:
+            if refresh:
+                threading.Thread(
+                    target=self._refresh, args=(key, loader, ttl), daemon=True
+                ).start()
+            return value
+
+        def load():
+            value = loader()
+            self.set(key, value, ttl)
+            return value
+
+        return self._flight.do(key, load)
+
+    async def aget(self, key: str, loader: Callable[[], Awaitable[Any]],
+                   ttl: Optional[float] = None) -> Any:
+        """asyncio variant of get; loader is a coroutine function."""
+        ttl = self.default_ttl if ttl is None else ttl
+        found, refresh, value = self._lookup(key)
+        if found:
+            if refresh:
+                task = asyncio.ensure_future(self._arefresh(key, loader, ttl))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return value
+
+        async def load():
+            value = await loader()
+            self.set(key, value, ttl)
+            return value
+
+        return await self._async_flight.do(key, load)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = CacheEntry(value, ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key: str, loader: Callable[[], Any], ttl: float) -> None:
+        try:
+            value = self._flight.do(key, loader)
+        except Exception as e:
+            # Keep serving the stale value; the next read retries.
+            print(f"Error refreshing cache key {key}: {e}")
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+        else:
+            self.set(key, value, ttl)
+            with self._lock:
+                self._stats['refreshes'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def arefresh(self, key: str, loader: Callable[[], Awaitable[Any]],
+                       ttl: Optional[float] = None) -> Any:
+        """Reload key now and store the result, sharing the load with any
+        concurrent miss or background refresh of the same key."""
+        ttl = self.default_ttl if ttl is None else ttl
+        try:
+            value = await self._async_flight.do(key, loader)
+        except Exception:
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+            raise
+        self.set(key, value, ttl)
+        with self._lock:
+            self._stats['refreshes'] += 1
+        return value
+
+    async def _arefresh(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> None:
+        try:
+            await self.arefresh(key, loader, ttl)
+        except Exception as e:
+            # Keep serving the stale value; the next read retries.
+            print(f"Error refreshing cache key {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/stale counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['refreshing'] = len(self._refreshing)
+        stats['coalesced'] = self._flight.coalesced + self._async_flight.coalesced
+        lookups = stats['hits'] + stats['misses'] + stats['stale']
+        stats['hit_ratio'] = (stats['hits'] + stats['stale']) / lookups if lookups else 0.0
+        return stats
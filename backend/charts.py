@@ -0,0 +1,255 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+
+import numpy as np
+
+from wire import ColumnTable
+
+CHART_RANGES = {
+    '1d': 86400,
+    '1w': 7 * 86400,
+    '1m': 30 * 86400,
+    '1y': 365 * 86400,
+    'all': None,
+}
+MAX_CHART_POINTS = 2000
+
+# Each pyramid level keeps one point per PYRAMID_FACTOR points of the
+# level below; levels stop once they are shorter than PYRAMID_MIN_POINTS
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_POINTS = 64
+
+
+def _triangle_pick(xs: List[float], ys: List[float], lo: int, hi: int,
+                   ax: float, ay: float, cx: float, cy: float) -> int:
+    """Index in [lo, hi) forming the largest triangle with a and c."""
+    best, best_area = lo, -1.0
+    dx, dy = ax - cx, cy - ay
+    for i in range(lo, hi):
+        area = abs(dx * (ys[i] - ay) + (ax - xs[i]) * dy)
+        if area > best_area:
+            best, best_area = i, area
+    return best
+
+
+def lttb(xs: np.ndarray, ys: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep
+    the visual shape of (xs, ys). The first and last points are kept."""
+    n = len(xs)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][-n_out:] if n_out > 0 else [], dtype=np.int64)
+    edges = (1 + np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64)
+    edges[-1] = n - 1
+    x, y = xs.astype(np.float64), ys.astype(np.float64)
+    # Bucket means; the last bucket's "next" is the final point itself
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+    xl, yl = x.tolist(), y.tolist()
+    selected = [0]
+    a = 0
+    for j in range(n_out - 2):
+        a = _triangle_pick(xl, yl, int(edges[j]), int(edges[j + 1]), xl[a], yl[a],
+                           mean_x[j + 1], mean_y[j + 1])
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected, dtype=np.int64)
+
+
+class ChartPyramid:
+    """A series and successively coarser LTTB downsamplings of it.
+
+    Level k + 1 takes one point from every PYRAMID_FACTOR points of level
+    k, chosen by the LTTB triangle rule against the previous pick and the
+    mean of the next bucket. A bucket's pick only depends on the buckets
+    around it, so appending bars recomputes just the tail of each level.
+    """
+
+    def __init__(self, ts: np.ndarray, values: np.ndarray,
+                 factor: int = PYRAMID_FACTOR, min_points: int = PYRAMID_MIN_POINTS):
+        self.factor = factor
+        self.min_points = min_points
+        self.levels: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.asarray(ts, dtype=np.int64), np.asarray(values, dtype=np.float64))
+        ]
+        self._rebuild_from(1, 0)
+
+    def __len__(self) -> int:
+        return len(self.levels[0][0])
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        ts = self.levels[0][0]
+        return int(ts[-1]) if len(ts) else None
+
+    def extend(self, ts: np.ndarray, values: np.ndarray) -> None:
+        """Append points newer than the last one and update every level."""
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if self.last_ts is not None:
+            newer = ts > self.last_ts
+            ts, values = ts[newer], values[newer]
+        if not len(ts):
+            return
+        base_ts, base_values = self.levels[0]
+        old_len = len(base_ts)
+        self.levels[0] = (np.concatenate((base_ts, ts)), np.concatenate((base_values, values)))
+        self._rebuild_from(1, old_len)
+
+    def _rebuild_from(self, level: int, changed_from: int) -> None:
+        """Recompute levels from `level` up, given that the level below
+        changed from index changed_from on."""
+        while True:
+            src_ts, src_values = self.levels[level - 1]
+            n = len(src_ts)
+            if n < self.min_points * self.factor:
+                del self.levels[level:]
+                return
+            # The bucket holding the change, and the one before it whose
+            # next-bucket mean it feeds, are recomputed
+            if level < len(self.levels):
+                first_bucket = max(0, changed_from // self.factor - 1)
+                kept = self.levels[level]
+            else:
+                first_bucket = 0
+                kept = (np.empty(0, np.int64), np.empty(0))
+            kept_ts, kept_values = kept[0][:first_bucket], kept[1][:first_bucket]
+            picks = self._picks(src_ts, src_values, first_bucket,
+                                int(np.searchsorted(src_ts, kept_ts[-1])) if len(kept_ts) else None)
+            level_ts = np.concatenate((kept_ts, src_ts[picks]))
+            level_values = np.concatenate((kept_values, src_values[picks]))
+            if level < len(self.levels):
+                self.levels[level] = (level_ts, level_values)
+            else:
+                self.levels.append((level_ts, level_values))
+            level += 1
+            changed_from = first_bucket
+
+    def _picks(self, ts: np.ndarray, values: np.ndarray, first_bucket: int,
+               previous: Optional[int]) -> List[int]:
+        f = self.factor
+        n = len(ts)
+        n_buckets = -(-n // f)
+        lo = first_bucket * f
+        # Only the source points from the first recomputed bucket on (and
+        # the previous pick) are converted
+        start = min(lo, previous) if previous is not None else lo
+        xs = ts[start:].astype(np.float64).tolist()
+        ys = values[start:].tolist()
+        means_x = [sum(xs[i:i + f]) / len(xs[i:i + f]) for i in range(lo - start, n - start, f)]
+        means_y = [sum(ys[i:i + f]) / len(ys[i:i + f]) for i in range(lo - start, n - start, f)]
+        picks = []
+        for j in range(first_bucket, n_buckets):
+            b_lo, b_hi = j * f - start, min((j + 1) * f, n) - start
+            if j == 0:
+                pick = 0
+            else:
+                a = previous - start
+                k = j + 1 - first_bucket
+                if k < len(means_x):
+                    cx, cy = means_x[k], means_y[k]
+                else:
+                    cx, cy = xs[b_hi - 1], ys[b_hi - 1]
+                pick = _triangle_pick(xs, ys, b_lo, b_hi, xs[a], ys[a], cx, cy)
+            previous = pick + start
+            picks.append(previous)
+        return picks
+
+    def query(self, start_ts: Optional[int], points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """About `points` points covering ts >= start_ts, newest included.
+
+        Served from the coarsest level that still has at least `points`
+        points in range, so the final LTTB pass works on a bounded slice
+        however long the range is.
+        """
+        base_ts, base_values = self.levels[0]
+        if not len(base_ts):
+            return base_ts, base_values
+        chosen = 0
+        for level in range(len(self.levels) - 1, 0, -1):
+            ts = self.levels[level][0]
+            lo = int(np.searchsorted(ts, start_ts)) if start_ts is not None else 0
+            if len(ts) - lo >= points:
+                chosen = level
+                break
+        ts, values = self.levels[chosen]
+        lo = int(np.searchsorted(ts, start_ts)) if start_ts is not None else 0
+        ts, values = ts[lo:], values[lo:]
+        if chosen and (not len(ts) or ts[-1] != base_ts[-1]):
+            # Coarse levels may not end on the latest bar; keep it in view
+            ts = np.append(ts, base_ts[-1])
+            values = np.append(values, base_values[-1])
+        keep = lttb(ts, values, points)
+        return ts[keep], values[keep]
+
+
+class ChartPyramids:
+    """Pyramids of close prices per symbol, kept for at most max_symbols."""
+
+    def __init__(self, max_symbols: int = 1024):
+        self.max_symbols = max_symbols
+        self._pyramids: 'OrderedDict[Tuple[str, str], ChartPyramid]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, asset_class: str, symbol: str,
+            load_since: Callable[[Optional[int]], np.ndarray]) -> ChartPyramid:
+        """The symbol's pyramid, brought up to date with load_since(last_ts),
+        which returns OHLCV bars newer than last_ts (all when None).
+
+        Bars are loaded and a new pyramid built without holding the lock,
+        so a slow load does not stall charts of other symbols.
+        """
+        key = (asset_class, symbol)
+        with self._lock:
+            pyramid = self._pyramids.get(key)
+            if pyramid is not None:
+                self._pyramids.move_to_end(key)
+                last_ts = pyramid.last_ts
+        if pyramid is not None:
+            bars = load_since(last_ts)
+            if len(bars):
+                with self._lock:
+                    # extend skips bars a concurrent caller already added
+                    pyramid.extend(bars['ts'], bars['close'])
+            return pyramid
+        bars = load_since(None)
+        loaded = ChartPyramid(bars['ts'], bars['close'])
+        with self._lock:
+            # Another caller may have inserted the symbol meanwhile
+            pyramid = self._pyramids.setdefault(key, loaded)
+            if pyramid is not loaded:
+                pyramid.extend(bars['ts'], bars['close'])
+            self._pyramids.move_to_end(key)
+            while len(self._pyramids) > self.max_symbols:
+                self._pyramids.popitem(last=False)
+        return pyramid
+
+    def chart(self, asset_class: str, symbol: str, load_since: Callable[[Optional[int]], np.ndarray],
+              range_: str = '1m', points: int = 100) -> Dict[str, Any]:
+        pyramid = self.get(asset_class, symbol, load_since)
+        span = CHART_RANGES[range_]
+        last = pyramid.last_ts
+        start = last - span if span is not None and last is not None else None
+        with self._lock:
+            ts, values = pyramid.query(start, points)
+        return {
+            'symbol': symbol,
+            'assetClass': asset_class,
+            'range': range_,
+            'timestamps': ts,
+            'values': values,
+        }
+
+
+def chart_table(chart: Dict[str, Any]) -> ColumnTable:
+    """A chart from ChartPyramids.chart as timestamp/value columns."""
+    return ColumnTable(
+        {'timestamp': chart['timestamps'], 'value': chart['values']},
+        {'symbol': chart['symbol'], 'assetClass': chart['assetClass'], 'range': chart['range']},
+    )
+
+
+chart_pyramids = ChartPyramids()
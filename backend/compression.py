@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Tuple
+import gzip
+import os
+
+from dotenv import load_dotenv
+
+from executors import run_cpu
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this are sent as is
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+# Larger bodies are compressed on the CPU pool instead of the event loop
+COMPRESSION_OFFLOAD_SIZE = 32 * 1024
+
+# Server preference when the client accepts several equally
+ENCODINGS: Tuple[str, ...] = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Cached variants are built once per version and can afford slower, denser
+# settings than per-request compression
+CACHED_LEVELS = {'br': 9, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+SKIP_CONTENT_TYPES = ('text/event-stream', 'image/', 'application/zip', 'application/gzip')
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best encoding we support from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    level = (CACHED_LEVELS if cached else DYNAMIC_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _add_vary(headers: List[Tuple[bytes, bytes]]) -> None:
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b'vary':
+            if b'accept-encoding' not in value.lower():
+                headers[i] = (name, value + b', Accept-Encoding')
+            return
+    headers.append((b'vary', b'Accept-Encoding'))
+
+
+class CompressionMiddleware:
+    """Compress complete HTTP responses with gzip or brotli.
+
+    Responses that are already encoded (such as the pre-compressed
+    snapshot bodies), streamed, smaller than minimum_size, or of an
+    incompressible type pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        accept = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        encoding = negotiate(accept)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if message['type'] == 'http.response.start':
+                start = message
+                headers = {name.lower(): value for name, value in message.get('headers', [])}
+                content_type = headers.get(b'content-type', b'').decode('latin-1')
+                passthrough = (
+                    b'content-encoding' in headers
+                    or content_type.startswith(SKIP_CONTENT_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                return await send(message)
+
+            body = message.get('body', b'')
+            if message.get('more_body', False) or len(body) < self.minimum_size:
+                # Streamed or small: send the start as it was
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            if len(body) >= COMPRESSION_OFFLOAD_SIZE:
+                compressed = await run_cpu(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers = [
+                (name, value) for name, value in start.get('headers', [])
+                if name.lower() != b'content-length'
+            ]
+            headers += [
+                (b'content-encoding', encoding.encode()),
+                (b'content-length', str(len(compressed)).encode()),
+            ]
+            _add_vary(headers)
+            await send({**start, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, compressing_send)
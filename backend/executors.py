@@ -0,0 +1,108 @@
+"""Where work runs.
+
+The event loop only does I/O and cheap bookkeeping. Everything else is
+handed to a bounded pool:
+
+- cpu_pool: numpy/serialization work (snapshot frames, deltas, signals,
+  simulated bars); numpy releases the GIL for most of it
+- auth_pool: bcrypt hashing, kept apart so a burst of logins cannot
+  starve market work
+- the process pool in market.py for sharded simulator refreshes
+
+LoopLagMonitor measures how late the loop wakes up, which is what a
+blocking call in a handler costs every other connection.
+"""
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional
+import asyncio
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CPU_POOL_WORKERS = int(os.getenv('CPU_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+AUTH_POOL_WORKERS = int(os.getenv('AUTH_POOL_WORKERS', '2'))
+
+cpu_pool = ThreadPoolExecutor(CPU_POOL_WORKERS, thread_name_prefix='cpu')
+auth_pool = ThreadPoolExecutor(AUTH_POOL_WORKERS, thread_name_prefix='auth')
+
+POOLS = {'cpu': cpu_pool, 'auth': auth_pool}
+
+
+async def run_in_pool(pool: Executor, func: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, partial(func, *args, **kwargs))
+
+
+async def run_cpu(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run CPU-bound func on the CPU pool and await its result."""
+    return await run_in_pool(cpu_pool, func, *args, **kwargs)
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        name: {'workers': pool._max_workers, 'queued': pool._work_queue.qsize()}
+        for name, pool in POOLS.items()
+    }
+
+
+class LoopLagMonitor:
+    """Samples event loop lag: how much later than asked a sleep wakes up."""
+
+    def __init__(self, interval: float = 0.05, window: int = 1200, stall_threshold: float = 0.1):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(time.perf_counter() - start - self.interval)
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        self.samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.stall_threshold:
+            self.stalls += 1
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lags = np.fromiter(self.samples, dtype=np.float64)
+        p50, p99 = np.percentile(lags, [50, 99]) if len(lags) else (0.0, 0.0)
+        return {
+            'samples': len(lags),
+            'last_ms': float(lags[-1]) * 1000 if len(lags) else None,
+            'p50_ms': float(p50) * 1000,
+            'p99_ms': float(p99) * 1000,
+            'max_ms': self.max_lag * 1000,
+            'stalls': self.stalls,
+            'stall_threshold_ms': self.stall_threshold * 1000,
+            'pools': pool_stats(),
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,370 @@
+"""Technical indicators for a whole asset class in one numpy pass.
+
+Inputs are (symbols, bars) matrices, oldest bar first. Work is done
+time-major, on (bars, symbols) arrays: windowed indicators come from
+cumulative sums, and recursive ones (EMA, Wilder smoothing) step through
+time once, updating every symbol per step. No Python loop runs per
+symbol.
+
+Cumulative sums are taken over prices minus each symbol's first close.
+That keeps them small however long the history is, so window sums taken
+as differences of cumulative sums keep their precision.
+
+Every recurrence goes through the *_step functions below. IndicatorState
+applies the same steps one bar at a time, so its incremental values match
+these exactly.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+import threading
+
+import numpy as np
+
+
+class IndicatorParams(NamedTuple):
+    sma: int = 20
+    sma_long: int = 50
+    ema: int = 20
+    rsi: int = 14
+    macd_fast: int = 12
+    macd_slow: int = 26
+    macd_signal: int = 9
+    bollinger: int = 20
+    bollinger_width: float = 2.0
+    atr: int = 14
+
+
+DEFAULT_PARAMS = IndicatorParams()
+
+
+class Indicators(NamedTuple):
+    """(symbols, bars) arrays; NaN until an indicator has enough bars."""
+    close: np.ndarray
+    sma: np.ndarray
+    sma_long: np.ndarray
+    ema: np.ndarray
+    rsi: np.ndarray
+    macd: np.ndarray
+    macd_signal: np.ndarray
+    macd_hist: np.ndarray
+    bb_upper: np.ndarray
+    bb_middle: np.ndarray
+    bb_lower: np.ndarray
+    atr: np.ndarray
+
+    def latest(self, offset: int = 1) -> Dict[str, np.ndarray]:
+        """Every indicator's value `offset` bars from the end, per symbol."""
+        return {name: values[:, -offset] for name, values in self._asdict().items()}
+
+
+def ema_alpha(period: int) -> float:
+    return 2.0 / (period + 1)
+
+
+def ema_step(previous, value, alpha: float):
+    return previous + alpha * (value - previous)
+
+
+def wilder_step(previous, value, period: int):
+    return (previous * (period - 1) + value) / period
+
+
+def window_mean(cum, cum_before, period: int):
+    """Mean of a window from cumulative sums at its end and just before it."""
+    return (cum - cum_before) / period
+
+
+def rsi_value(avg_gain, avg_loss):
+    total = avg_gain + avg_loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, 100.0 * avg_gain / total, 50.0)
+
+
+def bollinger_bands(mean_diff, mean_square, base, width: float):
+    """(upper, middle, lower) from window means of d and d**2, where d is
+    price minus base."""
+    std = np.sqrt(np.maximum(mean_square - mean_diff * mean_diff, 0.0))
+    middle = mean_diff + base
+    return middle + width * std, middle, middle - width * std
+
+
+def true_range(high, low, previous_close):
+    return np.maximum(high - low, np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+
+def _rolling_mean(cum: np.ndarray, period: int) -> np.ndarray:
+    """Trailing window means from time-major cumulative sums."""
+    out = np.full_like(cum, np.nan)
+    if len(cum) >= period:
+        out[period - 1] = window_mean(cum[period - 1], 0.0, period)
+        out[period:] = window_mean(cum[period:], cum[:-period], period)
+    return out
+
+
+def _ema(values: np.ndarray, period: int) -> np.ndarray:
+    """EMA seeded with the first value."""
+    alpha = ema_alpha(period)
+    out = np.empty_like(values)
+    out[0] = values[0]
+    for t in range(1, len(values)):
+        out[t] = ema_step(out[t - 1], values[t], alpha)
+    return out
+
+
+def _wilder(values: np.ndarray, period: int, first: int = 0) -> np.ndarray:
+    """Wilder smoothing of values[first:], seeded with the mean of its
+    first `period` values (summed in time order)."""
+    out = np.full_like(values, np.nan)
+    if len(values) - first < period:
+        return out
+    total = np.zeros(values.shape[1:])
+    for t in range(first, first + period):
+        total = total + values[t]
+    out[first + period - 1] = total / period
+    for t in range(first + period, len(values)):
+        out[t] = wilder_step(out[t - 1], values[t], period)
+    return out
+
+
+def compute_indicators(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                       params: IndicatorParams = DEFAULT_PARAMS) -> Indicators:
+    """SMA, EMA, RSI, MACD, Bollinger bands and ATR for every symbol.
+
+    high, low and close are (symbols, bars) arrays, oldest bar first.
+    """
+    close_t = np.ascontiguousarray(np.asarray(close, dtype=np.float64).T)
+    high_t = np.ascontiguousarray(np.asarray(high, dtype=np.float64).T)
+    low_t = np.ascontiguousarray(np.asarray(low, dtype=np.float64).T)
+    n_bars = len(close_t)
+
+    base = close_t[0]
+    diff = close_t - base
+    cum = np.cumsum(diff, axis=0)
+    cum_square = np.cumsum(diff * diff, axis=0)
+    means = {period: _rolling_mean(cum, period) + base
+             for period in {params.sma, params.sma_long}}
+
+    ema = _ema(close_t, params.ema)
+    macd = _ema(close_t, params.macd_fast) - _ema(close_t, params.macd_slow)
+    macd_signal = _ema(macd, params.macd_signal)
+
+    moves = np.zeros_like(close_t)
+    moves[1:] = close_t[1:] - close_t[:-1]
+    avg_gain = _wilder(np.maximum(moves, 0.0), params.rsi, first=1)
+    avg_loss = _wilder(np.maximum(-moves, 0.0), params.rsi, first=1)
+    rsi = np.where(np.isnan(avg_gain), np.nan, rsi_value(avg_gain, avg_loss))
+
+    bb_upper, bb_middle, bb_lower = bollinger_bands(
+        _rolling_mean(cum, params.bollinger), _rolling_mean(cum_square, params.bollinger),
+        base, params.bollinger_width,
+    )
+
+    ranges = np.empty_like(close_t)
+    if n_bars:
+        ranges[0] = high_t[0] - low_t[0]
+        ranges[1:] = true_range(high_t[1:], low_t[1:], close_t[:-1])
+    atr = _wilder(ranges, params.atr)
+
+    # Back to (symbols, bars); transposed views, so each symbol's latest
+    # values stay contiguous
+    return Indicators(
+        close=close_t.T,
+        sma=means[params.sma].T,
+        sma_long=means[params.sma_long].T,
+        ema=ema.T,
+        rsi=rsi.T,
+        macd=macd.T,
+        macd_signal=macd_signal.T,
+        macd_hist=(macd - macd_signal).T,
+        bb_upper=bb_upper.T,
+        bb_middle=bb_middle.T,
+        bb_lower=bb_lower.T,
+        atr=atr.T,
+    )
+
+
+class IndicatorState:
+    """Incremental indicators: one slot per symbol, held in arrays.
+
+    Each slot keeps the accumulators the batch engine would reach after
+    the bars seen so far: EMAs, Wilder averages (and their seeding sums),
+    running cumulative sums and a ring of the last ones for window
+    indicators. update applies one bar to any set of slots in constant
+    time per slot, using the same steps as compute_indicators, so a slot
+    that has seen a history reports exactly compute_indicators' last
+    values for it.
+    """
+    # One float per slot each
+    ACCUMULATORS = ('base', 'prev_close', 'cum', 'cum_square', 'ema', 'ema_fast', 'ema_slow',
+                    'macd_signal', 'gain_sum', 'loss_sum', 'avg_gain', 'avg_loss', 'range_sum', 'atr')
+
+    def __init__(self, n_slots: int = 0, params: IndicatorParams = DEFAULT_PARAMS):
+        self.params = params
+        self.window = max(params.sma, params.sma_long, params.bollinger)
+        self.n_slots = 0
+        self.count = np.zeros(0, dtype=np.int64)
+        for name in self.ACCUMULATORS:
+            setattr(self, name, np.zeros(0))
+        self.ring = np.zeros((0, self.window))
+        self.ring_square = np.zeros((0, self.window))
+        self.values: Dict[str, np.ndarray] = {name: np.zeros(0) for name in Indicators._fields}
+        self.resize(n_slots)
+
+    def resize(self, n_slots: int) -> None:
+        """Add empty slots up to n_slots."""
+        extra = n_slots - self.n_slots
+        if extra <= 0:
+            return
+        self.count = np.concatenate((self.count, np.zeros(extra, dtype=np.int64)))
+        for name in self.ACCUMULATORS:
+            setattr(self, name, np.concatenate((getattr(self, name), np.zeros(extra))))
+        self.ring = np.concatenate((self.ring, np.zeros((extra, self.window))))
+        self.ring_square = np.concatenate((self.ring_square, np.zeros((extra, self.window))))
+        self.values = {name: np.concatenate((values, np.full(extra, np.nan)))
+                       for name, values in self.values.items()}
+        self.n_slots = n_slots
+
+    @classmethod
+    def from_history(cls, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                     params: IndicatorParams = DEFAULT_PARAMS) -> 'IndicatorState':
+        """State after replaying (symbols, bars) histories, one slot per row."""
+        close = np.asarray(close, dtype=np.float64)
+        state = cls(len(close), params)
+        for t in range(close.shape[1]):
+            state.update(high[:, t], low[:, t], close[:, t])
+        return state
+
+    def update(self, high, low, close, slots=None) -> Dict[str, np.ndarray]:
+        """Apply one new bar to each of `slots` (all slots when None) and
+        return their latest indicator values."""
+        p = self.params
+        slots = np.arange(self.n_slots) if slots is None else np.asarray(slots, dtype=np.int64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        t = self.count[slots]
+        first = t == 0
+
+        base = np.where(first, close, self.base[slots])
+        prev_close = self.prev_close[slots]
+        diff = close - base
+        cum = self.cum[slots] + diff
+        cum_square = self.cum_square[slots] + diff * diff
+
+        def window_means(period: int):
+            before = self.ring[slots, (t - period) % self.window]
+            before_square = self.ring_square[slots, (t - period) % self.window]
+            at_start = t == period - 1
+            before = np.where(at_start, 0.0, before)
+            before_square = np.where(at_start, 0.0, before_square)
+            ready = t >= period - 1
+            return (np.where(ready, window_mean(cum, before, period), np.nan),
+                    np.where(ready, window_mean(cum_square, before_square, period), np.nan))
+
+        values = {'close': close}
+        for name, period in (('sma', p.sma), ('sma_long', p.sma_long)):
+            values[name] = window_means(period)[0] + base
+        values['bb_upper'], values['bb_middle'], values['bb_lower'] = bollinger_bands(
+            *window_means(p.bollinger), base, p.bollinger_width)
+
+        ema = np.where(first, close, ema_step(self.ema[slots], close, ema_alpha(p.ema)))
+        ema_fast = np.where(first, close, ema_step(self.ema_fast[slots], close, ema_alpha(p.macd_fast)))
+        ema_slow = np.where(first, close, ema_step(self.ema_slow[slots], close, ema_alpha(p.macd_slow)))
+        macd = ema_fast - ema_slow
+        macd_signal = np.where(first, macd, ema_step(self.macd_signal[slots], macd, ema_alpha(p.macd_signal)))
+        values.update(ema=ema, macd=macd, macd_signal=macd_signal, macd_hist=macd - macd_signal)
+
+        # RSI averages moves from the second bar on
+        move = np.where(first, 0.0, close - prev_close)
+        gain, loss = np.maximum(move, 0.0), np.maximum(-move, 0.0)
+        avg_gain, gain_sum = self._wilder_update(t - 1, gain, self.avg_gain[slots], self.gain_sum[slots], p.rsi)
+        avg_loss, loss_sum = self._wilder_update(t - 1, loss, self.avg_loss[slots], self.loss_sum[slots], p.rsi)
+        values['rsi'] = np.where(np.isnan(avg_gain), np.nan, rsi_value(avg_gain, avg_loss))
+
+        ranges = np.where(first, high - low, true_range(high, low, prev_close))
+        atr, range_sum = self._wilder_update(t, ranges, self.atr[slots], self.range_sum[slots], p.atr)
+        values['atr'] = atr
+
+        self.count[slots] = t + 1
+        self.base[slots] = base
+        self.prev_close[slots] = close
+        self.cum[slots] = cum
+        self.cum_square[slots] = cum_square
+        self.ring[slots, t % self.window] = cum
+        self.ring_square[slots, t % self.window] = cum_square
+        self.ema[slots] = ema
+        self.ema_fast[slots] = ema_fast
+        self.ema_slow[slots] = ema_slow
+        self.macd_signal[slots] = macd_signal
+        self.avg_gain[slots], self.gain_sum[slots] = avg_gain, gain_sum
+        self.avg_loss[slots], self.loss_sum[slots] = avg_loss, loss_sum
+        self.atr[slots], self.range_sum[slots] = atr, range_sum
+        for name, latest in values.items():
+            self.values[name][slots] = latest
+        return values
+
+    @staticmethod
+    def _wilder_update(i, value, average, total, period: int):
+        """Wilder average after the i-th value (0-based; negative values
+        are skipped): summed while seeding, then smoothed."""
+        seeding = (i >= 0) & (i < period)
+        total = np.where(seeding, total + value, total)
+        average = np.where(i == period - 1, total / period,
+                           np.where(i >= period, wilder_step(average, value, period), np.nan))
+        return average, total
+
+    def latest(self, slots=None) -> Dict[str, np.ndarray]:
+        """Latest indicator values of slots (all slots when None)."""
+        if slots is None:
+            return {name: values.copy() for name, values in self.values.items()}
+        return {name: values[slots] for name, values in self.values.items()}
+
+
+class IndicatorBook:
+    """IndicatorState for the symbols of one asset class, fed with the
+    bars each symbol gained since it was last read."""
+
+    def __init__(self, params: IndicatorParams = DEFAULT_PARAMS):
+        self.state = IndicatorState(0, params)
+        self.slots: Dict[str, int] = {}
+        self.last_ts: List[Optional[int]] = []
+        self._lock = threading.Lock()
+
+    def latest(self, symbols: Sequence[str],
+               load_since: Callable[[str, Optional[int]], np.ndarray]) -> Dict[str, np.ndarray]:
+        """Latest indicators of symbols, in order, after applying
+        load_since(symbol, last_ts): OHLCV bars newer than last_ts (the
+        initial history when None)."""
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in self.slots:
+                    self.slots[symbol] = len(self.slots)
+                    self.last_ts.append(None)
+            self.state.resize(len(self.slots))
+            slots = np.array([self.slots[symbol] for symbol in symbols], dtype=np.int64)
+            new_bars = [load_since(symbol, self.last_ts[slot]) for symbol, slot in zip(symbols, slots.tolist())]
+            # Step j applies the j-th new bar of every symbol that has one
+            for j in range(max(map(len, new_bars), default=0)):
+                pending = [i for i, bars in enumerate(new_bars) if len(bars) > j]
+                bars = np.array([new_bars[i][j] for i in pending], dtype=new_bars[pending[0]].dtype)
+                self.state.update(bars['high'], bars['low'], bars['close'], slots[pending])
+            for slot, bars in zip(slots.tolist(), new_bars):
+                if len(bars):
+                    self.last_ts[slot] = int(bars['ts'][-1])
+            return self.state.latest(slots)
+
+
+class IndicatorBooks:
+    def __init__(self, params: IndicatorParams = DEFAULT_PARAMS):
+        self.params = params
+        self._books: Dict[str, IndicatorBook] = {}
+        self._lock = threading.Lock()
+
+    def get(self, asset_class: str) -> IndicatorBook:
+        with self._lock:
+            book = self._books.get(asset_class)
+            if book is None:
+                book = self._books[asset_class] = IndicatorBook(self.params)
+            return book
+
+
+indicator_books = IndicatorBooks()
@@ -1,30 +1,80 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from compression import CompressionMiddleware
+from charts import CHART_RANGES, MAX_CHART_POINTS, chart_table
+from wire import ColumnTable, rows_to_table
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from contextlib import asynccontextmanager
 from auth import (
     create_access_token,
     create_refresh_token,
     get_current_user,
-    verify_password,
+    get_optional_user,
+    verify_password_async,
     Token,
     get_password_hash
 )
-from market import get_market_analysis
-from signals import get_trading_signals
+from market import (
+    get_current_snapshot,
+    get_cache_stats,
+    record_demand,
+    load_from_store,
+    market_refresher,
+    shutdown_shard_pool,
+    chart_version,
+    get_chart,
+)
+from upstream import alpha_vantage
+from scheduler import refresh_scheduler
+from signals import get_snapshot_signals
+from models import model_registry
+from snapshot import MarketProjection, MarketSnapshot, snapshots
+from universe import registry
+from responses import snapshot_response
+from streaming import SIGNAL_STREAM_VERSIONS, MarketStream, SignalStream
+from executors import loop_monitor, pool_stats, run_cpu
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, metrics
 from copy_trade import get_available_traders, toggle_follow_status
+from batch import MAX_BATCH_REQUESTS, BatchContext, run_batch
 
 # Load environment variables
 load_dotenv()
 
+market_stream = MarketStream(snapshots, on_demand=record_demand)
+signal_stream = SignalStream(snapshots, get_snapshot_signals,
+                             history=SIGNAL_STREAM_VERSIONS * max(len(registry), 1))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve the stored history immediately on cold start, then keep
+    # snapshots fresh in the background
+    loop_monitor.start()
+    await run_cpu(model_registry.load_all)
+    load_from_store()
+    refresh_scheduler.start()
+    market_refresher.start()
+    market_stream.start()
+    signal_stream.start()
+    yield
+    await signal_stream.stop()
+    await market_stream.stop()
+    await market_refresher.stop()
+    await refresh_scheduler.stop()
+    await alpha_vantage.aclose()
+    shutdown_shard_pool()
+    await loop_monitor.stop()
+
 app = FastAPI(
     title="SpreadEdge API",
     description="Backend API for SpreadEdge Trading App",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware configuration
@@ -35,6 +85,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so recorded latency includes compression
+app.add_middleware(MetricsMiddleware)
+
+# Scrape-time metrics read from the components that already track them
+def _cache_refreshes():
+    stats = get_cache_stats()
+    yield "market_cache_refreshes_total", {"result": "ok"}, stats["refreshes"]
+    yield "market_cache_refreshes_total", {"result": "error"}, stats["refresh_errors"]
+
+def _snapshot_age():
+    snapshot = snapshots.current
+    if snapshot is not None:
+        yield "market_snapshot_age_seconds", {}, snapshot.age
+
+def _loop_lag():
+    stats = loop_monitor.stats()
+    yield "event_loop_lag_seconds", {"quantile": "0.5"}, stats["p50_ms"] / 1000
+    yield "event_loop_lag_seconds", {"quantile": "0.99"}, stats["p99_ms"] / 1000
+
+metrics.collector("market_cache_refreshes_total", "counter",
+                  "Asset class refreshes written to the market cache, by result.", _cache_refreshes)
+metrics.collector("market_snapshot_age_seconds", "gauge",
+                  "Seconds since the current market snapshot was published.", _snapshot_age)
+metrics.collector("market_snapshot_version", "gauge", "Version of the current market snapshot.",
+                  lambda: [("market_snapshot_version", {}, snapshots.current.version)] if snapshots.current else [])
+metrics.collector("event_loop_lag_seconds", "gauge", "Event loop lag percentiles over the recent window.",
+                  _loop_lag)
+metrics.collector("executor_queue_depth", "gauge", "Tasks waiting for a worker, by pool.",
+                  lambda: [("executor_queue_depth", {"pool": name}, stats["queued"])
+                           for name, stats in pool_stats().items()])
 
 # Models
 class User(BaseModel):
@@ -57,11 +138,34 @@ class Subscription(BaseModel):
 class ToggleFollowRequest(BaseModel):
     traderId: str
 
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., max_length=MAX_BATCH_REQUESTS)
+
+# Test user, hashed once at startup rather than on every login
+TEST_USER = {
+    "email": "test@example.com",
+    "hashed_password": get_password_hash("password123")
+}
+
+def market_table(snapshot: MarketSnapshot, projection: Optional[MarketProjection] = None) -> ColumnTable:
+    """Market rows as columns for the MessagePack and Arrow formats."""
+    return ColumnTable(snapshot.columns(projection), {"version": str(snapshot.version)})
+
+def signals_table(snapshot: MarketSnapshot) -> ColumnTable:
+    return rows_to_table(get_snapshot_signals(snapshot), ("id", *TradingSignal.model_fields), {"version": str(snapshot.version)})
+
 # Routes
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Get market analysis data."""
-    return get_market_analysis()
+    record_demand()
+    return await snapshot_response(request, "market", get_current_snapshot(),
+                                   MarketSnapshot.as_dict, columns=market_table)
 
 @app.post("/auth/register")
 async def register_user(user: User):
@@ -72,13 +176,10 @@ async def register_user(user: User):
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     # TODO: Replace this with actual user lookup from your database
     # For now, we'll use a test user with hashed password
-    test_user = {
-        "email": "test@example.com",
-        "hashed_password": get_password_hash("password123")
-    }
+    test_user = TEST_USER
     
     # Verify user exists and password is correct
-    if form_data.username != test_user["email"] or not verify_password(form_data.password, test_user["hashed_password"]):
+    if form_data.username != test_user["email"] or not await verify_password_async(form_data.password, test_user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -110,9 +211,40 @@ async def read_users_me(current_user: str = Depends(get_current_user)):
     return {"email": current_user}
 
 @app.get("/signals", response_model=List[TradingSignal])
-async def get_trading_signals_endpoint():
+async def get_trading_signals_endpoint(request: Request):
     """Get AI-generated trading signals."""
-    return get_trading_signals()
+    return await snapshot_response(request, "signals", get_current_snapshot(),
+                                   get_snapshot_signals, columns=signals_table)
+
+@app.get("/models")
+async def get_models():
+    """Get the loaded signal models and any that failed to load."""
+    return model_registry.stats()
+
+@app.post("/models/reload")
+async def reload_models(current_user: str = Depends(get_current_user)):
+    """Load new or changed model files without interrupting requests.
+
+    Signals use the new models from the next snapshot version.
+    """
+    return await run_cpu(model_registry.load_all)
+
+@app.get("/signals/stream")
+async def stream_trading_signals(last_event_id: Optional[str] = Header(None)):
+    """Stream new and changed trading signals as Server-Sent Events.
+
+    Reconnecting with Last-Event-ID replays the events missed since.
+    """
+    return StreamingResponse(
+        signal_stream.events(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/signals/stream/stats")
+async def get_signal_stream_stats():
+    """Get SSE subscriber, event log and drop counters."""
+    return signal_stream.stats()
 
 @app.post("/subscription/create")
 async def create_subscription(subscription: Subscription):
@@ -120,9 +252,112 @@ async def create_subscription(subscription: Subscription):
     return {"message": "Subscription created successfully"}
 
 @app.get("/market/analysis")
-async def get_market_analysis_endpoint():
-    """Get comprehensive market analysis data."""
-    return get_market_analysis()
+async def get_market_analysis_endpoint(
+    request: Request,
+    classes: Optional[str] = None,
+    symbols: Optional[str] = None,
+    fields: Optional[str] = None,
+    charts: bool = True,
+    include_all: Optional[bool] = Query(None, alias="all"),
+):
+    """Get comprehensive market analysis data.
+
+    Optional comma-separated classes, symbols and fields narrow the
+    response; charts=false drops chartData. The combined 'all' list is
+    included by default only when no classes are given.
+    """
+    try:
+        projection = MarketProjection.from_query(classes, symbols, fields, charts, include_all)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    record_demand(projection.classes)
+    return await snapshot_response(request, projection.key, get_current_snapshot(),
+                                   lambda snapshot: snapshot.project(projection),
+                                   columns=lambda snapshot: market_table(snapshot, projection))
+
+@app.get("/market/chart")
+async def get_market_chart(
+    request: Request,
+    asset_class: str,
+    symbol: str,
+    range_: str = Query("1m", alias="range"),
+    points: int = Query(100, ge=2, le=MAX_CHART_POINTS),
+):
+    """Get an LTTB-downsampled close price chart of one symbol.
+
+    range is one of 1d, 1w, 1m, 1y or all.
+    """
+    if range_ not in CHART_RANGES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"range must be one of {', '.join(CHART_RANGES)}")
+    try:
+        # Validates the symbol before any ETag is compared
+        version = await run_cpu(chart_version, asset_class, symbol)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e).strip("'"))
+    return await snapshot_response(request, f"chart-{asset_class}-{symbol}-{range_}-{points}",
+                                   get_current_snapshot(),
+                                   lambda _: get_chart(asset_class, symbol, range_, points),
+                                   columns=lambda _: chart_table(get_chart(asset_class, symbol, range_, points)),
+                                   version=version)
+
+@app.post("/batch")
+async def batch(request: BatchRequest, current_user: Optional[str] = Depends(get_optional_user)):
+    """Answer several GET endpoints against one snapshot version.
+
+    Each item names a path (/, /market/analysis, /market/chart, /signals,
+    /copy-trade/traders or /users/me) and its query params; responses
+    come back in order with their own status and body.
+    """
+    snapshot = get_current_snapshot()
+    body = await run_batch(
+        BatchContext(snapshot, current_user),
+        [(item.id, item.path, item.params) for item in request.requests],
+    )
+    return Response(content=body, media_type="application/json",
+                    headers={"X-Snapshot-Version": str(snapshot.version)})
+
+@app.websocket("/ws/market")
+async def market_websocket(websocket: WebSocket, classes: str = "", symbols: str = ""):
+    """Stream a market snapshot, then per-symbol deltas for each new version.
+
+    classes and symbols are comma-separated initial subscriptions.
+    """
+    await market_stream.serve(
+        websocket,
+        [c for c in classes.split(",") if c],
+        [s for s in symbols.split(",") if s],
+    )
+
+@app.get("/market/stream/stats")
+async def get_market_stream_stats():
+    """Get WebSocket subscriber and queue counters."""
+    return market_stream.stats()
+
+@app.get("/system/loop/stats")
+async def get_loop_stats():
+    """Get event loop lag percentiles and worker pool queue depths."""
+    return loop_monitor.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get request, cache, upstream and signal metrics in Prometheus text format."""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/market/cache/stats")
+async def get_market_cache_stats():
+    """Get market cache refresh, hit, miss and stale counters."""
+    return get_cache_stats()
+
+@app.get("/market/scheduler/stats")
+async def get_market_scheduler_stats():
+    """Get refresh queue depth and per-symbol lag."""
+    return refresh_scheduler.stats()
+
+@app.get("/market/refresher/stats")
+async def get_market_refresher_stats():
+    """Get per-class refresh duration and publish lag."""
+    return market_refresher.get_stats()
 
 @app.post("/copy-trade/execute")
 async def execute_copy_trade():
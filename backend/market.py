@@ -1,204 +1,300 @@
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.foreignexchange import ForeignExchange
-from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import time
+import asyncio
+import multiprocessing
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from cache import TTLCache
+from snapshot import ASSET_CLASSES, MarketSnapshot, snapshots
+from upstream import alpha_vantage
+from scheduler import refresh_scheduler
+from store import ohlcv_store
+from parsing import row_from_bars, rows_from_bars
+from universe import registry
+from shards import refresh_shard
+from refresher import MarketRefresher
+from executors import run_cpu
+from metrics import upstream_fetch_duration, upstream_fetch_errors
+from charts import chart_pyramids
+from indicators import indicator_books
+from providers import AlphaVantageProvider, MarketDataProvider, SimulatedProvider
 
 load_dotenv()
 
-# Initialize Alpha Vantage clients
-ts = TimeSeries(key=os.getenv('ALPHA_VANTAGE_API_KEY'))
-fx = ForeignExchange(key=os.getenv('ALPHA_VANTAGE_API_KEY'))
-
 # Cache for API responses
-cache = {}
 CACHE_DURATION = 300  # 5 minutes
+CACHE_TTLS = {
+    'crypto': 60,
+    'forex': CACHE_DURATION,
+    'stocks': CACHE_DURATION,
+}
+# The refresher runs each class every CACHE_TTLS seconds, give or take
+# this fraction; cached classes outlive that by the jitter, so reads only
+# see a stale class once the refresher has fallen behind on it
+REFRESH_JITTER = 0.1
+CACHE_MAX_ENTRIES = int(os.getenv('MARKET_CACHE_MAX_ENTRIES', '256'))
+cache = TTLCache(max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_DURATION)
+
+# Serve generated data instead of calling Alpha Vantage (testing)
+USE_MOCK_DATA = os.getenv('USE_MOCK_DATA', 'true').lower() == 'true'
+
+def class_ttl(asset_class: str) -> float:
+    """Cache TTL of a class kept fresh by the background refresher."""
+    return CACHE_TTLS.get(asset_class, CACHE_DURATION) * (1 + REFRESH_JITTER)
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Get hit, miss and stale counters for the market cache."""
+    return cache.stats()
+
+CRYPTO_SYMBOLS = registry.symbol_map('crypto')
+FOREX_PAIRS = registry.symbol_map('forex')
+STOCK_INDICES = registry.symbol_map('stocks')
+
+SYMBOL_MAP = {
+    'crypto': CRYPTO_SYMBOLS,
+    'forex': FOREX_PAIRS,
+    'stocks': STOCK_INDICES,
+}
+
+# Market data providers; USE_MOCK_DATA picks the simulator by default
+simulator = SimulatedProvider(seed=int(os.getenv('SIMULATOR_SEED', '42')))
+alpha_vantage_provider = AlphaVantageProvider(alpha_vantage, SYMBOL_MAP)
+market_data_providers = {p.name: p for p in (simulator, alpha_vantage_provider)}
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'simulator' if USE_MOCK_DATA else 'alpha_vantage')
+provider: MarketDataProvider = market_data_providers[MARKET_DATA_PROVIDER]
+# Quota-limited providers are refreshed symbol by symbol through the
+# scheduler and persisted to the store; the others are polled directly.
+SCHEDULED = provider.name in refresh_scheduler.buckets
+
+def _class_symbols(asset_class: str) -> List[str]:
+    return registry.symbols(asset_class)
+
+async def fetch_bars(asset_class: str, symbols: List[str], *args) -> Dict[str, np.ndarray]:
+    """provider.fetch_bars, recording its latency and failures."""
+    start = time.perf_counter()
+    try:
+        return await provider.fetch_bars(asset_class, symbols, *args)
+    except Exception:
+        upstream_fetch_errors.labels(provider.name).inc()
+        raise
+    finally:
+        upstream_fetch_duration.labels(provider.name).observe(time.perf_counter() - start)
+
+# The simulator can split a class into shards generated on a process
+# pool; 0 workers generates inline
+MARKET_REFRESH_WORKERS = int(os.getenv('MARKET_REFRESH_WORKERS', '0'))
+MARKET_SHARD_SIZE = int(os.getenv('MARKET_SHARD_SIZE', '250'))
+_shard_pool: Optional[ProcessPoolExecutor] = None
+
+def store_bars(asset_class: str, symbol: str, bars: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Append the new bars to the store and build the row from the stored
+    history; None while nothing is stored for symbol."""
+    ohlcv_store.append(asset_class, symbol, bars)
+    stored = ohlcv_store.read(asset_class, symbol)
+    return row_from_bars(symbol, stored) if len(stored) else None
+
+def store_class_bars(asset_class: str, bars: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """store_bars for every symbol in bars, skipping symbols with no rows."""
+    rows = (store_bars(asset_class, symbol, symbol_bars) for symbol, symbol_bars in bars.items())
+    return [row for row in rows if row is not None]
+
+def stored_fetch_args(asset_class: str, symbols: List[str]) -> Tuple[str, Dict[str, int]]:
+    """outputsize and since for fetching only the bars the store lacks."""
+    sizes = {ohlcv_store.outputsize(asset_class, symbol) for symbol in symbols}
+    return 'full' if 'full' in sizes else 'compact', ohlcv_store.last_timestamps(asset_class, symbols)
+
+async def fetch_class_async(asset_class: str) -> List[Dict[str, Any]]:
+    """Fetch every symbol of an asset class from the provider in one batch."""
+    symbols = _class_symbols(asset_class)
+    if not SCHEDULED:
+        bars = await fetch_bars(asset_class, symbols)
+        return await run_cpu(rows_from_bars, bars)
+    # The store reads and writes memory maps; keep that off the event loop
+    bars = await fetch_bars(asset_class, symbols, *await run_cpu(stored_fetch_args, asset_class, symbols))
+    return await run_cpu(store_class_bars, asset_class, bars)
+
+# Latest row of every symbol in universe order, None until it has one
+_row_slots: Dict[str, List[Optional[Dict[str, Any]]]] = {
+    asset_class: [None] * len(_class_symbols(asset_class)) for asset_class in ASSET_CLASSES
+}
+# Latest class lists built from _row_slots
+_class_rows: Dict[str, List[Dict[str, Any]]] = {}
+
+def store_symbol_rows(asset_class: str, new_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace some symbols' rows in their asset class and cache the class rows."""
+    slots = _row_slots[asset_class]
+    for row in new_rows:
+        slots[registry.index(asset_class, row['symbol'])] = row
+    class_rows = [row for row in slots if row is not None]
+    _class_rows[asset_class] = class_rows
+    cache.set(asset_class, class_rows, ttl=class_ttl(asset_class))
+    return class_rows
+
+def _symbol_job(asset_class: str, symbol: str):
+    async def refresh():
+        bars = await fetch_bars(asset_class, [symbol], *await run_cpu(stored_fetch_args, asset_class, [symbol]))
+        await run_cpu(lambda: store_symbol_rows(asset_class, store_class_bars(asset_class, bars)))
+    return refresh
+
+def register_refresh_jobs(scheduler) -> None:
+    """Register one quota-limited refresh job per symbol with scheduler."""
+    for asset_class in ASSET_CLASSES:
+        for symbol in _class_symbols(asset_class):
+            scheduler.register(f'{asset_class}:{symbol}', provider.name,
+                               _symbol_job(asset_class, symbol), CACHE_TTLS[asset_class])
+
+def record_demand(asset_classes=ASSET_CLASSES) -> None:
+    """Tell the refresh scheduler that clients read these asset classes."""
+    if SCHEDULED:
+        refresh_scheduler.record_demand(asset_classes)
+
+if SCHEDULED:
+    register_refresh_jobs(refresh_scheduler)
+
+def load_from_store() -> MarketSnapshot:
+    """Publish a snapshot from the on-disk store without any network calls.
+
+    Classes with nothing stored are published empty, so handlers have a
+    snapshot to serve from startup on; the refresher fills them in as data
+    arrives. Loaded classes are cached as already expired. Scheduled symbols
+    count as refreshed when their bars were stored, so a restart does not
+    spend quota downloading them again.
+    """
+    now, monotonic_now = time.time(), time.monotonic()
+    data = {}
+    for asset_class in ASSET_CLASSES:
+        rows = []
+        for symbol in _class_symbols(asset_class):
+            bars = ohlcv_store.read(asset_class, symbol)
+            if len(bars):
+                rows.append(row_from_bars(symbol, bars))
+                _row_slots[asset_class][registry.index(asset_class, symbol)] = rows[-1]
+                updated_at = ohlcv_store.updated_at(asset_class, symbol)
+                if SCHEDULED and updated_at is not None:
+                    refresh_scheduler.mark_fresh(f'{asset_class}:{symbol}',
+                                                 monotonic_now - max(0.0, now - updated_at))
+        if rows:
+            _class_rows[asset_class] = rows
+            cache.set(asset_class, rows, ttl=0)
+        data[asset_class] = rows
+    return snapshots.publish_rows(data)
+
+async def refresh_class_rows(asset_class: str) -> List[Dict[str, Any]]:
+    """Fetch the current rows of one asset class (refresher only).
+
+    Quota-limited providers are refreshed symbol by symbol by the refresh
+    scheduler as its quota allows; this returns the rows it has stored,
+    and fails the run while it has none.
+    """
+    if provider is simulator and MARKET_REFRESH_WORKERS:
+        return await refresh_class_sharded(asset_class)
+    if not SCHEDULED:
+        return await fetch_class_async(asset_class)
+    rows = _class_rows.get(asset_class)
+    if rows is None:
+        raise RuntimeError(f"no {asset_class} data available yet")
+    return rows
+
+async def refresh_class_async(asset_class: str) -> MarketSnapshot:
+    """Refresh one asset class into the market cache and publish it as a
+    new snapshot.
+
+    Shares the fetch with any stale read refreshing the class at the same
+    time.
+    """
+    rows = await cache.arefresh(asset_class, lambda: refresh_class_rows(asset_class),
+                                ttl=class_ttl(asset_class))
+    # Building the class frame is O(symbols); keep it off the event loop
+    return await run_cpu(snapshots.publish_rows, {asset_class: rows})
+
+def get_shard_pool() -> ProcessPoolExecutor:
+    global _shard_pool
+    if _shard_pool is None:
+        _shard_pool = ProcessPoolExecutor(MARKET_REFRESH_WORKERS,
+                                          mp_context=multiprocessing.get_context('spawn'))
+    return _shard_pool
+
+def shutdown_shard_pool() -> None:
+    global _shard_pool
+    if _shard_pool is not None:
+        _shard_pool.shutdown(cancel_futures=True)
+        _shard_pool = None
+
+async def refresh_class_sharded(asset_class: str) -> List[Dict[str, Any]]:
+    """Refresh an asset class as shards spread over the process pool.
+
+    Shards are contiguous runs of the universe, so their rows are joined
+    in shard order once all have finished and the refresh publishes a
+    single version.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_shard_pool()
+    spec = simulator.spec()
+    start = time.perf_counter()
+    try:
+        shards = await asyncio.gather(*(
+            loop.run_in_executor(pool, refresh_shard, spec, asset_class, shard)
+            for shard in registry.shards(asset_class, MARKET_SHARD_SIZE)
+        ))
+    except Exception:
+        upstream_fetch_errors.labels(simulator.name).inc()
+        raise
+    finally:
+        upstream_fetch_duration.labels(simulator.name).observe(time.perf_counter() - start)
+    return await run_cpu(store_symbol_rows, asset_class, list(chain.from_iterable(shards)))
+
+def chart_bars_since(asset_class: str, symbol: str, since: Optional[int]) -> np.ndarray:
+    """Bars after `since` for charting: generated by the simulator, read
+    from the store otherwise."""
+    if provider is simulator:
+        return simulator.bars_since(asset_class, symbol, since)
+    bars = ohlcv_store.read(asset_class, symbol)
+    if since is not None:
+        bars = bars[int(np.searchsorted(bars['ts'], since, side='right')):]
+    return bars
+
+# Bars of history the indicator state starts from
+INDICATOR_BARS = int(os.getenv('INDICATOR_BARS', '200'))
+
+def indicator_bars_since(asset_class: str, symbol: str, since: Optional[int]) -> np.ndarray:
+    """Bars after `since` for the indicator state; the last INDICATOR_BARS
+    on first load."""
+    bars = chart_bars_since(asset_class, symbol, since)
+    return bars[-INDICATOR_BARS:] if since is None else bars
+
+def get_indicators(asset_class: str, symbols: List[str]) -> Dict[str, np.ndarray]:
+    """Latest indicator values of symbols, updated with the bars each
+    gained since the last call."""
+    return indicator_books.get(asset_class).latest(
+        symbols, lambda symbol, since: indicator_bars_since(asset_class, symbol, since))
+
+def _chart_loader(asset_class: str, symbol: str) -> Callable[[Optional[int]], np.ndarray]:
+    if symbol not in registry.symbol_map(asset_class):
+        raise KeyError(f"unknown symbol {asset_class}:{symbol}")
+    return lambda since: chart_bars_since(asset_class, symbol, since)
+
+def chart_version(asset_class: str, symbol: str) -> int:
+    """Timestamp of symbol's latest bar (0 without bars), after bringing
+    its chart up to date. Charts are cached and tagged by it, not by the
+    snapshot version, since they only change when a bar arrives."""
+    return chart_pyramids.get(asset_class, symbol, _chart_loader(asset_class, symbol)).last_ts or 0
+
+def get_chart(asset_class: str, symbol: str, range_: str = '1m', points: int = 100) -> Dict[str, Any]:
+    """Downsampled close prices of symbol over range_, about `points` long."""
+    return chart_pyramids.chart(asset_class, symbol, _chart_loader(asset_class, symbol), range_, points)
+
+market_refresher = MarketRefresher(refresh_class_async, CACHE_TTLS, jitter=REFRESH_JITTER)
+
+def get_current_snapshot() -> MarketSnapshot:
+    """Get the snapshot last published by load_from_store or the background
+    refresher.
 
-def get_cached_data(key: str, fetch_func):
-    """Get data from cache or fetch new data if cache is expired."""
-    # For testing, always return mock data
-    return get_mock_crypto_data() if 'crypto' in key else \
-           get_mock_forex_data() if 'forex' in key else \
-           get_mock_stock_data()
-
-def get_mock_crypto_data() -> List[Dict[str, Any]]:
-    """Return mock cryptocurrency data for testing."""
-    return [
-        {
-            'symbol': 'BTC',
-            'price': 50000 + np.random.uniform(-1000, 1000),
-            'change': np.random.uniform(-5, 5),
-            'volume': np.random.uniform(1000000, 5000000),
-            'chartData': [50000 + np.random.uniform(-1000, 1000) for _ in range(24)]
-        },
-        {
-            'symbol': 'ETH',
-            'price': 3000 + np.random.uniform(-100, 100),
-            'change': np.random.uniform(-5, 5),
-            'volume': np.random.uniform(500000, 2000000),
-            'chartData': [3000 + np.random.uniform(-100, 100) for _ in range(24)]
-        }
-    ]
-
-def get_mock_forex_data() -> List[Dict[str, Any]]:
-    """Return mock forex data for testing."""
-    return [
-        {
-            'symbol': 'EURUSD',
-            'price': 1.08 + np.random.uniform(-0.01, 0.01),
-            'change': np.random.uniform(-1, 1),
-            'volume': 0,
-            'chartData': [1.08 + np.random.uniform(-0.01, 0.01) for _ in range(24)]
-        },
-        {
-            'symbol': 'GBPUSD',
-            'price': 1.25 + np.random.uniform(-0.01, 0.01),
-            'change': np.random.uniform(-1, 1),
-            'volume': 0,
-            'chartData': [1.25 + np.random.uniform(-0.01, 0.01) for _ in range(24)]
-        }
-    ]
-
-def get_mock_stock_data() -> List[Dict[str, Any]]:
-    """Return mock stock data for testing."""
-    return [
-        {
-            'symbol': 'SPX',
-            'price': 5000 + np.random.uniform(-50, 50),
-            'change': np.random.uniform(-2, 2),
-            'volume': np.random.uniform(1000000, 3000000),
-            'chartData': [5000 + np.random.uniform(-50, 50) for _ in range(24)]
-        },
-        {
-            'symbol': 'NDX',
-            'price': 17000 + np.random.uniform(-100, 100),
-            'change': np.random.uniform(-2, 2),
-            'volume': np.random.uniform(500000, 1500000),
-            'chartData': [17000 + np.random.uniform(-100, 100) for _ in range(24)]
-        }
-    ]
-
-def get_crypto_prices() -> List[Dict[str, Any]]:
-    """Fetch top cryptocurrency prices and their changes."""
-    def fetch_crypto():
-        crypto_symbols = {
-            'BTC': 'BTCUSD',
-            'ETH': 'ETHUSD',
-            'BNB': 'BNBUSD',
-            'ADA': 'ADAUSD',
-            'DOGE': 'DOGEUSD'
-        }
-        market_data = []
-        
-        for symbol, av_symbol in crypto_symbols.items():
-            data, _ = ts.get_daily(symbol=av_symbol)
-            latest_data = list(data.values())[0]
-            historical_data = list(data.values())[:24]
-            
-            chart_data = [float(d['4. close']) for d in historical_data]
-            current_price = float(latest_data['4. close'])
-            prev_price = float(list(data.values())[1]['4. close'])
-            price_change = ((current_price - prev_price) / prev_price) * 100
-            
-            volume = 0
-            if '5. volume' in latest_data:
-                volume = float(latest_data['5. volume'])
-            elif '6. volume' in latest_data:
-                volume = float(latest_data['6. volume'])
-            
-            market_data.append({
-                'symbol': symbol,
-                'price': current_price,
-                'change': price_change,
-                'volume': volume,
-                'chartData': chart_data
-            })
-        
-        return market_data
-    
-    return get_cached_data('crypto', fetch_crypto)
-
-def get_forex_rates() -> List[Dict[str, Any]]:
-    """Fetch major forex pairs rates."""
-    def fetch_forex():
-        forex_pairs = {
-            'EURUSD': ('EUR', 'USD'),
-            'GBPUSD': ('GBP', 'USD'),
-            'JPYUSD': ('JPY', 'USD'),
-            'AUDUSD': ('AUD', 'USD')
-        }
-        market_data = []
-        
-        for symbol, (from_currency, to_currency) in forex_pairs.items():
-            data, _ = fx.get_currency_exchange_daily(from_symbol=from_currency, 
-                                                   to_symbol=to_currency)
-            latest_data = list(data.values())[0]
-            historical_data = list(data.values())[:24]
-            
-            chart_data = [float(d['4. close']) for d in historical_data]
-            current_price = float(latest_data['4. close'])
-            prev_price = float(list(data.values())[1]['4. close'])
-            price_change = ((current_price - prev_price) / prev_price) * 100
-            
-            market_data.append({
-                'symbol': symbol,
-                'price': current_price,
-                'change': price_change,
-                'volume': 0,
-                'chartData': chart_data
-            })
-        
-        return market_data
-    
-    return get_cached_data('forex', fetch_forex)
-
-def get_stock_indices() -> List[Dict[str, Any]]:
-    """Fetch major stock indices."""
-    def fetch_stocks():
-        indices = {
-            'SPX': 'SPY',
-            'NDX': 'QQQ',
-            'DJI': 'DIA'
-        }
-        
-        market_data = []
-        for symbol, av_symbol in indices.items():
-            data, _ = ts.get_daily(symbol=av_symbol)
-            latest_data = list(data.values())[0]
-            historical_data = list(data.values())[:24]
-            
-            chart_data = [float(d['4. close']) for d in historical_data]
-            current_price = float(latest_data['4. close'])
-            prev_price = float(list(data.values())[1]['4. close'])
-            price_change = ((current_price - prev_price) / prev_price) * 100
-            
-            volume = 0
-            if '5. volume' in latest_data:
-                volume = float(latest_data['5. volume'])
-            elif '6. volume' in latest_data:
-                volume = float(latest_data['6. volume'])
-            
-            market_data.append({
-                'symbol': symbol,
-                'price': current_price,
-                'change': price_change,
-                'volume': volume,
-                'chartData': chart_data
-            })
-        
-        return market_data
-    
-    return get_cached_data('stocks', fetch_stocks)
-
-def get_market_analysis() -> Dict[str, List[Dict[str, Any]]]:
-    """Get comprehensive market analysis data."""
-    return {
-        'crypto': get_crypto_prices(),
-        'forex': get_forex_rates(),
-        'stocks': get_stock_indices(),
-        'all': get_crypto_prices() + get_forex_rates() + get_stock_indices()
-    } 
\ No newline at end of file
+    Request handlers only read this; they never fetch. A class the
+    refresher has fallen behind on is served as last published. Before
+    anything is published (the lifespan has not run), every class is
+    published empty.
+    """
+    return snapshots.current or snapshots.publish_rows({asset_class: [] for asset_class in ASSET_CLASSES})
@@ -0,0 +1,338 @@
+"""Prometheus metrics, rendered in the text exposition format by /metrics.
+
+Recording is built for the request path: each thread increments its own
+pre-bucketed list of floats, so recording never takes a lock or contends
+with other threads. Shards are summed only when /metrics is scraped.
+Values that already live elsewhere (cache counters, snapshot age, pool
+queues) are read by collectors at scrape time and cost nothing between
+scrapes.
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import math
+import threading
+import time
+
+from starlette.routing import Match
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers a cached 304 up to a slow upstream fetch
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class _Shards:
+    """Per-thread lists of `size` floats, summed on demand."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._all: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def mine(self) -> List[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0.0] * self.size
+            with self._lock:
+                self._all.append(values)
+            self._local.values = values
+            return values
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._all)
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.size
+
+
+class _Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """A child holding the values of one label set."""
+
+    def labels(self, *values: str):
+        """The child for these label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, values)))
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.mine()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        yield name, labels, self.value()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    """Summed shards, so inc and dec may happen on different threads."""
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._shards.mine()[0] -= amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket, one for +Inf, then the sum
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        values = self._shards.mine()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self) -> '_Timer':
+        return _Timer(self.observe)
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        totals = self._shards.totals()
+        cumulative = 0.0
+        for bound, count in zip((*self.buckets, math.inf), totals):
+            cumulative += count
+            yield f'{name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative
+        yield f'{name}_sum', labels, totals[-1]
+        yield f'{name}_count', labels, cumulative
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> '_Timer':
+        return self._default.time()
+
+
+class _Timer:
+    """Context manager observing the elapsed seconds."""
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(time.perf_counter() - self._start)
+
+
+class Collector:
+    """Metrics read from elsewhere at scrape time.
+
+    collect returns (sample name, labels, value) triples; every sample
+    name must start with name.
+    """
+
+    def __init__(self, name: str, kind: str, help: str, collect: Callable[[], Iterable[Sample]]):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        return self._collect()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(int(value)) if float(value).is_integer() and abs(value) < 1e15 else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, help: str,
+                  collect: Callable[[], Iterable[Sample]]) -> Collector:
+        return self.register(Collector(name, kind, help, collect))
+
+    def render(self) -> bytes:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {_escape(metric.help)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                    lines.append(f'{name}{{{label_text}}} {_format_value(value)}')
+                else:
+                    lines.append(f'{name} {_format_value(value)}')
+        lines.append('')
+        return '\n'.join(lines).encode()
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template.',
+    ('method', 'route', 'status'))
+http_requests_in_flight = metrics.gauge(
+    'http_requests_in_flight', 'HTTP requests being handled, by route template.', ('method', 'route'))
+upstream_fetch_duration = metrics.histogram(
+    'upstream_fetch_duration_seconds', 'Market data fetch latency by provider.', ('provider',))
+upstream_fetch_errors = metrics.counter(
+    'upstream_fetch_errors_total', 'Failed market data fetches by provider.', ('provider',))
+signal_generation_duration = metrics.histogram(
+    'signal_generation_duration_seconds', 'Time spent generating trading signals for a snapshot.')
+signal_generation_errors = metrics.counter(
+    'signal_generation_errors_total', 'Trading signal generations that failed.')
+signal_cache_lookups = metrics.counter(
+    'signal_cache_lookups_total', 'Trading signal lookups by result; a miss generates signals.', ('result',))
+model_inference_duration = metrics.histogram(
+    'model_inference_duration_seconds', 'Time in one batched predict_proba call, by asset class.',
+    ('asset_class',))
+
+
+class RouteTemplates:
+    """Map request paths to route templates (/market/chart, not the raw
+    path), so label sets stay bounded. Matches are cached per path."""
+
+    def __init__(self, max_paths: int = 1024):
+        self.max_paths = max_paths
+        self._templates: Dict[Tuple[str, str], str] = {}
+
+    def get(self, scope) -> str:
+        key = (scope['method'], scope['path'])
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+        template = 'unmatched'
+        for route in scope['app'].router.routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                template = route.path
+                break
+        # Unmatched paths are not cached; they are unbounded
+        if template != 'unmatched' and len(self._templates) < self.max_paths:
+            self._templates[key] = template
+        return template
+
+
+class MetricsMiddleware:
+    """Record per-route latency and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        method = scope['method']
+        route = self.routes.get(scope)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def recording_send(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_flight = http_requests_in_flight.labels(method, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            in_flight.dec()
+            http_request_duration.labels(method, route, str(status_code)).observe(
+                time.perf_counter() - start)
@@ -0,0 +1,251 @@
+"""Trained scikit-learn models for trading signals.
+
+A model file (MODEL_DIR/<asset_class>.joblib) holds a fitted estimator
+with predict_proba, plus its features written as rule expressions (see
+rules.py), such as "(close - sma_long) / sma_long". Predictions are
+made per snapshot. The features are evaluated across all of a class's
+symbols into one matrix, and a single predict_proba call gives each
+symbol's signal type (the most likely class) and confidence (that
+class's probability). HOLD is a signal like any other, as it is for
+rules. A symbol is only signalled when its confidence reaches the
+model's min_confidence; the class's rule set decides the others.
+
+ModelRegistry loads every model at startup. reload swaps in new files
+atomically: a model is fully loaded and checked before it replaces the
+old one, and a prediction keeps using the model it started with, so no
+request fails or sees a half-loaded model. Swapped models apply from the
+next snapshot version.
+
+Train a model from simulated history with:
+
+    python models.py crypto
+"""
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import glob
+import os
+import sys
+import threading
+import time
+
+import joblib
+import numpy as np
+from dotenv import load_dotenv
+
+from metrics import model_inference_duration
+from rules import EXPRESSION_NAMES, RuleEnv, RuleError, RuleResult, compile_expression, per_symbol
+from snapshot import AssetFrame
+
+load_dotenv()
+
+MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(os.path.dirname(__file__), 'data', 'models'))
+# Unless a model file sets min_confidence, a prediction is used when its
+# probability is at least this multiple of chance (1 / number of classes)
+MODEL_CONFIDENCE_LIFT = float(os.getenv('MODEL_CONFIDENCE_LIFT', '1.1'))
+
+DEFAULT_FEATURES = (
+    'change / 100',
+    'nz(rsi, 50) / 100 - 0.5',
+    'nz(macd_hist / close)',
+    'nz((close - sma_long) / sma_long)',
+    'nz((close - bb_middle) / (bb_upper - bb_lower))',
+    'nz(atr / close)',
+)
+
+# Class labels a model may predict, as signal directions
+LABEL_DIRECTIONS = {-1: -1, 0: 0, 1: 1, 'SELL': -1, 'HOLD': 0, 'BUY': 1}
+
+
+class LoadedModel(NamedTuple):
+    asset_class: str
+    estimator: Any
+    features: Tuple[str, ...]
+    compiled: Tuple[Callable[[RuleEnv], Any], ...]
+    # Direction for each column of predict_proba
+    directions: np.ndarray
+    min_confidence: float
+    path: str
+    mtime: float
+    loaded_at: float
+
+
+def load_model(asset_class: str, path: str) -> LoadedModel:
+    """Load and check a model file; raises ValueError if it is unusable."""
+    mtime = os.path.getmtime(path)
+    bundle = joblib.load(path)
+    estimator = bundle.get('estimator') if isinstance(bundle, Mapping) else None
+    if estimator is None or not hasattr(estimator, 'predict_proba'):
+        raise ValueError(f"{path}: no estimator with predict_proba")
+    features = tuple(bundle.get('features', ()))
+    try:
+        compiled = tuple(compile_expression(feature, EXPRESSION_NAMES) for feature in features)
+    except RuleError as e:
+        raise ValueError(f"{path}: {e}") from None
+    try:
+        directions = np.array([LABEL_DIRECTIONS[label] for label in estimator.classes_.tolist()])
+    except KeyError as e:
+        raise ValueError(f"{path}: unknown class label {e}") from None
+    # Fails here, rather than on the first snapshot, if the feature count is off
+    estimator.predict_proba(np.zeros((1, len(features))))
+    min_confidence = float(bundle.get('min_confidence', MODEL_CONFIDENCE_LIFT / len(directions)))
+    return LoadedModel(asset_class, estimator, features, compiled, directions, min_confidence,
+                       path, mtime, time.time())
+
+
+class ModelRegistry:
+    """The current model of each asset class, swapped atomically."""
+
+    def __init__(self, model_dir: str = MODEL_DIR):
+        self.model_dir = model_dir
+        # Replaced, never mutated, so readers need no lock
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self.errors: Dict[str, str] = {}
+
+    def get(self, asset_class: str) -> Optional[LoadedModel]:
+        return self._models.get(asset_class)
+
+    def swap(self, model: LoadedModel) -> None:
+        with self._lock:
+            self._models = {**self._models, model.asset_class: model}
+
+    def remove(self, asset_class: str) -> None:
+        with self._lock:
+            self._models = {name: model for name, model in self._models.items() if name != asset_class}
+
+    def load_all(self) -> Dict[str, str]:
+        """Load new or changed model files from model_dir and drop models
+        whose file is gone. Returns what happened per asset class; a file
+        that fails to load leaves the current model in place."""
+        results = {}
+        paths = {
+            os.path.splitext(os.path.basename(path))[0]: path
+            for path in glob.glob(os.path.join(self.model_dir, '*.joblib'))
+        }
+        for asset_class, path in sorted(paths.items()):
+            current = self.get(asset_class)
+            try:
+                if current is not None and current.path == path and current.mtime == os.path.getmtime(path):
+                    results[asset_class] = 'unchanged'
+                    continue
+                self.swap(load_model(asset_class, path))
+                self.errors.pop(asset_class, None)
+                results[asset_class] = 'loaded'
+            except Exception as e:
+                print(f"Error loading model {path}: {e}")
+                self.errors[asset_class] = str(e)
+                results[asset_class] = 'failed'
+        for asset_class in set(self._models) - set(paths):
+            self.remove(asset_class)
+            results[asset_class] = 'removed'
+        return results
+
+    def predict(self, asset_class: str, frame: AssetFrame,
+                indicators: Callable[[], Mapping[str, np.ndarray]]) -> Optional[RuleResult]:
+        """Direction, confidence and emit mask for every symbol of frame
+        from one predict_proba call, or None without a model. Predictions
+        below the model's min_confidence are not emitted."""
+        model = self.get(asset_class)
+        if model is None:
+            return None
+        n = len(frame)
+        env = RuleEnv(frame, indicators)
+        features = np.column_stack([per_symbol(feature(env), n) for feature in model.compiled])
+        with model_inference_duration.labels(asset_class).time():
+            probabilities = model.estimator.predict_proba(np.nan_to_num(features))
+        best = probabilities.argmax(axis=1)
+        direction, confidence = model.directions[best], probabilities[np.arange(n), best]
+        return direction, confidence, confidence >= model.min_confidence
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'model_dir': self.model_dir,
+            'models': {
+                asset_class: {
+                    'path': model.path,
+                    'estimator': type(model.estimator).__name__,
+                    'features': list(model.features),
+                    'classes': model.estimator.classes_.tolist(),
+                    'min_confidence': model.min_confidence,
+                    'loaded_at': model.loaded_at,
+                }
+                for asset_class, model in self._models.items()
+            },
+            'errors': dict(self.errors),
+        }
+
+
+model_registry = ModelRegistry()
+
+
+class _HistoryFrame(NamedTuple):
+    """Frame columns as (symbols, bars) arrays, for evaluating features
+    at every bar at once."""
+    price: np.ndarray
+    change: np.ndarray
+    volume: np.ndarray
+
+
+def training_set(bars: Mapping[str, np.ndarray], features: Sequence[str] = DEFAULT_FEATURES,
+                 horizon: int = 5, warmup: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature rows and BUY/HOLD/SELL labels from (symbols, bars) OHLCV
+    matrices.
+
+    A bar is labelled by its return over the next `horizon` bars: BUY or
+    SELL beyond half a typical move over that horizon, HOLD otherwise.
+    """
+    from indicators import compute_indicators
+
+    close = np.asarray(bars['close'], dtype=np.float64)
+    latest = compute_indicators(bars['high'], bars['low'], close)._asdict()
+    change = np.zeros_like(close)
+    change[:, 1:] = (close[:, 1:] - close[:, :-1]) / close[:, :-1] * 100
+    frame = _HistoryFrame(close, change, np.asarray(bars['volume'], dtype=np.float64))
+    env = RuleEnv(frame, lambda: latest)
+    columns = [np.broadcast_to(compile_expression(feature, EXPRESSION_NAMES)(env), close.shape)
+               for feature in features]
+
+    forward = close[:, horizon:] / close[:, :-horizon] - 1
+    typical = np.std(np.diff(np.log(close), axis=1), axis=1, keepdims=True) * np.sqrt(horizon)
+    labels = np.where(forward > typical / 2, 1, np.where(forward < -typical / 2, -1, 0))
+
+    window = slice(warmup, close.shape[1] - horizon)
+    X = np.nan_to_num(np.stack([column[:, window] for column in columns], axis=-1).reshape(-1, len(features)))
+    return X, labels[:, window].reshape(-1)
+
+
+def train_model(asset_class: str, n_symbols: int = 300, n_bars: int = 600, seed: int = 7,
+                features: Sequence[str] = DEFAULT_FEATURES) -> Dict[str, Any]:
+    """Fit a scaled logistic regression on simulated history of asset_class."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    from providers import SimulatedProvider
+
+    bars = SimulatedProvider(seed=seed).bulk(asset_class, n_symbols, n_bars, dtype=np.float64)
+    X, y = training_set(bars, features)
+    estimator = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    estimator.fit(X, y)
+    return {'estimator': estimator, 'features': list(features), 'trained_at': time.time()}
+
+
+def save_model(bundle: Dict[str, Any], asset_class: str, model_dir: str = MODEL_DIR) -> str:
+    """Write a model bundle where the registry picks it up; the file is
+    renamed into place so a reload never reads it half-written."""
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, f'{asset_class}.joblib')
+    tmp_path = f'{path}.tmp'
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(asset_classes: List[str]) -> None:
+    for asset_class in asset_classes:
+        start = time.perf_counter()
+        path = save_model(train_model(asset_class), asset_class)
+        print(f"{asset_class}: wrote {path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ['crypto'])
@@ -0,0 +1,119 @@
+from itertools import chain, takewhile
+from operator import itemgetter
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from store import OHLCV_DTYPE
+
+PRICE_KEYS = ('1. open', '2. high', '3. low', '4. close')
+VOLUME_KEYS = ('5. volume', '6. volume')
+
+# Keys under which Alpha Vantage returns the bars, by endpoint
+SERIES_KEYS = (
+    'Time Series (Daily)',
+    'Time Series FX (Daily)',
+    'Time Series (Digital Currency Daily)',
+)
+
+
+def series_from_payload(payload: Mapping[str, Any]) -> Mapping[str, Mapping[str, str]]:
+    """Pick the bar mapping out of a full Alpha Vantage response."""
+    for key in SERIES_KEYS:
+        if key in payload:
+            return payload[key]
+    for key, value in payload.items():
+        if key.startswith('Time Series'):
+            return value
+    raise KeyError('no time series in payload')
+
+
+def _newer_items(series: Mapping[str, Mapping[str, str]], since: int):
+    """Items whose date key is after the `since` timestamp.
+
+    Keys are ISO dates, which sort as strings, so they are compared without
+    parsing; for a newest-first series the scan stops at the first old bar.
+    """
+    first_key = next(iter(series))
+    since_key = str(np.datetime64(int(since), 's')).replace('T', ' ')[:len(first_key)]
+    items = iter(series.items())
+    if first_key >= next(reversed(series)):
+        return list(takewhile(lambda item: item[0] > since_key, items))
+    return [item for item in items if item[0] > since_key]
+
+
+def parse_time_series(series: Mapping[str, Mapping[str, str]],
+                      since: Optional[int] = None) -> np.ndarray:
+    """Convert an Alpha Vantage time series into OHLCV records, oldest first.
+
+    The volume key is resolved once from the first bar instead of per bar,
+    and every price string goes through a single fromiter pass into a
+    (bars, columns) matrix. With `since` (seconds since epoch), only bars
+    after it are converted, so an incremental refresh costs the same
+    however long the returned history is.
+    """
+    if series and since is not None:
+        series = dict(_newer_items(series, since))
+    n = len(series)
+    bars = np.zeros(n, dtype=OHLCV_DTYPE)
+    if n == 0:
+        return bars
+
+    values = series.values()
+    first = next(iter(values))
+    volume_key = next((key for key in VOLUME_KEYS if key in first), None)
+    keys = PRICE_KEYS + ((volume_key,) if volume_key else ())
+
+    matrix = np.fromiter(
+        map(float, chain.from_iterable(map(itemgetter(*keys), values))),
+        dtype=np.float64, count=n * len(keys),
+    ).reshape(n, len(keys))
+    bars['ts'] = np.array(list(series), dtype='datetime64[s]').astype(np.int64)
+    bars['open'] = matrix[:, 0]
+    bars['high'] = matrix[:, 1]
+    bars['low'] = matrix[:, 2]
+    bars['close'] = matrix[:, 3]
+    if volume_key:
+        bars['volume'] = matrix[:, 4]
+
+    # Alpha Vantage lists the newest bar first
+    if n > 1 and bars['ts'][0] > bars['ts'][-1]:
+        bars = bars[::-1]
+    return np.ascontiguousarray(bars)
+
+
+def price_change(bars: np.ndarray) -> float:
+    """Percent change of the last close against the one before it."""
+    closes = bars['close'][-2:]
+    if len(closes) < 2:
+        return 0.0
+    return float((closes[1] - closes[0]) / closes[0] * 100)
+
+
+def chart_window(bars: np.ndarray, points: int) -> np.ndarray:
+    """The last `points` closes, newest first."""
+    return bars['close'][-points:][::-1]
+
+
+# Number of closes (newest first) sent as chartData
+CHART_POINTS = 24
+
+
+def row_from_bars(symbol: str, bars: np.ndarray) -> Dict[str, Any]:
+    """Turn OHLCV bars (oldest first, at least one) into a market data row."""
+    return {
+        'symbol': symbol,
+        'price': float(bars['close'][-1]),
+        'change': price_change(bars),
+        'volume': float(bars['volume'][-1]),
+        'chartData': chart_window(bars, CHART_POINTS).tolist()
+    }
+
+
+def rows_from_bars(bars: Mapping[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Rows for every symbol in bars, skipping symbols with no bars."""
+    return [row_from_bars(symbol, symbol_bars) for symbol, symbol_bars in bars.items() if len(symbol_bars)]
+
+
+def parse_payload(payload: Dict[str, Any], since: Optional[int] = None) -> np.ndarray:
+    return parse_time_series(series_from_payload(payload), since)
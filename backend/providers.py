@@ -0,0 +1,249 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+import asyncio
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from executors import run_cpu
+from parsing import parse_time_series
+from store import OHLCV_DTYPE
+from upstream import AlphaVantageClient
+
+
+class MarketDataProvider(ABC):
+    """Source of OHLCV bars for a set of symbols in one asset class."""
+    name = 'provider'
+
+    @abstractmethod
+    async def fetch_bars(self, asset_class: str, symbols: List[str], outputsize: str = 'compact',
+                         since: Optional[Mapping[str, int]] = None) -> Dict[str, np.ndarray]:
+        """Return OHLCV_DTYPE records (oldest first) keyed by symbol.
+
+        since maps symbols to the timestamp of the last bar the caller
+        already has; providers may skip older bars.
+        """
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Daily bars from Alpha Vantage.
+
+    symbol_map maps asset class -> our symbol -> the request argument:
+    a ticker for TIME_SERIES_DAILY or a (from, to) pair for FX_DAILY.
+    """
+    name = 'alpha_vantage'
+
+    def __init__(self, client: AlphaVantageClient, symbol_map: Mapping[str, Mapping[str, object]]):
+        self.client = client
+        self.symbol_map = symbol_map
+
+    async def fetch_one(self, asset_class: str, symbol: str, outputsize: str = 'compact',
+                        since: Optional[int] = None) -> np.ndarray:
+        request = self.symbol_map[asset_class][symbol]
+        if isinstance(request, tuple):
+            data = await self.client.get_currency_exchange_daily(*request, outputsize=outputsize)
+        else:
+            data = await self.client.get_daily(request, outputsize=outputsize)
+        return parse_time_series(data, since)
+
+    async def fetch_bars(self, asset_class: str, symbols: List[str], outputsize: str = 'compact',
+                         since: Optional[Mapping[str, int]] = None) -> Dict[str, np.ndarray]:
+        since = since or {}
+        results = await asyncio.gather(*(
+            self.fetch_one(asset_class, symbol, outputsize, since.get(symbol)) for symbol in symbols
+        ))
+        return dict(zip(symbols, results))
+
+
+# Per-class simulation parameters: annual drift, annual volatility, jumps
+# per year, jump size mean/std (log), typical volume (0 = no volume)
+SIMULATION_PARAMS = {
+    'crypto': {'mu': 0.2, 'sigma': 0.8, 'jump_rate': 12.0, 'jump_mean': -0.01, 'jump_std': 0.05, 'volume': 3e6},
+    'forex': {'mu': 0.0, 'sigma': 0.08, 'jump_rate': 2.0, 'jump_mean': 0.0, 'jump_std': 0.005, 'volume': 0.0},
+    'stocks': {'mu': 0.07, 'sigma': 0.2, 'jump_rate': 4.0, 'jump_mean': -0.005, 'jump_std': 0.02, 'volume': 2e6},
+}
+
+# Starting prices for known symbols; others get one derived from the name
+BASE_PRICES = {
+    'BTC': 50000.0, 'ETH': 3000.0, 'BNB': 300.0, 'ADA': 0.5, 'DOGE': 0.08,
+    'EURUSD': 1.08, 'GBPUSD': 1.25, 'JPYUSD': 0.0067, 'AUDUSD': 0.66,
+    'SPX': 5000.0, 'NDX': 17000.0, 'DJI': 38000.0,
+}
+
+DAYS_PER_YEAR = 365.25
+
+
+def symbol_seed(seed: int, asset_class: str, symbol: str) -> np.random.SeedSequence:
+    """Seed for one symbol, independent of which other symbols are simulated."""
+    return np.random.SeedSequence([seed, zlib.crc32(f'{asset_class}:{symbol}'.encode())])
+
+
+def base_price(symbol: str) -> float:
+    if symbol in BASE_PRICES:
+        return BASE_PRICES[symbol]
+    return 10.0 + zlib.crc32(symbol.encode()) % 990
+
+
+def simulate_increments(rng: np.random.Generator, shape: Tuple[int, ...], dt: float,
+                        mu: float, sigma: float, jump_rate: float, jump_mean: float,
+                        jump_std: float, volume: float, dtype=np.float64) -> Dict[str, np.ndarray]:
+    """Draw per-bar log returns, intrabar excursions and volumes.
+
+    Log returns are geometric Brownian motion plus compound Poisson jumps.
+    """
+    vol = float(sigma * np.sqrt(dt))
+    log_returns = rng.standard_normal(shape, dtype=dtype) * vol + (mu - 0.5 * sigma ** 2) * dt
+    jumps = rng.poisson(jump_rate * dt, shape)
+    jumped = jumps > 0
+    counts = jumps[jumped]
+    log_returns[jumped] += rng.normal(jump_mean * counts, jump_std * np.sqrt(counts))
+    excursion = np.abs(rng.standard_normal((2,) + tuple(shape), dtype=dtype)) * (0.5 * vol)
+    if volume:
+        volumes = volume * rng.lognormal(0.0, 0.5, shape).astype(dtype)
+    else:
+        volumes = np.zeros(shape, dtype=dtype)
+    return {'log_return': log_returns, 'up': excursion[0], 'down': excursion[1], 'volume': volumes}
+
+
+def build_ohlcv(open_: np.ndarray, close: np.ndarray, increments: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Highs and lows extend past the open/close range by the excursions."""
+    return {
+        'open': open_,
+        'high': np.maximum(open_, close) * np.exp(increments['up']),
+        'low': np.minimum(open_, close) * np.exp(-increments['down']),
+        'close': close,
+        'volume': increments['volume'],
+    }
+
+
+def simulate_paths(rng: np.random.Generator, n_paths: int, n_bars: int, start: np.ndarray,
+                   dt: float, dtype=np.float64, **params) -> Dict[str, np.ndarray]:
+    """Simulate (n_paths, n_bars) OHLCV matrices in one vectorized pass.
+
+    Opens are the previous close, starting from `start`.
+    """
+    increments = simulate_increments(rng, (n_paths, n_bars), dt, dtype=dtype, **params)
+    start = np.asarray(start, dtype=dtype).reshape(-1, 1)
+    close = start * np.exp(np.cumsum(increments['log_return'], axis=1))
+    open_ = np.concatenate((start, close[:, :-1]), axis=1)
+    return build_ohlcv(open_, close, increments)
+
+
+# Bars per independently seeded block of a simulated path
+BLOCK_BARS = 1024
+
+
+class SimulatedProvider(MarketDataProvider):
+    """Seeded, vectorized market simulator.
+
+    A symbol's path is cut into blocks of BLOCK_BARS bars; each block is
+    drawn from a generator seeded by (seed, class, symbol, block). Any bar
+    is then a pure function of the constructor arguments, so output is
+    reproducible however symbols are batched and in whichever process they
+    are generated, which lets refresh shards run on a process pool.
+
+    Bars are aligned to wall time: a new bar starts every bar_seconds after
+    epoch and covers bar_days of simulated market time, so the default
+    replays a day of movement per minute. `history` bars before epoch are
+    available from the start.
+    """
+    name = 'simulator'
+
+    def __init__(self, seed: int = 42, bar_seconds: int = 60, bar_days: float = 1.0,
+                 history: int = 500, epoch: Optional[int] = None,
+                 params: Mapping[str, Mapping[str, float]] = SIMULATION_PARAMS):
+        self.seed = seed
+        self.bar_seconds = bar_seconds
+        self.bar_days = bar_days
+        self.history = history
+        self.epoch = int(time.time()) // bar_seconds * bar_seconds if epoch is None else epoch
+        self.params = params
+        # Cumulative log return before each block, per (class, symbol)
+        self._block_offsets: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def spec(self) -> Dict[str, Any]:
+        """Constructor arguments that reproduce this simulator elsewhere."""
+        return {'seed': self.seed, 'bar_seconds': self.bar_seconds, 'bar_days': self.bar_days,
+                'history': self.history, 'epoch': self.epoch, 'params': dict(self.params)}
+
+    def _block(self, asset_class: str, symbol: str, block: int) -> Dict[str, np.ndarray]:
+        seed = np.random.SeedSequence([self.seed, zlib.crc32(f'{asset_class}:{symbol}'.encode()), block])
+        return simulate_increments(np.random.default_rng(seed), (BLOCK_BARS,),
+                                   self.bar_days / DAYS_PER_YEAR, **self.params[asset_class])
+
+    def _block_offset(self, asset_class: str, symbol: str, block: int) -> float:
+        with self._lock:
+            offsets = self._block_offsets.setdefault((asset_class, symbol), [0.0])
+            while len(offsets) <= block:
+                increments = self._block(asset_class, symbol, len(offsets) - 1)
+                # The same sum as the block's last level, so a block's
+                # first open is bit-equal to the previous block's last close
+                offsets.append(offsets[-1] + float(np.cumsum(increments['log_return'])[-1]))
+            return offsets[block]
+
+    def bars(self, asset_class: str, symbol: str, first: int, last: int) -> np.ndarray:
+        """OHLCV records for bar indices first..last inclusive.
+
+        Index 0 is the first bar of the available history. Each block's
+        levels start from its own fixed offset, so a bar's values do not
+        depend on the window it was requested in.
+        """
+        if last < first:
+            return np.empty(0, dtype=OHLCV_DTYPE)
+        first_block, last_block = first // BLOCK_BARS, last // BLOCK_BARS
+        blocks = [self._block(asset_class, symbol, b) for b in range(first_block, last_block + 1)]
+        increments = {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+        levels = [
+            base_price(symbol) * np.exp(self._block_offset(asset_class, symbol, b)
+                                        + np.concatenate(([0.0], np.cumsum(block['log_return']))))
+            for b, block in enumerate(blocks, first_block)
+        ]
+        opens = np.concatenate([block_levels[:-1] for block_levels in levels])
+        closes = np.concatenate([block_levels[1:] for block_levels in levels])
+
+        lo, hi = first - first_block * BLOCK_BARS, last - first_block * BLOCK_BARS + 1
+        window = {key: values[lo:hi] for key, values in increments.items()}
+        columns = build_ohlcv(opens[lo:hi], closes[lo:hi], window)
+
+        records = np.empty(hi - lo, dtype=OHLCV_DTYPE)
+        records['ts'] = self.epoch + (np.arange(first, last + 1) - self.history) * self.bar_seconds
+        for column, values in columns.items():
+            records[column] = values
+        return records
+
+    def current_index(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return (int(now) - self.epoch) // self.bar_seconds + self.history
+
+    def generate(self, asset_class: str, symbols: List[str], outputsize: str = 'compact',
+                 now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Synchronous fetch_bars: every symbol's bars up to `now`."""
+        last = self.current_index(now)
+        limit = 100 if outputsize == 'compact' else self.history
+        first = max(0, last - limit + 1)
+        return {symbol: self.bars(asset_class, symbol, first, last) for symbol in symbols}
+
+    async def fetch_bars(self, asset_class: str, symbols: List[str], outputsize: str = 'compact',
+                         since: Optional[Mapping[str, int]] = None) -> Dict[str, np.ndarray]:
+        return await run_cpu(self.generate, asset_class, symbols, outputsize)
+
+    def bars_since(self, asset_class: str, symbol: str, since: Optional[int] = None,
+                   now: Optional[float] = None) -> np.ndarray:
+        """Every bar after the `since` timestamp (all history when None)."""
+        first = 0 if since is None else max(0, (since - self.epoch) // self.bar_seconds + self.history + 1)
+        return self.bars(asset_class, symbol, first, self.current_index(now))
+
+    def bulk(self, asset_class: str, n_symbols: int, n_bars: int,
+             dtype=np.float32) -> Dict[str, np.ndarray]:
+        """One-shot (n_symbols, n_bars) matrices for benchmarks and load tests.
+
+        Uses a single generator for the whole batch, which is much faster
+        than per-symbol blocks; float32 halves the memory.
+        """
+        rng = np.random.default_rng(symbol_seed(self.seed, asset_class, f'bulk:{n_symbols}'))
+        start = 10.0 + rng.random(n_symbols) * 990
+        return simulate_paths(rng, n_symbols, n_bars, start, self.bar_days / DAYS_PER_YEAR,
+                              dtype=dtype, **self.params[asset_class])
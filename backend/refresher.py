@@ -0,0 +1,103 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import random
+import time
+
+from snapshot import MarketSnapshot
+
+
+class ClassStats:
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_duration: Optional[float] = None
+        self.last_publish_lag: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[float] = None
+        self.version: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_duration': self.last_duration,
+            'last_publish_lag': self.last_publish_lag,
+            'seconds_since_success': now - self.last_success_at if self.last_success_at else None,
+            'next_run_in': max(0.0, self.next_run_at - now) if self.next_run_at else None,
+            'last_error': self.last_error,
+            'version': self.version,
+        }
+
+
+class MarketRefresher:
+    """Refresh each asset class on its own schedule in the background.
+
+    refresh(asset_class) does the fetch and returns the published snapshot.
+    Runs are spaced by the class interval with random jitter so classes do
+    not line up; failures back off exponentially up to max_backoff.
+    Publish lag is the time from when a run was due to when its snapshot
+    was published.
+    """
+
+    def __init__(self, refresh: Callable[[str], Awaitable[MarketSnapshot]],
+                 intervals: Dict[str, float], jitter: float = 0.1, max_backoff: float = 600):
+        self.refresh = refresh
+        self.intervals = intervals
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.stats = {asset_class: ClassStats() for asset_class in intervals}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _delay(self, asset_class: str) -> float:
+        stats = self.stats[asset_class]
+        delay = self.intervals[asset_class]
+        if stats.consecutive_failures:
+            delay = min(delay * 2 ** stats.consecutive_failures, self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run(self, asset_class: str) -> None:
+        stats = self.stats[asset_class]
+        due_at = time.time()
+        while True:
+            started = time.monotonic()
+            stats.runs += 1
+            try:
+                snapshot = await self.refresh(asset_class)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.failures += 1
+                stats.consecutive_failures += 1
+                stats.last_error = str(e)
+                print(f"Error refreshing {asset_class}: {e}")
+            else:
+                stats.consecutive_failures = 0
+                stats.last_error = None
+                stats.last_success_at = time.time()
+                stats.last_publish_lag = snapshot.created_at - due_at
+                stats.version = snapshot.version
+            stats.last_duration = time.monotonic() - started
+
+            delay = self._delay(asset_class)
+            due_at = time.time() + delay
+            stats.next_run_at = due_at
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        for asset_class in self.intervals:
+            if asset_class not in self._tasks:
+                self._tasks[asset_class] = asyncio.create_task(self._run(asset_class))
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {asset_class: stats.as_dict() for asset_class, stats in self.stats.items()}
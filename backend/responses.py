@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import secrets
+import threading
+
+from fastapi import Request, Response
+
+from cache import SingleFlight
+from compression import COMPRESSION_MIN_SIZE, compress, negotiate
+from executors import run_cpu
+from snapshot import MarketSnapshot
+from wire import ENCODERS, FORMAT_SUFFIXES, JSON, ColumnTable, encode_json, negotiate_format
+
+# Versions restart at 1 with the process, so ETags carry a per-process
+# epoch to keep a client's tag from an earlier run from matching
+ETAG_EPOCH = secrets.token_hex(4)
+
+
+class CachedBody(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+    # Compressed copies of body by content coding, filled in on demand
+    variants: Dict[str, bytes]
+
+
+def snapshot_etag(name: str, version: int) -> str:
+    return f'"{name}-{ETAG_EPOCH}-{version}"'
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """Each content coding is a different representation, with its own tag."""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match covers etag in any content
+    coding (weak comparison)."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    stem = etag[:-1]
+    for tag in header.split(','):
+        tag = tag.strip().removeprefix('W/')
+        if tag == etag or (tag.startswith(stem + '-') and tag.endswith('"')):
+            return True
+    return False
+
+
+class SnapshotBodies:
+    """JSON bodies serialized once per snapshot version, keyed by endpoint.
+
+    A body whose content changes on its own schedule (a chart changes
+    with its symbol's latest bar) passes that as version instead.
+    Only the body for the latest version seen is kept per name, along with
+    its compressed variants; concurrent builds of the same version or
+    variant share one serialization or compression. At most max_names
+    names are kept, dropping the least recently built.
+    """
+
+    def __init__(self, max_names: int = 256):
+        self.max_names = max_names
+        self._bodies: 'OrderedDict[str, CachedBody]' = OrderedDict()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def cached(self, name: str, snapshot: MarketSnapshot,
+               version: Optional[int] = None) -> Optional[CachedBody]:
+        version = snapshot.version if version is None else version
+        cached = self._bodies.get(name)
+        return cached if cached is not None and cached.version == version else None
+
+    def get(self, name: str, snapshot: MarketSnapshot, build: Callable[[MarketSnapshot], Any],
+            encode: Callable[[Any], bytes] = encode_json, version: Optional[int] = None) -> CachedBody:
+        version = snapshot.version if version is None else version
+        cached = self.cached(name, snapshot, version)
+        if cached is not None:
+            return cached
+        return self._flight.do(f'{name}:{version}',
+                               lambda: self._build(name, snapshot, build, encode, version))
+
+    def _build(self, name: str, snapshot: MarketSnapshot, build: Callable[[MarketSnapshot], Any],
+               encode: Callable[[Any], bytes], version: int) -> CachedBody:
+        body = encode(build(snapshot))
+        cached = CachedBody(version, snapshot_etag(name, version), body, {})
+        with self._lock:
+            self.builds += 1
+            current = self._bodies.pop(name, None)
+            # A request still on an older version gets the body it asked
+            # for; the newer one stays cached
+            self._bodies[name] = current if current is not None and current.version > version else cached
+            while len(self._bodies) > self.max_names:
+                self._bodies.popitem(last=False)
+        return cached
+
+    def encoded(self, cached: CachedBody, name: str, encoding: str) -> bytes:
+        """cached.body compressed with encoding, compressed at most once."""
+        variant = cached.variants.get(encoding)
+        if variant is None:
+            variant = self._flight.do(
+                f'{name}:{cached.version}:{encoding}',
+                lambda: cached.variants.get(encoding) or cached.variants.setdefault(
+                    encoding, compress(cached.body, encoding, cached=True)),
+            )
+        return variant
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bodies.clear()
+
+
+snapshot_bodies = SnapshotBodies()
+
+
+async def snapshot_response(request: Request, name: str, snapshot: MarketSnapshot,
+                            build: Callable[[MarketSnapshot], Any],
+                            headers: Optional[Dict[str, str]] = None,
+                            columns: Optional[Callable[[MarketSnapshot], ColumnTable]] = None,
+                            version: Optional[int] = None) -> Response:
+    """Serve build(snapshot) as JSON, or a 304 when the client has it.
+
+    With columns, clients that Accept MessagePack or Arrow IPC get
+    columns(snapshot) in that format instead; each format is cached and
+    tagged separately.
+
+    The ETag comes from the snapshot version alone (or version, when the
+    body has its own), so a matching If-None-Match is answered without
+    building or serializing anything.
+    Bodies and their gzip/brotli variants are built on the CPU pool at most
+    once per version, so compression cost does not grow with requests.
+    """
+    media_type = negotiate_format(request.headers.get('accept'), binary=columns is not None)
+    encode = encode_json
+    if media_type != JSON:
+        name = f'{name}.{FORMAT_SUFFIXES[media_type]}'
+        build, encode = columns, ENCODERS[media_type]
+    version = snapshot.version if version is None else version
+    etag = snapshot_etag(name, version)
+    encoding = negotiate(request.headers.get('accept-encoding'))
+    headers = {
+        'ETag': encoded_etag(etag, encoding),
+        'X-Snapshot-Version': str(snapshot.version),
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept, Accept-Encoding' if columns is not None else 'Accept-Encoding',
+        **(headers or {}),
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    cached = snapshot_bodies.cached(name, snapshot, version)
+    if cached is None:
+        cached = await run_cpu(snapshot_bodies.get, name, snapshot, build, encode, version)
+    body = cached.body
+    if encoding is not None and len(body) >= COMPRESSION_MIN_SIZE:
+        body = cached.variants.get(encoding)
+        if body is None:
+            body = await run_cpu(snapshot_bodies.encoded, cached, name, encoding)
+        headers['Content-Encoding'] = encoding
+    else:
+        headers['ETag'] = etag
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,308 @@
+"""Declarative signal rules, compiled to numpy expressions.
+
+A rule set per asset class is written in JSON (signal_rules.json):
+
+    {"forex": {
+        "let": {"move": "abs(change)"},
+        "rules": [{"name": "momentum",
+                   "when": "move > 0.5",
+                   "direction": "sign(change)",
+                   "confidence": "min(0.7 + move / 2, 0.95)"}]}}
+
+Expressions use Python syntax, restricted to arithmetic, comparisons,
+and/or/not, `a if cond else b` and the functions in FUNCTIONS. They can
+name these values:
+
+- the snapshot columns in FRAME_FIELDS
+- the latest indicator values in INDICATOR_FIELDS, computed only when a
+  rule set names one
+- earlier `let` names
+- the constants BUY, SELL and HOLD
+
+Every name stands for an array with one value per symbol, so each
+expression is evaluated once for the whole class. For each symbol, the
+first rule whose `when` holds decides its direction (its sign: BUY,
+SELL or HOLD) and its confidence. Symbols that no rule matches get no
+signal.
+
+Expressions are parsed once into a tree of small closures over numpy
+calls. Nothing is passed to eval, and any syntax outside the list above
+is rejected when the rule set loads.
+"""
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+import ast
+import json
+import operator
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from indicators import Indicators
+from snapshot import AssetFrame
+
+load_dotenv()
+
+SIGNAL_RULES_PATH = os.getenv('SIGNAL_RULES_PATH', os.path.join(os.path.dirname(__file__), 'signal_rules.json'))
+
+FRAME_FIELDS = ('price', 'change', 'volume')
+INDICATOR_FIELDS = Indicators._fields
+CONSTANTS = {'BUY': 1.0, 'SELL': -1.0, 'HOLD': 0.0}
+# Every name an expression can read before any `let`
+EXPRESSION_NAMES = frozenset(FRAME_FIELDS) | frozenset(INDICATOR_FIELDS) | frozenset(CONSTANTS)
+
+
+def _reduce(func):
+    def reduced(*args):
+        if len(args) < 2:
+            raise TypeError('takes at least two arguments')
+        result = args[0]
+        for arg in args[1:]:
+            result = func(result, arg)
+        return result
+    return reduced
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    'abs': np.abs,
+    'sign': np.sign,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'exp': np.exp,
+    'min': _reduce(np.minimum),
+    'max': _reduce(np.maximum),
+    'clip': np.clip,
+    'where': np.where,
+    'isnan': np.isnan,
+    # NaN (an indicator still warming up) as 0, or as a given default
+    'nz': lambda values, default=0.0: np.where(np.isnan(values), default, values),
+}
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+Expression = Callable[['RuleEnv'], Any]
+
+
+class RuleError(ValueError):
+    """Raised when a rule set does not parse or names something unknown."""
+
+
+class RuleEnv:
+    """Values expressions read for one asset class frame.
+
+    Indicators are fetched on first use; `let` values are stored as they
+    are evaluated.
+    """
+
+    def __init__(self, frame: AssetFrame, indicators: Callable[[], Mapping[str, np.ndarray]]):
+        self.frame = frame
+        self._indicators = indicators
+        self._latest: Optional[Mapping[str, np.ndarray]] = None
+        self.values: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        value = self.values.get(name)
+        if value is not None:
+            return value
+        if name in FRAME_FIELDS:
+            return getattr(self.frame, name)
+        if name in INDICATOR_FIELDS:
+            if self._latest is None:
+                self._latest = self._indicators()
+            return self._latest[name]
+        return CONSTANTS[name]
+
+
+def _numeric(value: Any) -> Any:
+    """Booleans as 0/1, so conditions can be added up."""
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        return value.astype(np.float64)
+    return value
+
+
+class _Compiler:
+    def __init__(self, source: str, names: frozenset):
+        self.source = source
+        self.names = names
+
+    def error(self, node: ast.AST, message: str) -> RuleError:
+        column = getattr(node, 'col_offset', 0)
+        return RuleError(f"{message} in {self.source!r} at column {column + 1}")
+
+    def compile(self, node: ast.AST) -> Expression:
+        method = getattr(self, f'_{type(node).__name__}', None)
+        if method is None:
+            raise self.error(node, f"{type(node).__name__} is not allowed")
+        return method(node)
+
+    def _Expression(self, node: ast.Expression) -> Expression:
+        return self.compile(node.body)
+
+    def _Constant(self, node: ast.Constant) -> Expression:
+        if not isinstance(node.value, (bool, int, float)):
+            raise self.error(node, f"constant {node.value!r} is not a number")
+        value = node.value
+        return lambda env: value
+
+    def _Name(self, node: ast.Name) -> Expression:
+        name = node.id
+        if name not in self.names:
+            raise self.error(node, f"unknown name {name!r}")
+        return lambda env: env[name]
+
+    def _BinOp(self, node: ast.BinOp) -> Expression:
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise self.error(node, f"operator {type(node.op).__name__} is not allowed")
+        left, right = self.compile(node.left), self.compile(node.right)
+        return lambda env: op(_numeric(left(env)), _numeric(right(env)))
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> Expression:
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda env: np.logical_not(operand(env))
+        if isinstance(node.op, ast.USub):
+            return lambda env: -_numeric(operand(env))
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise self.error(node, f"operator {type(node.op).__name__} is not allowed")
+
+    def _BoolOp(self, node: ast.BoolOp) -> Expression:
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        values = [self.compile(value) for value in node.values]
+
+        def evaluate(env):
+            result = values[0](env)
+            for value in values[1:]:
+                result = combine(result, value(env))
+            return result
+        return evaluate
+
+    def _Compare(self, node: ast.Compare) -> Expression:
+        operands = [self.compile(node.left)] + [self.compile(c) for c in node.comparators]
+        ops = []
+        for op in node.ops:
+            compare = COMPARISONS.get(type(op))
+            if compare is None:
+                raise self.error(node, f"comparison {type(op).__name__} is not allowed")
+            ops.append(compare)
+
+        def evaluate(env):
+            # a < b < c is (a < b) and (b < c), each operand evaluated once
+            values = [operand(env) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+        return evaluate
+
+    def _IfExp(self, node: ast.IfExp) -> Expression:
+        test, body, orelse = self.compile(node.test), self.compile(node.body), self.compile(node.orelse)
+        return lambda env: np.where(test(env), body(env), orelse(env))
+
+    def _Call(self, node: ast.Call) -> Expression:
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else ast.unparse(node.func)
+            raise self.error(node, f"unknown function {name!r}")
+        if node.keywords:
+            raise self.error(node, "keyword arguments are not allowed")
+        func = FUNCTIONS[node.func.id]
+        args = [self.compile(arg) for arg in node.args]
+        return lambda env: func(*(_numeric(arg(env)) for arg in args))
+
+
+def compile_expression(source: str, names: frozenset) -> Expression:
+    """Compile one expression that may read `names`."""
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise RuleError(f"{e.msg} in {source!r}") from None
+    return _Compiler(source, names).compile(tree)
+
+
+class Rule(NamedTuple):
+    name: str
+    when: Expression
+    direction: Expression
+    confidence: Expression
+
+
+# Per-symbol direction (-1, 0, 1), confidence and whether to emit a signal
+RuleResult = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def per_symbol(value: Any, n: int, dtype=np.float64) -> np.ndarray:
+    """value (an array or a scalar) as one value per symbol."""
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (n,))
+
+
+def fall_back(result: RuleResult, fallback: RuleResult) -> RuleResult:
+    """result for the symbols it emits, fallback for the others."""
+    direction, confidence, emit = result
+    return (np.where(emit, direction, fallback[0]), np.where(emit, confidence, fallback[1]),
+            emit | fallback[2])
+
+
+class RuleSet:
+    """The compiled rules of one asset class."""
+
+    def __init__(self, asset_class: str, spec: Mapping[str, Any]):
+        self.asset_class = asset_class
+        names = set(EXPRESSION_NAMES)
+        self.lets: List[Tuple[str, Expression]] = []
+        for name, source in spec.get('let', {}).items():
+            if not name.isidentifier() or name in names:
+                raise RuleError(f"{asset_class}: cannot define {name!r}")
+            self.lets.append((name, compile_expression(source, frozenset(names))))
+            names.add(name)
+        names = frozenset(names)
+        self.rules: List[Rule] = []
+        for i, rule in enumerate(spec.get('rules', [])):
+            try:
+                self.rules.append(Rule(
+                    name=rule.get('name', f'{asset_class}_{i}'),
+                    when=compile_expression(rule.get('when', 'True'), names),
+                    direction=compile_expression(rule['direction'], names),
+                    confidence=compile_expression(rule['confidence'], names),
+                ))
+            except KeyError as e:
+                raise RuleError(f"{asset_class} rule {i}: missing {e}") from None
+
+    def evaluate(self, frame: AssetFrame, indicators: Callable[[], Mapping[str, np.ndarray]]) -> RuleResult:
+        n = len(frame)
+        env = RuleEnv(frame, indicators)
+        for name, expression in self.lets:
+            env.values[name] = expression(env)
+        emit = np.zeros(n, dtype=bool)
+        direction = np.zeros(n, dtype=np.int64)
+        confidence = np.zeros(n)
+        for rule in self.rules:
+            matched = per_symbol(rule.when(env), n, bool) & ~emit
+            if not matched.any():
+                continue
+            directions = np.sign(np.nan_to_num(per_symbol(rule.direction(env), n)))
+            direction[matched] = directions[matched].astype(np.int64)
+            confidence[matched] = np.clip(np.nan_to_num(per_symbol(rule.confidence(env), n)), 0.0, 1.0)[matched]
+            emit |= matched
+        return direction, confidence, emit
+
+
+def load_rule_sets(path: str = SIGNAL_RULES_PATH) -> Dict[str, RuleSet]:
+    with open(path) as f:
+        specs = json.load(f)
+    return {asset_class: RuleSet(asset_class, spec) for asset_class, spec in specs.items()}
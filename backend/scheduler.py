@@ -0,0 +1,237 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import heapq
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Alpha Vantage free tier limits
+ALPHA_VANTAGE_CALLS_PER_MINUTE = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', '5'))
+ALPHA_VANTAGE_CALLS_PER_DAY = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_DAY', '500'))
+
+# Seconds after which a symbol counts as stale
+REFRESH_TARGET_AGE = float(os.getenv('REFRESH_TARGET_AGE', '300'))
+
+# Half-life of the client demand counter in seconds
+DEMAND_HALF_LIFE = 600.0
+
+
+class TokenBucket:
+    """Token bucket refilled at the tighter of a per-minute and per-day quota.
+
+    A small burst keeps calls evenly spaced instead of spending the minute's
+    quota at once and getting throttled.
+    """
+
+    def __init__(self, per_minute: int, per_day: Optional[int] = None, burst: int = 1):
+        rate = per_minute / 60.0
+        if per_day:
+            rate = min(rate, per_day / 86400.0)
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    async def acquire(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(self.wait_time())
+
+    def release(self) -> None:
+        """Return an acquired token that was not used."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class Demand:
+    """Decaying count of client reads of one group of jobs."""
+
+    def __init__(self):
+        self.value = 0.0
+        self.at = time.monotonic()
+
+    def decayed(self, now: float) -> float:
+        return self.value * 0.5 ** ((now - self.at) / DEMAND_HALF_LIFE)
+
+    def add(self, weight: float, now: float) -> None:
+        self.value = self.decayed(now) + weight
+        self.at = now
+
+
+class RefreshJob:
+    def __init__(self, key: str, provider: str, refresh: Callable[[], Awaitable[Any]],
+                 target_age: float, demand: Demand):
+        self.key = key
+        self.provider = provider
+        self.refresh = refresh
+        self.target_age = target_age
+        self.demand = demand
+        self.refreshed_at = 0.0
+        # A failed job is retried once target_age has passed
+        self.retry_at = 0.0
+        self.running = False
+        self.errors = 0
+
+    def staleness(self, now: float) -> float:
+        return now - self.refreshed_at if self.refreshed_at else float('inf')
+
+    def due(self, now: float) -> bool:
+        return not self.running and now >= self.retry_at and self.staleness(now) >= self.target_age
+
+    def due_in(self, now: float) -> float:
+        """Seconds until the job is due (0 when it already is)."""
+        return max(0.0, self.retry_at - now, self.target_age - self.staleness(now))
+
+    def priority(self, now: float) -> float:
+        """Higher is more urgent: staleness weighted by recent demand."""
+        staleness = self.staleness(now)
+        if staleness == float('inf'):
+            return staleness
+        return staleness * (1.0 + self.demand.decayed(now))
+
+
+class RefreshScheduler:
+    """Spread per-symbol refreshes across each provider's quota.
+
+    Jobs are keyed like 'crypto:BTC' and grouped by the part before the
+    colon, which is what client demand is counted against. Once started,
+    one task per provider runs the most urgent due job each time the
+    provider's bucket has a token, so callers never wait on the quota.
+    """
+
+    def __init__(self, buckets: Dict[str, TokenBucket], target_age: float = REFRESH_TARGET_AGE,
+                 idle_poll: float = 5.0):
+        self.buckets = buckets
+        self.target_age = target_age
+        self.idle_poll = idle_poll
+        self.jobs: Dict[str, RefreshJob] = {}
+        self.demand: Dict[str, Demand] = {}
+        self._pumps: Dict[str, asyncio.Task] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    def register(self, key: str, provider: str, refresh: Callable[[], Awaitable[Any]],
+                 target_age: Optional[float] = None) -> None:
+        target_age = self.target_age if target_age is None else target_age
+        if key not in self.jobs:
+            demand = self.demand.setdefault(key.split(':', 1)[0], Demand())
+            self.jobs[key] = RefreshJob(key, provider, refresh, target_age, demand)
+        else:
+            self.jobs[key].refresh = refresh
+            self.jobs[key].target_age = target_age
+
+    def mark_fresh(self, key: str, at: Optional[float] = None) -> None:
+        job = self.jobs.get(key)
+        if job is not None:
+            job.refreshed_at = time.monotonic() if at is None else at
+
+    def record_demand(self, groups: Iterable[str], weight: float = 1.0) -> None:
+        """Count client reads of job groups (asset classes); demanded
+        groups refresh sooner."""
+        now = time.monotonic()
+        for group in groups:
+            demand = self.demand.get(group)
+            if demand is not None:
+                demand.add(weight, now)
+
+    def queue(self, provider: Optional[str] = None) -> List[RefreshJob]:
+        """Due jobs in priority order."""
+        now = time.monotonic()
+        ranked = [
+            (-job.priority(now), job.key, job) for job in self.jobs.values()
+            if job.due(now) and (provider is None or job.provider == provider)
+        ]
+        heapq.heapify(ranked)
+        return [heapq.heappop(ranked)[2] for _ in range(len(ranked))]
+
+    def _next_due_in(self, provider: str) -> float:
+        now = time.monotonic()
+        waits = [job.due_in(now) for job in self.jobs.values()
+                 if job.provider == provider and not job.running]
+        return min(waits, default=self.idle_poll)
+
+    async def _run_job(self, job: RefreshJob) -> None:
+        try:
+            await job.refresh()
+        except Exception as e:
+            job.errors += 1
+            job.retry_at = time.monotonic() + job.target_age
+            print(f"Error refreshing {job.key}: {e}")
+        else:
+            self.mark_fresh(job.key)
+        finally:
+            job.running = False
+
+    async def _pump(self, provider: str) -> None:
+        bucket = self.buckets[provider]
+        while True:
+            if not self.queue(provider):
+                # Wake when the next job falls due; demand or mark_fresh
+                # may change that, so never sleep longer than idle_poll
+                await asyncio.sleep(min(max(self._next_due_in(provider), 0.01), self.idle_poll))
+                continue
+            await bucket.acquire()
+            # Priorities moved while waiting for the token
+            queue = self.queue(provider)
+            if not queue:
+                bucket.release()
+                continue
+            job = queue[0]
+            job.running = True
+            task = asyncio.create_task(self._run_job(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def start(self) -> None:
+        """Start running due jobs for every provider that has any."""
+        for provider in {job.provider for job in self.jobs.values()}:
+            if provider not in self._pumps:
+                self._pumps[provider] = asyncio.create_task(self._pump(provider))
+
+    async def stop(self) -> None:
+        tasks = [*self._pumps.values(), *self._running]
+        self._pumps.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth per provider and how far behind each symbol is."""
+        now = time.monotonic()
+        depth = {provider: 0 for provider in self.buckets}
+        lag = {}
+        for job in self.jobs.values():
+            staleness = job.staleness(now)
+            behind = max(0.0, staleness - job.target_age)
+            if staleness >= job.target_age:
+                depth[job.provider] = depth.get(job.provider, 0) + 1
+            lag[job.key] = None if staleness == float('inf') else behind
+        return {
+            'queue_depth': depth,
+            'lag_seconds': lag,
+            'running': len(self._running),
+            'tokens': {provider: bucket.tokens for provider, bucket in self.buckets.items()},
+            'errors': {job.key: job.errors for job in self.jobs.values() if job.errors},
+        }
+
+
+refresh_scheduler = RefreshScheduler({
+    'alpha_vantage': TokenBucket(ALPHA_VANTAGE_CALLS_PER_MINUTE, ALPHA_VANTAGE_CALLS_PER_DAY),
+})
@@ -0,0 +1,26 @@
+"""Refresh work that runs in process pool workers.
+
+Kept free of the FastAPI app and the market module so spawned workers
+import only what a shard needs.
+"""
+from typing import Any, Dict, List, Tuple
+
+from parsing import rows_from_bars
+from providers import SimulatedProvider
+
+# Simulators built in this worker, keyed by their spec
+_simulators: Dict[Tuple, SimulatedProvider] = {}
+
+
+def _simulator(spec: Dict[str, Any]) -> SimulatedProvider:
+    key = tuple(sorted((k, repr(v)) for k, v in spec.items()))
+    simulator = _simulators.get(key)
+    if simulator is None:
+        simulator = _simulators[key] = SimulatedProvider(**spec)
+    return simulator
+
+
+def refresh_shard(spec: Dict[str, Any], asset_class: str, symbols: List[str]) -> List[Dict[str, Any]]:
+    """Generate one shard of an asset class and return its market rows."""
+    bars = _simulator(spec).generate(asset_class, symbols)
+    return rows_from_bars(bars)
@@ -1,8 +1,14 @@
-from typing import List
-import random
-from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import threading
+from datetime import datetime
 import numpy as np
-from market import get_market_analysis
+from market import get_current_snapshot, get_indicators
+from snapshot import MarketSnapshot
+from cache import SingleFlight
+from rules import fall_back, load_rule_sets
+from models import model_registry
+from metrics import signal_cache_lookups, signal_generation_duration, signal_generation_errors
 
 class TradingSignal:
     def __init__(self, symbol: str, signal_type: str, price: float, confidence: float):
@@ -12,80 +18,132 @@ class TradingSignal:
         self.timestamp = datetime.now().isoformat()
         self.confidence = confidence
 
-def generate_technical_signals(market_data: dict) -> List[TradingSignal]:
+# Indexed by direction + 1
+SIGNAL_TYPES = np.array(['SELL', 'HOLD', 'BUY'])
+
+# Compiled from signal_rules.json once at startup
+rule_sets = load_rule_sets()
+
+def generate_technical_signals(snapshot: MarketSnapshot) -> List[TradingSignal]:
+    """Score every symbol of an asset class at once: with its trained
+    model when one is loaded, and with its rule set for the symbols the
+    model is not confident about."""
     signals = []
-    
-    # Analyze crypto data
-    for crypto in market_data.get('crypto', []):
-        # Generate random signals for testing
-        signal_type = random.choice(['BUY', 'SELL', 'HOLD'])
-        confidence = random.uniform(0.6, 0.95)  # 60% to 95% confidence
-        
-        signals.append(TradingSignal(
-            symbol=crypto['symbol'],
-            signal_type=signal_type,
-            price=crypto['price'],
-            confidence=confidence
-        ))
-    
-    # Analyze forex data
-    for forex in market_data.get('forex', []):
-        # Generate signals based on price movement
-        price_change = forex['change']
-        if abs(price_change) > 0.5:  # Significant movement
-            signal_type = 'BUY' if price_change > 0 else 'SELL'
-            confidence = min(0.7 + abs(price_change) / 2, 0.95)
-            
-            signals.append(TradingSignal(
-                symbol=forex['symbol'],
-                signal_type=signal_type,
-                price=forex['price'],
-                confidence=confidence
-            ))
-    
-    # Analyze stock data
-    for stock in market_data.get('stocks', []):
-        # Generate signals based on volume and price movement
-        volume_change = stock['volume'] / 1000000  # Normalize volume
-        price_change = stock['change']
-        
-        if volume_change > 1 and abs(price_change) > 0.3:
-            signal_type = 'BUY' if price_change > 0 else 'SELL'
-            confidence = min(0.75 + (volume_change * 0.1), 0.95)
-            
+    for asset_class, frame in snapshot.frames.items():
+        if not len(frame):
+            continue
+        # Shared by the model and the rules
+        indicators = lru_cache(maxsize=1)(lambda: get_indicators(asset_class, list(frame.symbols)))
+        result = model_registry.predict(asset_class, frame, indicators)
+        rule_set = rule_sets.get(asset_class)
+        if rule_set is not None and (result is None or not result[2].all()):
+            rules = rule_set.evaluate(frame, indicators)
+            result = rules if result is None else fall_back(result, rules)
+        if result is None:
+            continue
+        direction, confidence, emit = result
+        signal_types = SIGNAL_TYPES[direction + 1]
+        for i in np.flatnonzero(emit).tolist():
             signals.append(TradingSignal(
-                symbol=stock['symbol'],
-                signal_type=signal_type,
-                price=stock['price'],
-                confidence=confidence
+                symbol=frame.symbols[i],
+                signal_type=str(signal_types[i]),
+                price=float(frame.price[i]),
+                confidence=float(confidence[i])
             ))
-    
     return signals
 
-def get_trading_signals() -> List[dict]:
+def build_signals(snapshot: MarketSnapshot) -> List[dict]:
+    """Trading signals for snapshot as dicts; raises on failure."""
+    # Generate signals based on market data
+    signals = generate_technical_signals(snapshot)
+
+    # Convert signals to dictionary format
+    return [
+        {
+            'id': f"{signal.symbol}_{signal.timestamp}",
+            'symbol': signal.symbol,
+            'signal_type': signal.signal_type,
+            'price': signal.price,
+            'timestamp': signal.timestamp,
+            'confidence': signal.confidence
+        }
+        for signal in signals
+    ]
+
+def get_trading_signals(snapshot: Optional[MarketSnapshot] = None) -> List[dict]:
     """
     Generate trading signals based on market analysis.
     Returns a list of trading signals with their details.
+    Pass snapshot to generate against a specific market version.
     """
     try:
         # Get current market data
-        market_data = get_market_analysis()
-        
-        # Generate signals based on market data
-        signals = generate_technical_signals(market_data)
-        
-        # Convert signals to dictionary format
-        return [
-            {
-                'id': f"{signal.symbol}_{signal.timestamp}",
-                'symbol': signal.symbol,
-                'signal_type': signal.signal_type,
-                'price': signal.price,
-                'timestamp': signal.timestamp,
-                'confidence': signal.confidence
-            }
-            for signal in signals
-        ]
+        if snapshot is None:
+            snapshot = get_current_snapshot()
+        return build_signals(snapshot)
     except Exception as e:
+        signal_generation_errors.inc()
         print(f"Error generating signals: {e}")
-        return [] 
\ No newline at end of file
+        return []
+
+class SignalCache:
+    """Trading signals memoized per snapshot version.
+
+    Signals for a version are generated once, by the first reader after it
+    is published (normally the signal stream), and shared by every other
+    reader. Readers of the newest version take no lock. Concurrent first
+    reads of a version share one generation. The `keep` most recent
+    versions are kept, so requests still holding an older snapshot do not
+    regenerate it. A failed generation is not cached; the next reader
+    retries.
+    """
+
+    def __init__(self, keep: int = 4):
+        self.keep = keep
+        self._latest: Tuple[int, List[dict]] = (-1, [])
+        self._signals: Dict[int, List[dict]] = {}
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: MarketSnapshot) -> List[dict]:
+        version, signals = self._latest
+        if version != snapshot.version:
+            signals = self._signals.get(snapshot.version)
+            if signals is None:
+                return self._flight.do(f'signals:{snapshot.version}', lambda: self._build(snapshot))
+        signal_cache_lookups.labels('hit').inc()
+        return signals
+
+    def _build(self, snapshot: MarketSnapshot) -> List[dict]:
+        signals = self._signals.get(snapshot.version)
+        if signals is not None:
+            # Stored while this caller was waiting for the flight slot
+            signal_cache_lookups.labels('hit').inc()
+            return signals
+        signal_cache_lookups.labels('miss').inc()
+        try:
+            with signal_generation_duration.time():
+                signals = build_signals(snapshot)
+        except Exception as e:
+            signal_generation_errors.inc()
+            print(f"Error generating signals: {e}")
+            return []
+        with self._lock:
+            self._signals[snapshot.version] = signals
+            for version in sorted(self._signals)[:-self.keep]:
+                del self._signals[version]
+            if snapshot.version > self._latest[0]:
+                self._latest = (snapshot.version, signals)
+        return signals
+
+    def clear(self) -> None:
+        with self._lock:
+            self._signals.clear()
+            self._latest = (-1, [])
+
+# Shared by /signals, /batch and the signal stream
+signal_cache = SignalCache()
+
+def get_snapshot_signals(snapshot: MarketSnapshot) -> List[dict]:
+    """Trading signals for snapshot, generated once per snapshot version."""
+    return signal_cache.get(snapshot)
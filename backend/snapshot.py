@@ -0,0 +1,333 @@
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from functools import cached_property
+from itertools import chain
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+ASSET_CLASSES = ('crypto', 'forex', 'stocks')
+ROW_FIELDS = ('symbol', 'price', 'change', 'volume', 'chartData')
+
+
+def _readonly(values, dtype=np.float64) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class ListColumn(NamedTuple):
+    """A column of variable-length lists stored flat: row i is
+    values[offsets[i]:offsets[i + 1]]."""
+    values: np.ndarray
+    offsets: np.ndarray
+
+
+@dataclass(frozen=True)
+class AssetFrame:
+    """Columnar market data for one asset class.
+
+    Chart series are stored back to back in chart_values; the series for
+    symbol i is chart_values[chart_offsets[i]:chart_offsets[i + 1]].
+    """
+    asset_class: str
+    symbols: Tuple[str, ...]
+    price: np.ndarray
+    change: np.ndarray
+    volume: np.ndarray
+    chart_values: np.ndarray
+    chart_offsets: np.ndarray
+
+    @classmethod
+    def from_rows(cls, asset_class: str, rows: List[Dict[str, Any]]) -> 'AssetFrame':
+        lengths = [len(row['chartData']) for row in rows]
+        return cls(
+            asset_class=asset_class,
+            symbols=tuple(row['symbol'] for row in rows),
+            price=_readonly([row['price'] for row in rows]),
+            change=_readonly([row['change'] for row in rows]),
+            volume=_readonly([row['volume'] for row in rows]),
+            chart_values=_readonly(list(chain.from_iterable(row['chartData'] for row in rows))),
+            chart_offsets=_readonly(np.concatenate(([0], np.cumsum(lengths))), dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def chart(self, i: int) -> np.ndarray:
+        return self.chart_values[self.chart_offsets[i]:self.chart_offsets[i + 1]]
+
+    @cached_property
+    def rows(self) -> Tuple[Dict[str, Any], ...]:
+        """Row dicts in the API shape, built once per frame.
+
+        Shared by every reader of the snapshot; do not mutate them.
+        """
+        prices = self.price.tolist()
+        changes = self.change.tolist()
+        volumes = self.volume.tolist()
+        return tuple(
+            {
+                'symbol': symbol,
+                'price': prices[i],
+                'change': changes[i],
+                'volume': volumes[i],
+                'chartData': self.chart(i).tolist(),
+            }
+            for i, symbol in enumerate(self.symbols)
+        )
+
+    def project(self, fields: Tuple[str, ...], symbols: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
+        """Rows holding only fields, optionally only for symbols.
+
+        Built straight from the columns, so fields left out (the charts in
+        particular) are never converted.
+        """
+        if fields == ROW_FIELDS and symbols is None:
+            return list(self.rows)
+        indices = range(len(self.symbols)) if symbols is None else [
+            i for i, symbol in enumerate(self.symbols) if symbol in symbols
+        ]
+        columns = {
+            'symbol': self.symbols,
+            'price': self.price,
+            'change': self.change,
+            'volume': self.volume,
+        }
+        values = {
+            field: [columns[field][i] for i in indices] if field == 'symbol'
+            else columns[field][list(indices)].tolist()
+            for field in fields if field != 'chartData'
+        }
+        if 'chartData' in fields:
+            values['chartData'] = [self.chart(i).tolist() for i in indices]
+        return [dict(zip(values, row)) for row in zip(*values.values())]
+
+
+class AllView(Sequence):
+    """Read-only concatenation of several frames' rows without copying."""
+
+    def __init__(self, parts: Tuple[Tuple[Dict[str, Any], ...], ...]):
+        self._parts = parts
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    def __iter__(self):
+        return chain.from_iterable(self._parts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        for part in self._parts:
+            if index < len(part):
+                return part[index]
+            index -= len(part)
+        raise IndexError('AllView index out of range')
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Immutable market data published as one consistent version."""
+    version: int
+    frames: Mapping[str, AssetFrame]
+    created_at: float = field(default_factory=time.time)
+
+    def rows(self, asset_class: str) -> Tuple[Dict[str, Any], ...]:
+        frame = self.frames.get(asset_class)
+        return frame.rows if frame is not None else ()
+
+    @cached_property
+    def all(self) -> AllView:
+        return AllView(tuple(self.rows(asset_class) for asset_class in ASSET_CLASSES))
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def as_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the /market/analysis response shape."""
+        data = {asset_class: list(self.rows(asset_class)) for asset_class in ASSET_CLASSES}
+        data['all'] = list(self.all)
+        return data
+
+    def columns(self, projection: Optional['MarketProjection'] = None) -> Dict[str, Any]:
+        """The projected rows of every class as one set of columns, with an
+        assetClass column; charts become a ListColumn. Taken straight from
+        the frames' arrays, without building row dicts."""
+        projection = projection or MarketProjection()
+        frames = [self.frames[c] for c in projection.classes if c in self.frames]
+        selections = [
+            np.arange(len(frame)) if projection.symbols is None else np.flatnonzero(
+                np.fromiter((s in projection.symbols for s in frame.symbols), dtype=bool, count=len(frame)))
+            for frame in frames
+        ]
+        columns: Dict[str, Any] = {
+            'assetClass': [frame.asset_class for frame, rows in zip(frames, selections) for _ in rows],
+            'symbol': [frame.symbols[i] for frame, rows in zip(frames, selections) for i in rows],
+        }
+        for field in ('price', 'change', 'volume'):
+            if field in projection.fields:
+                columns[field] = np.concatenate(
+                    [getattr(frame, field)[rows] for frame, rows in zip(frames, selections)] or [np.empty(0)])
+        if 'chartData' in projection.fields:
+            lengths = np.concatenate([
+                np.diff(frame.chart_offsets)[rows] for frame, rows in zip(frames, selections)
+            ] or [np.empty(0, np.int64)])
+            values = [
+                frame.chart_values if len(rows) == len(frame)
+                else np.concatenate([frame.chart(i) for i in rows] or [np.empty(0)])
+                for frame, rows in zip(frames, selections)
+            ]
+            columns['chartData'] = ListColumn(
+                np.concatenate(values or [np.empty(0)]),
+                np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            )
+        return columns
+
+    def project(self, projection: 'MarketProjection') -> Dict[str, List[Dict[str, Any]]]:
+        """The /market/analysis response narrowed to projection."""
+        if projection.is_full:
+            return self.as_dict()
+        data = {
+            asset_class: self.frames[asset_class].project(projection.fields, projection.symbols)
+            if asset_class in self.frames else []
+            for asset_class in projection.classes
+        }
+        if projection.include_all:
+            data['all'] = list(chain.from_iterable(data[asset_class] for asset_class in projection.classes))
+        return data
+
+
+@dataclass(frozen=True)
+class MarketProjection:
+    """Which part of a snapshot a client asked for, in canonical form.
+
+    Equal requests produce equal projections (and keys), however the
+    query spelled them, so each distinct projection is built once per
+    snapshot version.
+    """
+    classes: Tuple[str, ...] = ASSET_CLASSES
+    symbols: Optional[FrozenSet[str]] = None
+    fields: Tuple[str, ...] = ROW_FIELDS
+    include_all: bool = True
+
+    @classmethod
+    def from_query(cls, classes: Optional[str] = None, symbols: Optional[str] = None,
+                   fields: Optional[str] = None, charts: bool = True,
+                   include_all: Optional[bool] = None) -> 'MarketProjection':
+        """Parse comma-separated query values; raises ValueError on unknown names."""
+        requested = _split(classes)
+        unknown = requested - set(ASSET_CLASSES)
+        if unknown:
+            raise ValueError(f"unknown asset classes: {', '.join(sorted(unknown))}")
+        selected_fields = _split(fields) or set(ROW_FIELDS)
+        unknown = selected_fields - set(ROW_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        selected_fields.add('symbol')
+        if not charts:
+            selected_fields.discard('chartData')
+        return cls(
+            classes=tuple(c for c in ASSET_CLASSES if c in requested) if requested else ASSET_CLASSES,
+            symbols=frozenset(_split(symbols)) or None,
+            fields=tuple(f for f in ROW_FIELDS if f in selected_fields),
+            include_all=not requested if include_all is None else include_all,
+        )
+
+    @property
+    def is_full(self) -> bool:
+        return self == MarketProjection()
+
+    @property
+    def key(self) -> str:
+        """Short stable name for caching and ETags."""
+        if self.is_full:
+            return 'market'
+        spec = '|'.join((
+            ','.join(self.classes),
+            ','.join(sorted(self.symbols)) if self.symbols is not None else '*',
+            ','.join(self.fields),
+            str(int(self.include_all)),
+        ))
+        return 'market-' + hashlib.blake2b(spec.encode(), digest_size=6).hexdigest()
+
+
+def _split(value: Optional[str]) -> set:
+    return {part.strip() for part in value.split(',') if part.strip()} if value else set()
+
+
+class SnapshotStore:
+    """Holds the current MarketSnapshot and hands out version numbers."""
+
+    def __init__(self):
+        self._current: Optional[MarketSnapshot] = None
+        self._sources: Dict[str, Any] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[MarketSnapshot], None]] = []
+
+    @property
+    def current(self) -> Optional[MarketSnapshot]:
+        return self._current
+
+    def add_listener(self, listener: Callable[[MarketSnapshot], None]) -> None:
+        """Call listener with every newly published snapshot.
+
+        Listeners run on the publishing thread and must not block.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[MarketSnapshot], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, snapshot: MarketSnapshot) -> MarketSnapshot:
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error notifying snapshot listener: {e}")
+        return snapshot
+
+    def publish(self, frames: Mapping[str, AssetFrame]) -> MarketSnapshot:
+        """Publish frames as the next version, keeping classes not given."""
+        with self._lock:
+            snapshot = self._publish(frames)
+        return self._notify(snapshot)
+
+    def _publish(self, frames: Mapping[str, AssetFrame]) -> MarketSnapshot:
+        merged = dict(self._current.frames) if self._current is not None else {}
+        merged.update(frames)
+        self._version += 1
+        self._current = MarketSnapshot(self._version, MappingProxyType(merged))
+        return self._current
+
+    def publish_rows(self, data: Mapping[str, List[Dict[str, Any]]]) -> MarketSnapshot:
+        """Publish row lists, rebuilding only the classes whose list changed.
+
+        Lists are compared by identity, so handing back the same cached
+        lists returns the current snapshot without bumping the version.
+        """
+        with self._lock:
+            changed = {
+                asset_class: rows for asset_class, rows in data.items()
+                if self._sources.get(asset_class) is not rows
+            }
+            if not changed and self._current is not None:
+                return self._current
+            self._sources.update(changed)
+            snapshot = self._publish({
+                asset_class: AssetFrame.from_rows(asset_class, rows)
+                for asset_class, rows in changed.items()
+            })
+        return self._notify(snapshot)
+
+
+snapshots = SnapshotStore()
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MARKET_STORE_DIR = os.getenv('MARKET_STORE_DIR', os.path.join(os.path.dirname(__file__), 'data', 'market'))
+
+# Alpha Vantage 'compact' output holds the latest 100 bars
+COMPACT_BARS = 100
+
+OHLCV_DTYPE = np.dtype([
+    ('ts', '<i8'),  # bar open, seconds since epoch (UTC)
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+
+class OHLCVStore:
+    """Append-only on-disk OHLCV history, one memory-mapped file per symbol.
+
+    Each file is a flat run of OHLCV_DTYPE records in timestamp order, so a
+    column such as bars['close'] is a zero-copy strided view of the map.
+    """
+
+    def __init__(self, root: str = MARKET_STORE_DIR):
+        self.root = root
+        self._maps: Dict[str, Tuple[int, np.memmap]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, asset_class: str, symbol: str) -> str:
+        return os.path.join(self.root, asset_class, f'{symbol}.ohlcv')
+
+    def read(self, asset_class: str, symbol: str) -> np.ndarray:
+        """Return every stored bar for symbol, oldest first (read-only)."""
+        path = self.path(asset_class, symbol)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=OHLCV_DTYPE)
+        count = size // OHLCV_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=OHLCV_DTYPE)
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is None or cached[0] != count:
+                cached = (count, np.memmap(path, dtype=OHLCV_DTYPE, mode='r', shape=(count,)))
+                self._maps[path] = cached
+        return cached[1]
+
+    def last_timestamp(self, asset_class: str, symbol: str) -> Optional[int]:
+        bars = self.read(asset_class, symbol)
+        return int(bars['ts'][-1]) if len(bars) else None
+
+    def last_timestamps(self, asset_class: str, symbols: List[str]) -> Dict[str, int]:
+        """Last stored timestamp per symbol, for symbols that have any bars."""
+        last = {symbol: self.last_timestamp(asset_class, symbol) for symbol in symbols}
+        return {symbol: ts for symbol, ts in last.items() if ts is not None}
+
+    def updated_at(self, asset_class: str, symbol: str) -> Optional[float]:
+        """When bars were last appended for symbol (epoch seconds)."""
+        try:
+            return os.path.getmtime(self.path(asset_class, symbol))
+        except OSError:
+            return None
+
+    def outputsize(self, asset_class: str, symbol: str, bar_seconds: int = 86400) -> str:
+        """'compact' when the bars missing since the last stored one fit in
+        a compact response, 'full' otherwise."""
+        last = self.last_timestamp(asset_class, symbol)
+        if last is None:
+            return 'full'
+        missing = (datetime.now(timezone.utc).timestamp() - last) / bar_seconds
+        return 'compact' if missing < COMPACT_BARS else 'full'
+
+    def append(self, asset_class: str, symbol: str, bars: np.ndarray) -> int:
+        """Append the bars newer than the last stored one; return how many."""
+        last = self.last_timestamp(asset_class, symbol)
+        if last is not None:
+            bars = bars[bars['ts'] > last]
+        if not len(bars):
+            return 0
+        path = self.path(asset_class, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock, open(path, 'ab') as f:
+            f.write(np.ascontiguousarray(bars, dtype=OHLCV_DTYPE).tobytes())
+        return len(bars)
+
+    def symbols(self, asset_class: str) -> List[str]:
+        directory = os.path.join(self.root, asset_class)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.ohlcv')] for name in os.listdir(directory) if name.endswith('.ohlcv'))
+
+
+ohlcv_store = OHLCVStore()
@@ -0,0 +1,498 @@
+from collections import deque
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import asyncio
+import os
+import secrets
+
+import numpy as np
+import orjson
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+
+from executors import run_cpu
+from snapshot import ASSET_CLASSES, AssetFrame, MarketSnapshot, SnapshotStore
+
+load_dotenv()
+
+MARKET_WS_QUEUE_SIZE = int(os.getenv('MARKET_WS_QUEUE_SIZE', '32'))
+
+# Queued in place of dropped messages; the writer sends a fresh snapshot
+RESYNC = object()
+
+
+def _chart_changed(old: AssetFrame, new: AssetFrame, old_index: np.ndarray) -> np.ndarray:
+    """Per new symbol, whether its chart differs from the old frame's."""
+    if np.array_equal(old_index, np.arange(len(new))) and np.array_equal(old.chart_offsets, new.chart_offsets):
+        # Same symbols and chart lengths: count differing points per
+        # series with one cumulative sum over the flat values
+        diff = np.concatenate(([0], np.cumsum(old.chart_values != new.chart_values)))
+        return diff[new.chart_offsets[1:]] != diff[new.chart_offsets[:-1]]
+    return np.array([
+        i < 0 or not np.array_equal(old.chart(i), new.chart(j))
+        for j, i in enumerate(old_index)
+    ], dtype=bool)
+
+
+def frame_delta(old: Optional[AssetFrame], new: AssetFrame) -> Dict[str, List[Any]]:
+    """Per-symbol changes from old to new.
+
+    Updated entries carry only the fields that changed, plus the symbol;
+    symbols new to the frame are sent as full rows.
+    """
+    if old is None:
+        return {'updated': list(new.rows), 'removed': []}
+    if old is new:
+        return {'updated': [], 'removed': []}
+    positions = {symbol: i for i, symbol in enumerate(old.symbols)}
+    old_index = np.array([positions.get(symbol, -1) for symbol in new.symbols], dtype=np.int64)
+    present = old_index >= 0
+    gather = np.where(present, old_index, 0)
+    changed = {
+        field: ~present | (getattr(old, field)[gather] != getattr(new, field))
+        for field in ('price', 'change', 'volume')
+    }
+    changed['chartData'] = _chart_changed(old, new, old_index)
+
+    rows = new.rows
+    updated = []
+    for j in np.flatnonzero(changed['price'] | changed['change'] | changed['volume'] | changed['chartData']):
+        if not present[j]:
+            updated.append(rows[j])
+            continue
+        row = rows[j]
+        entry = {'symbol': row['symbol']}
+        for field, mask in changed.items():
+            if mask[j]:
+                entry[field] = row[field]
+        updated.append(entry)
+    removed = []
+    if present.sum() < len(old):
+        kept = set(new.symbols)
+        removed = [symbol for symbol in old.symbols if symbol not in kept]
+    return {'updated': updated, 'removed': removed}
+
+
+def snapshot_deltas(previous: Optional[MarketSnapshot],
+                    snapshot: MarketSnapshot) -> Dict[str, Dict[str, List[Any]]]:
+    """frame_delta for every class whose frame changed between versions."""
+    return {
+        asset_class: frame_delta(previous.frames.get(asset_class) if previous else None, frame)
+        for asset_class, frame in snapshot.frames.items()
+        if previous is None or previous.frames.get(asset_class) is not frame
+    }
+
+
+class MarketSubscriber:
+    """One WebSocket client: its subscription and bounded send queue."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int = MARKET_WS_QUEUE_SIZE):
+        self.websocket = websocket
+        self.classes: Set[str] = set()
+        self.symbols: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.resyncs = 0
+        self.resync_pending = False
+
+    @property
+    def key(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        return frozenset(self.classes), frozenset(self.symbols)
+
+    def subscribe(self, classes: Iterable[str] = (), symbols: Iterable[str] = ()) -> None:
+        self.classes.update(c for c in classes if c in ASSET_CLASSES)
+        self.symbols.update(symbols)
+
+    def unsubscribe(self, classes: Iterable[str] = (), symbols: Iterable[str] = ()) -> None:
+        self.classes.difference_update(classes)
+        self.symbols.difference_update(symbols)
+
+    def offer(self, message: Any) -> None:
+        """Queue message without waiting. A full queue means the client is
+        behind: its backlog is dropped and replaced by one resync, which
+        also covers every message offered until it is sent."""
+        if self.resync_pending:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync()
+            self.resyncs += 1
+
+    def resync(self) -> None:
+        """Replace everything queued with one fresh snapshot."""
+        if self.resync_pending:
+            return
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+        self.resync_pending = True
+
+
+def _select(rows: Iterable[Dict[str, Any]], asset_class: str,
+            classes: FrozenSet[str], symbols: FrozenSet[str]) -> List[Dict[str, Any]]:
+    if asset_class in classes:
+        return list(rows)
+    return [row for row in rows if row['symbol'] in symbols]
+
+
+class MarketStream:
+    """Pushes market snapshots to WebSocket subscribers as deltas.
+
+    A subscriber first gets a snapshot of what it subscribed to, then one
+    delta per published version, with empty data when nothing it sees
+    changed, so each delta's `from` is the version the client holds.
+    Deltas are computed once per version and serialized once per distinct
+    subscription, and sends go through each subscriber's bounded queue so
+    a slow client never holds up the others.
+    """
+
+    def __init__(self, store: SnapshotStore, max_queue: int = MARKET_WS_QUEUE_SIZE,
+                 on_demand: Optional[Callable[[Iterable[str]], None]] = None):
+        self.store = store
+        self.max_queue = max_queue
+        self.on_demand = on_demand
+        self.subscribers: Set[MarketSubscriber] = set()
+        self.broadcasts = 0
+        self._last: Optional[MarketSnapshot] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _on_publish(self, snapshot: MarketSnapshot) -> None:
+        # Called on the publishing thread
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._last = self.store.current
+        self.store.add_listener(self._on_publish)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self.store.remove_listener(self._on_publish)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                snapshot = self.store.current
+                if snapshot is None or snapshot is self._last:
+                    continue
+                deltas = None
+                if self.subscribers:
+                    # Subscribers joining meanwhile are sent self._last,
+                    # which these deltas start from
+                    deltas = await run_cpu(snapshot_deltas, self._last, snapshot)
+                self.broadcast(snapshot, deltas)
+            except Exception as e:
+                print(f"Error broadcasting market delta: {e}")
+
+    @staticmethod
+    def snapshot_message(key: Tuple[FrozenSet[str], FrozenSet[str]],
+                         snapshot: Optional[MarketSnapshot]) -> bytes:
+        """The snapshot of what a subscription with key sees; O(rows), so
+        it is built on the cpu pool."""
+        classes, symbols = key
+        data = {
+            asset_class: _select(snapshot.rows(asset_class) if snapshot else (), asset_class, classes, symbols)
+            for asset_class in ASSET_CLASSES
+        }
+        return orjson.dumps({
+            'type': 'snapshot',
+            'version': snapshot.version if snapshot else 0,
+            'data': {asset_class: rows for asset_class, rows in data.items() if rows},
+        })
+
+    def broadcast(self, snapshot: Optional[MarketSnapshot],
+                  deltas: Optional[Dict[str, Dict[str, List[Any]]]] = None) -> None:
+        """Queue the delta from the last broadcast version to snapshot.
+
+        deltas may be passed in when already computed off the loop.
+        """
+        previous = self._last
+        if snapshot is None or snapshot is previous:
+            return
+        self._last = snapshot
+        self.broadcasts += 1
+        if not self.subscribers:
+            return
+        if deltas is None:
+            deltas = snapshot_deltas(previous, snapshot)
+        if self.on_demand is not None:
+            self.on_demand({c for s in self.subscribers for c in s.classes})
+
+        messages: Dict[Tuple[FrozenSet[str], FrozenSet[str]], bytes] = {}
+        for subscriber in list(self.subscribers):
+            key = subscriber.key
+            if key not in messages:
+                messages[key] = self._delta_message(deltas, snapshot, previous, *key)
+            subscriber.offer(messages[key])
+
+    def _delta_message(self, deltas: Dict[str, Dict[str, List[Any]]], snapshot: MarketSnapshot,
+                       previous: Optional[MarketSnapshot], classes: FrozenSet[str],
+                       symbols: FrozenSet[str]) -> bytes:
+        data = {}
+        for asset_class, delta in deltas.items():
+            updated = _select(delta['updated'], asset_class, classes, symbols)
+            removed = [s for s in delta['removed'] if asset_class in classes or s in symbols]
+            if updated or removed:
+                data[asset_class] = {'updated': updated, 'removed': removed}
+        # Sent even when empty, so the next delta's `from` is this version
+        return orjson.dumps({
+            'type': 'delta',
+            'version': snapshot.version,
+            'from': previous.version if previous else 0,
+            'data': data,
+        })
+
+    def _resubscribe(self, subscriber: MarketSubscriber, message: Dict[str, Any]) -> None:
+        action = message.get('action', 'subscribe')
+        classes = message.get('classes') or []
+        symbols = message.get('symbols') or []
+        if action == 'unsubscribe':
+            subscriber.unsubscribe(classes, symbols)
+        else:
+            subscriber.subscribe(classes, symbols)
+            if self.on_demand is not None:
+                self.on_demand(subscriber.classes)
+        # The writer builds the snapshot; queued deltas are superseded
+        subscriber.resync()
+
+    async def _write(self, subscriber: MarketSubscriber) -> None:
+        while True:
+            message = await subscriber.queue.get()
+            if message is RESYNC:
+                # Captured on the loop, so deltas offered from here on
+                # are all newer than the snapshot being built
+                subscriber.resync_pending = False
+                message = await run_cpu(self.snapshot_message, subscriber.key, self._last)
+            await subscriber.websocket.send_text(message.decode())
+
+    async def serve(self, websocket: WebSocket, classes: Iterable[str] = (),
+                    symbols: Iterable[str] = ()) -> None:
+        """Run one client connection until it disconnects.
+
+        Clients change their subscription by sending
+        {"action": "subscribe" | "unsubscribe", "classes": [...], "symbols": [...]}.
+        """
+        await websocket.accept()
+        subscriber = MarketSubscriber(websocket, self.max_queue)
+        self.subscribers.add(subscriber)
+        writer = asyncio.create_task(self._write(subscriber))
+        try:
+            self._resubscribe(subscriber, {'classes': list(classes), 'symbols': list(symbols)})
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except ValueError:
+                    continue
+                if isinstance(message, dict):
+                    self._resubscribe(subscriber, message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': len(self.subscribers),
+            'broadcasts': self.broadcasts,
+            'version': self._last.version if self._last else None,
+            'queued': sum(s.queue.qsize() for s in self.subscribers),
+            'resyncs': sum(s.resyncs for s in self.subscribers),
+        }
+
+
+# Snapshot versions of events kept for Last-Event-ID resume; a version
+# emits at most one event per symbol, so the log holds this many times
+# the universe
+SIGNAL_STREAM_VERSIONS = int(os.getenv('SIGNAL_STREAM_VERSIONS', '4'))
+SSE_KEEPALIVE = 15.0
+
+# Event ids are '<epoch>-<n>'; ids from an earlier process never match
+STREAM_EPOCH = secrets.token_hex(4)
+STREAM_EPOCH_PREFIX = f'{STREAM_EPOCH}-'
+
+# Tells the client to drop its signals; the current set follows
+SSE_RESYNC = b'event: resync\ndata: {}\n\n'
+
+
+def sse_event(event_id: int, event: str, data: Any) -> bytes:
+    return b'id: %s%d\nevent: %s\ndata: %s\n\n' % (
+        STREAM_EPOCH_PREFIX.encode(), event_id, event.encode(), orjson.dumps(data))
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[int]:
+    """The counter of an event id from this process, else None."""
+    if not event_id or not event_id.startswith(STREAM_EPOCH_PREFIX):
+        return None
+    try:
+        return int(event_id[len(STREAM_EPOCH_PREFIX):])
+    except ValueError:
+        return None
+
+
+def _signal_key(signal: Dict[str, Any]) -> Tuple[Any, ...]:
+    # The id embeds the generation time, so it is left out of the comparison
+    return signal['signal_type'], signal['price'], signal['confidence']
+
+
+class SignalStream:
+    """Fans new and changed trading signals out to Server-Sent Event clients.
+
+    One producer turns each published snapshot into encoded events and
+    appends them to a shared log of the last `history` events; clients only
+    hold a cursor into it and get every event after it. A client whose
+    cursor falls off the log, by being that far behind or reconnecting
+    with an id from too long ago or from another process, is resynced: it
+    gets a resync event and then the current signal set.
+    """
+
+    def __init__(self, store: SnapshotStore, generate: Callable[[MarketSnapshot], List[Dict[str, Any]]],
+                 history: int):
+        self.store = store
+        self.generate = generate
+        self._log: Deque[Tuple[int, bytes]] = deque(maxlen=history)
+        self._next_id = 1
+        # Latest event per symbol: what a client with no usable cursor gets
+        self._state: Dict[str, Tuple[int, Dict[str, Any], bytes]] = {}
+        self._version: Optional[int] = None
+        self._published = asyncio.Event()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.dropped = 0
+        self.resyncs = 0
+
+    def _on_publish(self, snapshot: MarketSnapshot) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.store.add_listener(self._on_publish)
+        self._task = asyncio.create_task(self._run())
+        if self.store.current is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        self.store.remove_listener(self._on_publish)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                snapshot = self.store.current
+                if snapshot is None or snapshot.version == self._version:
+                    continue
+                self.produce(snapshot, await run_cpu(self.generate, snapshot))
+            except Exception as e:
+                print(f"Error producing signal events: {e}")
+
+    def _append(self, event: str, data: Any) -> Tuple[int, bytes]:
+        event_id = self._next_id
+        self._next_id += 1
+        encoded = sse_event(event_id, event, data)
+        self._log.append((event_id, encoded))
+        return event_id, encoded
+
+    def produce(self, snapshot: Optional[MarketSnapshot],
+                signals: Optional[List[Dict[str, Any]]] = None) -> int:
+        """Log events for signals that are new, changed or gone; return how many.
+
+        signals may be passed in when already generated off the loop.
+        """
+        if snapshot is None or snapshot.version == self._version:
+            return 0
+        self._version = snapshot.version
+        if signals is None:
+            signals = self.generate(snapshot)
+        signals = {signal['symbol']: signal for signal in signals}
+        count = 0
+        for symbol, signal in signals.items():
+            current = self._state.get(symbol)
+            if current is not None and _signal_key(current[1]) == _signal_key(signal):
+                continue
+            event_id, encoded = self._append('signal', signal)
+            self._state[symbol] = (event_id, signal, encoded)
+            count += 1
+        for symbol in [symbol for symbol in self._state if symbol not in signals]:
+            del self._state[symbol]
+            self._append('signal_removed', {'symbol': symbol})
+            count += 1
+        if count:
+            # Wake every waiting client at once, then arm a new event
+            self._published.set()
+            self._published = asyncio.Event()
+        return count
+
+    def _tail(self, count: int) -> List[bytes]:
+        """The newest count logged events, oldest first, walking only those."""
+        return [encoded for _, encoded in islice(reversed(self._log), count)][::-1]
+
+    def _resync(self) -> List[bytes]:
+        """A resync event, then the latest event of every current signal."""
+        return [SSE_RESYNC, *(encoded for _, _, encoded in sorted(self._state.values(), key=lambda s: s[0]))]
+
+    def _since(self, cursor: Optional[int]) -> Tuple[List[bytes], int]:
+        """Events after cursor and the new cursor, or a resync when cursor
+        is missing or has already left the log."""
+        head = self._next_id - 1
+        oldest = head - len(self._log)
+        if cursor is not None and oldest <= cursor <= head:
+            return self._tail(head - cursor), head
+        if cursor is not None:
+            self.dropped += max(0, oldest - cursor)
+            self.resyncs += 1
+        return self._resync(), head
+
+    async def events(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE byte stream for one client, resuming after last_event_id."""
+        self.subscribers += 1
+        try:
+            chunk, cursor = self._since(parse_event_id(last_event_id))
+            yield b'retry: 3000\n\n' + b''.join(chunk)
+            while True:
+                published = self._published
+                if self._next_id - 1 == cursor:
+                    try:
+                        await asyncio.wait_for(published.wait(), SSE_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        yield b': keepalive\n\n'
+                        continue
+                chunk, cursor = self._since(cursor)
+                if chunk:
+                    yield b''.join(chunk)
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': self.subscribers,
+            'last_event_id': f'{STREAM_EPOCH_PREFIX}{self._next_id - 1}',
+            'logged': len(self._log),
+            'signals': len(self._state),
+            'dropped': self.dropped,
+            'resyncs': self.resyncs,
+            'version': self._version,
+        }
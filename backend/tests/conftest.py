@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# market.py builds its Alpha Vantage clients at import
+os.environ.setdefault('ALPHA_VANTAGE_API_KEY', 'test')
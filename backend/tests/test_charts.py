@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from charts import ChartPyramid, ChartPyramids, lttb
+
+
+def _series(n: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000 + 60 * np.arange(n, dtype=np.int64)
+    return ts, 100 + np.cumsum(rng.normal(0, 1, n))
+
+
+def test_incremental_pyramid_matches_full_build():
+    ts, values = _series(20_000)
+    full = ChartPyramid(ts, values)
+    assert len(full.levels) >= 4
+    pyramid = ChartPyramid(ts[:3_000], values[:3_000])
+    cuts = [3_000, 3_001, 3_007, 4_100, 9_999, 16_385, 20_000]
+    for start, end in zip(cuts, cuts[1:]):
+        # Overlapping bars are skipped
+        pyramid.extend(ts[start - 5:end], values[start - 5:end])
+    assert len(pyramid.levels) == len(full.levels)
+    for level, ((inc_ts, inc_values), (full_ts, full_values)) in enumerate(zip(pyramid.levels, full.levels)):
+        assert np.array_equal(inc_ts, full_ts), level
+        assert np.array_equal(inc_values, full_values), level
+
+
+def test_query_keeps_the_latest_bar_and_range():
+    ts, values = _series(20_000)
+    pyramid = ChartPyramid(ts, values)
+    for start in (None, int(ts[15_000])):
+        out_ts, out_values = pyramid.query(start, 100)
+        assert out_ts[-1] == ts[-1] and out_values[-1] == values[-1]
+        assert start is None or out_ts[0] >= start
+        assert 100 <= len(out_ts) <= 101
+
+
+def test_lttb_returns_everything_at_or_under_the_threshold():
+    xs, ys = _series(10)
+    assert lttb(xs, ys, 10).tolist() == list(range(10))
+    assert lttb(xs, ys, 50).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize('n_out, expected', [(0, []), (1, [9]), (2, [0, 9])])
+def test_lttb_below_three_points(n_out, expected):
+    xs, ys = _series(10)
+    assert lttb(xs, ys, n_out).tolist() == expected
+
+
+def test_lttb_keeps_ends_and_extremes():
+    xs = np.arange(1_000, dtype=np.float64)
+    ys = np.zeros(1_000)
+    ys[500] = 10.0
+    keep = lttb(xs, ys, 20)
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert 500 in keep
+
+
+def test_pyramids_load_only_new_bars():
+    ts, values = _series(500)
+    bars = np.zeros(len(ts), dtype=[('ts', np.int64), ('close', np.float64)])
+    bars['ts'], bars['close'] = ts, values
+    visible, calls = 300, []
+
+    def load_since(since):
+        calls.append(since)
+        shown = bars[:visible]
+        return shown if since is None else shown[shown['ts'] > since]
+
+    pyramids = ChartPyramids()
+    assert pyramids.get('crypto', 'BTC', load_since).last_ts == ts[299]
+    visible = 500
+    pyramid = pyramids.get('crypto', 'BTC', load_since)
+    assert calls == [None, int(ts[299])]
+    assert pyramid.last_ts == ts[-1] and len(pyramid) == 500
@@ -0,0 +1,66 @@
+"""Endpoints on a cold start: quota-limited provider, nothing stored and
+upstream unreachable. Handlers must serve the (empty) current snapshot
+rather than fail.
+
+The app reads its provider and store settings at import, so it runs in a
+subprocess with its own environment.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUESTS = {
+    'root': ('GET', '/', None),
+    'analysis': ('GET', '/market/analysis', None),
+    'signals': ('GET', '/signals', None),
+    'chart': ('GET', '/market/chart?asset_class=crypto&symbol=BTC', None),
+    'batch': ('POST', '/batch', {'requests': [{'path': '/market/analysis'}, {'path': '/signals'}]}),
+    'batch_traders': ('POST', '/batch', {'requests': [{'path': '/copy-trade/traders'}]}),
+}
+
+SCRIPT = '''
+import json, sys
+from fastapi.testclient import TestClient
+import main
+results = {}
+with TestClient(main.app) as client:
+    for name, (method, path, body) in json.loads(sys.argv[1]).items():
+        response = client.request(method, path, json=body)
+        results[name] = [response.status_code, response.json()]
+print(json.dumps(results))
+'''
+
+
+@pytest.fixture(scope='module')
+def cold_responses(tmp_path_factory):
+    env = {
+        **os.environ,
+        'MARKET_DATA_PROVIDER': 'alpha_vantage',
+        'MARKET_STORE_DIR': str(tmp_path_factory.mktemp('store')),
+        # Nothing listens on the discard port
+        'ALPHA_VANTAGE_BASE_URL': 'http://127.0.0.1:9',
+        'MODEL_DIR': str(tmp_path_factory.mktemp('models')),
+    }
+    result = subprocess.run([sys.executable, '-c', SCRIPT, json.dumps(REQUESTS)], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize('name', REQUESTS)
+def test_endpoint_serves_on_cold_start(cold_responses, name):
+    status_code, body = cold_responses[name]
+    assert status_code == 200, body
+    if name.startswith('batch'):
+        assert [item['status'] for item in body['responses']] == [200] * len(REQUESTS[name][2]['requests'])
+
+
+def test_classes_without_data_are_empty(cold_responses):
+    _, body = cold_responses['analysis']
+    assert body['crypto'] == body['forex'] == body['stocks'] == []
+    assert cold_responses['signals'][1] == []
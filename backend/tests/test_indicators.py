@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from indicators import DEFAULT_PARAMS, IndicatorBook, IndicatorState, compute_indicators
+from providers import SimulatedProvider
+
+N_SYMBOLS = 12
+N_BARS = 300
+
+
+def _bars():
+    return SimulatedProvider(seed=5).bulk('crypto', N_SYMBOLS, N_BARS, dtype=np.float64)
+
+
+def _wilder(values: np.ndarray, period: int) -> np.ndarray:
+    """Wilder smoothing seeded with the mean of the first `period` values."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1] = values[:period].mean()
+        for t in range(period, len(values)):
+            out[t] = (out[t - 1] * (period - 1) + values[t]) / period
+    return out
+
+
+def _reference(high: np.ndarray, low: np.ndarray, close: np.ndarray, p=DEFAULT_PARAMS) -> dict:
+    """One symbol's indicators from pandas and plain loops."""
+    series = pd.Series(close)
+    ema = lambda values, span: values.ewm(span=span, adjust=False).mean()
+    macd = ema(series, p.macd_fast) - ema(series, p.macd_slow)
+    macd_signal = ema(macd, p.macd_signal)
+
+    moves = np.diff(close)
+    avg_gain = _wilder(np.maximum(moves, 0.0), p.rsi)
+    avg_loss = _wilder(np.maximum(-moves, 0.0), p.rsi)
+    rsi = np.concatenate(([np.nan], 100.0 * avg_gain / (avg_gain + avg_loss)))
+
+    window = series.rolling(p.bollinger)
+    std = window.std(ddof=0)
+    previous = np.concatenate(([np.nan], close[:-1]))
+    ranges = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    ranges[0] = high[0] - low[0]
+    return {
+        'close': close,
+        'sma': series.rolling(p.sma).mean().to_numpy(),
+        'sma_long': series.rolling(p.sma_long).mean().to_numpy(),
+        'ema': ema(series, p.ema).to_numpy(),
+        'rsi': rsi,
+        'macd': macd.to_numpy(),
+        'macd_signal': macd_signal.to_numpy(),
+        'macd_hist': (macd - macd_signal).to_numpy(),
+        'bb_upper': (window.mean() + p.bollinger_width * std).to_numpy(),
+        'bb_middle': window.mean().to_numpy(),
+        'bb_lower': (window.mean() - p.bollinger_width * std).to_numpy(),
+        'atr': _wilder(ranges, p.atr),
+    }
+
+
+def test_batch_indicators_match_per_symbol_reference():
+    bars = _bars()
+    indicators = compute_indicators(bars['high'], bars['low'], bars['close'])._asdict()
+    for i in range(N_SYMBOLS):
+        expected = _reference(bars['high'][i], bars['low'][i], bars['close'][i])
+        for name, values in expected.items():
+            scale = np.abs(bars['close'][i]).max()
+            np.testing.assert_allclose(indicators[name][i], values, rtol=1e-9, atol=1e-9 * scale,
+                                       equal_nan=True, err_msg=name)
+
+
+def test_warmup_is_nan_until_enough_bars():
+    bars = _bars()
+    indicators = compute_indicators(bars['high'], bars['low'], bars['close'])
+    p = DEFAULT_PARAMS
+    for name, ready in (('sma', p.sma - 1), ('sma_long', p.sma_long - 1), ('bb_upper', p.bollinger - 1),
+                        ('rsi', p.rsi), ('atr', p.atr - 1)):
+        values = getattr(indicators, name)
+        assert np.isnan(values[:, :ready]).all(), name
+        assert not np.isnan(values[:, ready:]).any(), name
+
+
+def test_short_history_does_not_fail():
+    bars = _bars()
+    indicators = compute_indicators(bars['high'][:, :3], bars['low'][:, :3], bars['close'][:, :3])
+    assert indicators.close.shape == (N_SYMBOLS, 3)
+    assert np.isnan(indicators.sma_long).all()
+    assert not np.isnan(indicators.ema).any()
+
+
+def test_incremental_state_matches_batch_at_every_bar():
+    bars = _bars()
+    batch = compute_indicators(bars['high'], bars['low'], bars['close'])
+    state = IndicatorState(N_SYMBOLS)
+    for t in range(N_BARS):
+        latest = state.update(bars['high'][:, t], bars['low'][:, t], bars['close'][:, t])
+        for name, values in batch.latest(N_BARS - t).items():
+            np.testing.assert_allclose(latest[name], values, rtol=1e-12, equal_nan=True,
+                                       err_msg=f'{name} at bar {t}')
+
+
+def test_state_from_history_matches_batch_latest():
+    bars = _bars()
+    state = IndicatorState.from_history(bars['high'], bars['low'], bars['close'])
+    batch = compute_indicators(bars['high'], bars['low'], bars['close']).latest()
+    for name, values in state.latest().items():
+        np.testing.assert_allclose(values, batch[name], rtol=1e-12, equal_nan=True, err_msg=name)
+
+
+def test_book_applies_only_new_bars_per_symbol():
+    simulator = SimulatedProvider(seed=5, epoch=0)
+    symbols = ['BTC', 'ETH', 'SOL']
+    history = {symbol: simulator.bars('crypto', symbol, 0, N_BARS - 1) for symbol in symbols}
+    # Each symbol's feed grows at its own pace between reads
+    visible = {'BTC': 0, 'ETH': 0, 'SOL': 0}
+    loads = []
+
+    def load_since(symbol, since):
+        bars = history[symbol][:visible[symbol]]
+        if since is not None:
+            bars = bars[bars['ts'] > since]
+        loads.append(len(bars))
+        return bars
+
+    book = IndicatorBook()
+    for step, sizes in enumerate([(60, 30, 0), (61, 90, 45), (200, 90, 46), (N_BARS, N_BARS, N_BARS)]):
+        visible.update(zip(symbols, sizes))
+        loads.clear()
+        latest = book.latest(symbols, load_since)
+        for i, symbol in enumerate(symbols):
+            bars = history[symbol][:visible[symbol]]
+            if not len(bars):
+                assert np.isnan(latest['close'][i])
+                continue
+            expected = compute_indicators(bars['high'][None], bars['low'][None], bars['close'][None]).latest()
+            for name, values in expected.items():
+                np.testing.assert_allclose(latest[name][i], values[0], rtol=1e-12, equal_nan=True,
+                                           err_msg=f'{symbol} {name} at step {step}')
+    # The last read only loaded the bars each symbol gained
+    assert loads == [N_BARS - 200, N_BARS - 90, N_BARS - 46]
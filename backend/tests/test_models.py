@@ -0,0 +1,118 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+import signals
+from models import ModelRegistry, load_model, save_model
+from snapshot import AssetFrame, MarketSnapshot
+
+
+class ChangeEstimator:
+    """BUY with probability change / scale, the rest split evenly between
+    SELL and HOLD."""
+    classes_ = np.array(['SELL', 'HOLD', 'BUY'])
+
+    def __init__(self, scale: float = 10.0):
+        self.scale = scale
+
+    def predict_proba(self, X):
+        buy = np.clip(X[:, 0] * 10 / self.scale, 0.0, 1.0)
+        rest = (1 - buy) / 2
+        return np.column_stack([rest, rest, buy])
+
+
+def _bundle(scale: float = 10.0, **extra):
+    return {'estimator': ChangeEstimator(scale), 'features': ['change / 10'], **extra}
+
+
+def _frame(asset_class: str, changes) -> AssetFrame:
+    return AssetFrame.from_rows(asset_class, [
+        {'symbol': f'S{i}', 'price': 100.0, 'change': change, 'volume': 0.0, 'chartData': []}
+        for i, change in enumerate(changes)
+    ])
+
+
+def _write(model_dir, bundle, asset_class='forex', mtime=None) -> str:
+    path = save_model(bundle, asset_class, str(model_dir))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_load_checks_the_bundle(tmp_path):
+    model = load_model('forex', _write(tmp_path, _bundle()))
+    assert model.features == ('change / 10',)
+    assert model.directions.tolist() == [-1, 0, 1]
+    # Derived from the class count unless the bundle sets it
+    assert model.min_confidence == pytest.approx(1.1 / 3)
+    assert load_model('forex', _write(tmp_path, _bundle(min_confidence=0.5))).min_confidence == 0.5
+
+    for bundle, message in [
+        ({'features': []}, 'no estimator'),
+        ({'estimator': ChangeEstimator(), 'features': ['volatility']}, "unknown name 'volatility'"),
+    ]:
+        joblib.dump(bundle, tmp_path / 'bad.joblib')
+        with pytest.raises(ValueError, match=message):
+            load_model('bad', str(tmp_path / 'bad.joblib'))
+
+
+def test_reload_swaps_changed_files_only(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    _write(tmp_path, _bundle(10.0), mtime=1000)
+    assert registry.load_all() == {'forex': 'loaded'}
+    first = registry.get('forex')
+    assert registry.load_all() == {'forex': 'unchanged'}
+    assert registry.get('forex') is first
+
+    _write(tmp_path, _bundle(20.0), mtime=2000)
+    assert registry.load_all() == {'forex': 'loaded'}
+    assert registry.get('forex').estimator.scale == 20.0
+    # A prediction holding the old model keeps it whole
+    assert first.estimator.scale == 10.0
+
+    (tmp_path / 'forex.joblib').write_bytes(b'not a model')
+    os.utime(tmp_path / 'forex.joblib', (3000, 3000))
+    assert registry.load_all() == {'forex': 'failed'}
+    assert registry.get('forex').estimator.scale == 20.0
+    assert 'forex' in registry.errors
+
+    os.remove(tmp_path / 'forex.joblib')
+    assert registry.load_all() == {'forex': 'removed'}
+    assert registry.get('forex') is None
+
+
+def test_predict_only_emits_confident_symbols(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    _write(tmp_path, _bundle())
+    registry.load_all()
+    # change 9 -> BUY 0.9; -5 -> SELL and HOLD tie at 0.5, the first wins;
+    # 3.4 -> every class near 1/3, below the 0.367 threshold
+    direction, confidence, emit = registry.predict('forex', _frame('forex', [9.0, -5.0, 3.4]), dict)
+    assert emit.tolist() == [True, True, False]
+    assert direction[emit].tolist() == [1, -1]
+    np.testing.assert_allclose(confidence, [0.9, 0.5, 0.34])
+    assert registry.predict('stocks', _frame('stocks', [1.0]), dict) is None
+
+
+def test_rules_decide_symbols_the_model_is_not_confident_about(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path))
+    _write(tmp_path, _bundle(), 'forex')
+    _write(tmp_path, _bundle(), 'stocks')
+    registry.load_all()
+    monkeypatch.setattr(signals, 'model_registry', registry)
+    snapshot = MarketSnapshot(1, {
+        'forex': _frame('forex', [9.0, -5.0, 3.4]),
+        # No volume, so the stocks rule signals nothing
+        'stocks': _frame('stocks', [3.4]),
+    })
+    by_symbol = {}
+    for signal in signals.generate_technical_signals(snapshot):
+        by_symbol.setdefault(signal.symbol, []).append((signal.signal_type, signal.confidence))
+    assert by_symbol == {
+        'S0': [('BUY', pytest.approx(0.9))],
+        'S1': [('SELL', pytest.approx(0.5))],
+        # Not confident: the forex momentum rule signals the move
+        'S2': [('BUY', pytest.approx(0.95))],
+    }
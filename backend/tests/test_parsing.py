@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from parsing import parse_time_series
+
+
+def _series(dates, newest_first: bool = True) -> dict:
+    bars = {date: {'1. open': str(i), '2. high': str(i + 1), '3. low': str(i - 1),
+                   '4. close': str(i + 0.5), '5. volume': str(10 * i)}
+            for i, date in enumerate(sorted(dates), start=1)}
+    keys = sorted(bars, reverse=newest_first)
+    return {key: bars[key] for key in keys}
+
+
+def _ts(date: str) -> int:
+    return int(np.datetime64(date.replace(' ', 'T'), 's').astype(np.int64))
+
+
+DAILY = ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']
+INTRADAY = ['2024-01-02 15:55:00', '2024-01-02 16:00:00', '2024-01-03 09:30:00']
+
+
+@pytest.mark.parametrize('newest_first', [True, False])
+def test_since_keeps_only_newer_bars(newest_first):
+    series = _series(DAILY, newest_first)
+    full = parse_time_series(series)
+    assert full['ts'].tolist() == [_ts(date) for date in DAILY]
+    # The bar at since is already stored
+    newer = parse_time_series(series, since=_ts('2024-01-02'))
+    assert newer['ts'].tolist() == [_ts('2024-01-03'), _ts('2024-01-04')]
+    assert np.array_equal(newer, full[2:])
+
+
+@pytest.mark.parametrize('newest_first', [True, False])
+def test_since_compares_intraday_keys_to_the_second(newest_first):
+    series = _series(INTRADAY, newest_first)
+    newer = parse_time_series(series, since=_ts('2024-01-02 15:59:59'))
+    assert newer['ts'].tolist() == [_ts(INTRADAY[1]), _ts(INTRADAY[2])]
+    assert len(parse_time_series(series, since=_ts(INTRADAY[1]))) == 1
+
+
+@pytest.mark.parametrize('newest_first', [True, False])
+def test_since_before_and_after_the_series(newest_first):
+    series = _series(DAILY, newest_first)
+    assert len(parse_time_series(series, since=_ts('2023-12-31'))) == len(DAILY)
+    # A daily key is compared by date, so a time later that day is not newer
+    assert len(parse_time_series(series, since=_ts('2024-01-03 12:00:00'))) == 1
+    empty = parse_time_series(series, since=_ts('2024-01-04'))
+    assert len(empty) == 0 and empty.dtype == parse_time_series(series).dtype
+    assert len(parse_time_series({}, since=_ts('2024-01-04'))) == 0
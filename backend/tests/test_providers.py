@@ -0,0 +1,27 @@
+import numpy as np
+
+from providers import BLOCK_BARS, SimulatedProvider
+
+
+def test_bars_do_not_depend_on_the_window():
+    simulator = SimulatedProvider(seed=3, epoch=0)
+    whole = simulator.bars('crypto', 'BTC', 0, 3 * BLOCK_BARS)
+    for first, last in [(5, 40), (BLOCK_BARS - 3, BLOCK_BARS + 3), (BLOCK_BARS + 1, 3 * BLOCK_BARS)]:
+        assert np.array_equal(simulator.bars('crypto', 'BTC', first, last), whole[first:last + 1])
+    # A fresh simulator builds its block offsets from scratch
+    late = SimulatedProvider(seed=3, epoch=0).bars('crypto', 'BTC', 2 * BLOCK_BARS + 7, 2 * BLOCK_BARS + 9)
+    assert np.array_equal(late, whole[2 * BLOCK_BARS + 7:2 * BLOCK_BARS + 10])
+
+
+def test_opens_continue_previous_closes_across_blocks():
+    bars = SimulatedProvider(seed=3, epoch=0).bars('stocks', 'SPX', 0, 2 * BLOCK_BARS + 5)
+    assert np.array_equal(bars['open'][1:], bars['close'][:-1])
+    assert np.all(bars['high'] >= np.maximum(bars['open'], bars['close']))
+    assert np.all(bars['low'] <= np.minimum(bars['open'], bars['close']))
+
+
+def test_generate_is_reproducible_across_batches():
+    simulator = SimulatedProvider(seed=3, epoch=0)
+    both = simulator.generate('forex', ['EURUSD', 'GBPUSD'], 'full', now=3600)
+    alone = SimulatedProvider(seed=3, epoch=0).generate('forex', ['GBPUSD'], 'full', now=3600)
+    assert np.array_equal(both['GBPUSD'], alone['GBPUSD'])
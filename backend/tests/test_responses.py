@@ -0,0 +1,118 @@
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import pytest
+
+from compression import COMPRESSION_MIN_SIZE, ENCODINGS
+from responses import SnapshotBodies, encoded_etag, snapshot_bodies, snapshot_etag, snapshot_response
+from snapshot import MarketSnapshot
+
+
+def _build(snapshot: MarketSnapshot) -> dict:
+    return {'version': snapshot.version}
+
+
+def _build_large(snapshot: MarketSnapshot) -> dict:
+    return {'version': snapshot.version, 'pad': 'x' * COMPRESSION_MIN_SIZE}
+
+
+def _app() -> FastAPI:
+    """Serves the snapshot version named by ?version=, as a small body
+    or one large enough to compress."""
+    app = FastAPI()
+
+    @app.get('/body')
+    async def body(request: Request, version: int):
+        return await snapshot_response(request, 'test-body', MarketSnapshot(version, {}), _build)
+
+    @app.get('/large')
+    async def large(request: Request, version: int):
+        return await snapshot_response(request, 'test-large', MarketSnapshot(version, {}), _build_large)
+    return app
+
+
+def test_older_version_gets_its_own_body_and_keeps_newer_cached():
+    bodies = SnapshotBodies()
+    newer = bodies.get('market', MarketSnapshot(2, {}), _build)
+    older = bodies.get('market', MarketSnapshot(1, {}), _build)
+    assert (older.version, older.etag, json.loads(older.body)) == (1, snapshot_etag('market', 1), {'version': 1})
+    assert bodies.cached('market', MarketSnapshot(2, {})) is newer
+    assert bodies.cached('market', MarketSnapshot(1, {})) is None
+
+
+def test_response_etag_matches_the_body_when_versions_race():
+    snapshot_bodies.clear()
+    client = TestClient(_app())
+    newer = client.get('/body', params={'version': 2}, headers={'Accept-Encoding': 'identity'})
+    # A request still holding version 1 finishes after version 2 was cached
+    older = client.get('/body', params={'version': 1}, headers={'Accept-Encoding': 'identity'})
+    assert older.json() == {'version': 1}
+    assert older.headers['etag'] == snapshot_etag('test-body', 1)
+    assert older.headers['x-snapshot-version'] == '1'
+    assert newer.headers['etag'] == snapshot_etag('test-body', 2)
+    # Revalidating the older tag against the newer version sends the body
+    revalidated = client.get('/body', params={'version': 2},
+                             headers={'If-None-Match': older.headers['etag'], 'Accept-Encoding': 'identity'})
+    assert revalidated.status_code == 200 and revalidated.json() == {'version': 2}
+
+
+@pytest.mark.parametrize('if_none_match', [
+    '{etag}', 'W/{etag}', '*', '"other", {etag}', '{etag_br}', 'W/{etag_gzip}',
+])
+def test_matching_if_none_match_gets_304(if_none_match):
+    snapshot_bodies.clear()
+    client = TestClient(_app())
+    etag = snapshot_etag('test-body', 3)
+    header = if_none_match.format(etag=etag, etag_br=encoded_etag(etag, 'br'),
+                                  etag_gzip=encoded_etag(etag, 'gzip'))
+    response = client.get('/body', params={'version': 3},
+                          headers={'If-None-Match': header, 'Accept-Encoding': 'identity'})
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['etag'] == etag
+    # Answered from the tag alone
+    assert snapshot_bodies.cached('test-body', MarketSnapshot(3, {})) is None
+
+
+@pytest.mark.parametrize('if_none_match', [
+    snapshot_etag('test-body', 2),
+    # Same name and version from an earlier process
+    '"test-body-00000000-3"',
+    '"test-body-"',
+])
+def test_other_tags_get_the_body(if_none_match):
+    client = TestClient(_app())
+    response = client.get('/body', params={'version': 3},
+                          headers={'If-None-Match': if_none_match, 'Accept-Encoding': 'identity'})
+    assert response.status_code == 200 and response.json() == {'version': 3}
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_each_encoding_gets_its_own_etag(encoding):
+    snapshot_bodies.clear()
+    client = TestClient(_app())
+    etag = snapshot_etag('test-large', 4)
+    response = client.get('/large', params={'version': 4}, headers={'Accept-Encoding': encoding})
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == encoding
+    assert response.headers['etag'] == encoded_etag(etag, encoding) == f'{etag[:-1]}-{encoding}"'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert response.json()['version'] == 4
+
+    revalidated = client.get('/large', params={'version': 4},
+                             headers={'Accept-Encoding': encoding, 'If-None-Match': response.headers['etag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['etag'] == response.headers['etag']
+
+
+def test_identity_and_small_bodies_get_the_plain_etag():
+    client = TestClient(_app())
+    identity = client.get('/large', params={'version': 5}, headers={'Accept-Encoding': 'identity'})
+    assert identity.headers['etag'] == snapshot_etag('test-large', 5)
+    assert 'content-encoding' not in identity.headers
+    # Under COMPRESSION_MIN_SIZE the body is sent as is, under the plain tag
+    small = client.get('/body', params={'version': 5}, headers={'Accept-Encoding': 'gzip'})
+    assert small.headers['etag'] == snapshot_etag('test-body', 5)
+    assert 'content-encoding' not in small.headers
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from rules import RuleError, RuleSet, load_rule_sets
+from snapshot import AssetFrame
+
+N = 400
+
+
+def _frame(asset_class: str, rng) -> AssetFrame:
+    rows = [
+        {'symbol': f'S{i}', 'price': price, 'change': change, 'volume': volume, 'chartData': []}
+        for i, (price, change, volume) in enumerate(zip(
+            rng.uniform(10, 1000, N).tolist(), rng.normal(0, 1, N).round(2).tolist(),
+            rng.uniform(0, 3e6, N).round().tolist()))
+    ]
+    return AssetFrame.from_rows(asset_class, rows)
+
+
+def _indicators(frame: AssetFrame, rng) -> dict:
+    close = frame.price
+    middle = close * rng.uniform(0.95, 1.05, N)
+    width = close * rng.uniform(0.0, 0.05, N)
+    latest = {
+        'close': close,
+        'rsi': rng.uniform(0, 100, N),
+        'macd_hist': rng.normal(0, 1, N),
+        'bb_upper': middle + width,
+        'bb_lower': middle - width,
+        'sma_long': close * rng.uniform(0.95, 1.05, N),
+    }
+    # Some symbols are still warming up
+    for values in latest.values():
+        if values is not close:
+            values[rng.random(N) < 0.1] = np.nan
+    return latest
+
+
+# The hand-written rules signal_rules.json replaced
+
+def _band_votes(values, below, above):
+    return np.select([values < below, values > above], [1, -1], 0)
+
+
+def crypto_rule(frame, latest):
+    close = latest['close']
+    votes = (
+        _band_votes(latest['rsi'], 30.0, 70.0)
+        + np.sign(np.nan_to_num(latest['macd_hist'])).astype(int)
+        + _band_votes(close, latest['bb_lower'], latest['bb_upper'])
+        + np.select([close > latest['sma_long'], close < latest['sma_long']], [1, -1], 0)
+    )
+    direction = np.select([votes >= 2, votes <= -2], [1, -1], 0)
+    confidence = np.minimum(0.6 + 0.1 * np.abs(votes), 0.95)
+    return direction, confidence, np.ones(len(frame), dtype=bool)
+
+
+def forex_rule(frame, latest):
+    emit = np.abs(frame.change) > 0.5
+    confidence = np.minimum(0.7 + np.abs(frame.change) / 2, 0.95)
+    return np.sign(frame.change).astype(int), confidence, emit
+
+
+def stocks_rule(frame, latest):
+    volume_change = frame.volume / 1000000
+    emit = (volume_change > 1) & (np.abs(frame.change) > 0.3)
+    confidence = np.minimum(0.75 + volume_change * 0.1, 0.95)
+    return np.sign(frame.change).astype(int), confidence, emit
+
+
+@pytest.mark.parametrize('asset_class, rule', [
+    ('crypto', crypto_rule), ('forex', forex_rule), ('stocks', stocks_rule),
+])
+def test_compiled_rules_match_hand_written_rules(asset_class, rule):
+    rng = np.random.default_rng(11)
+    frame = _frame(asset_class, rng)
+    latest = _indicators(frame, rng)
+    direction, confidence, emit = load_rule_sets()[asset_class].evaluate(frame, lambda: latest)
+    expected_direction, expected_confidence, expected_emit = rule(frame, latest)
+    assert emit.any() and np.array_equal(emit, expected_emit)
+    assert np.array_equal(direction[emit], expected_direction[emit])
+    np.testing.assert_allclose(confidence[emit], expected_confidence[emit], rtol=1e-12)
+
+
+def test_indicators_are_only_computed_when_named():
+    rng = np.random.default_rng(11)
+    frame = _frame('forex', rng)
+
+    def indicators():
+        raise AssertionError('forex rules name no indicator')
+    load_rule_sets()['forex'].evaluate(frame, indicators)
+
+
+def test_first_matching_rule_decides():
+    rule_set = RuleSet('forex', {'rules': [
+        {'name': 'up', 'when': 'change > 0', 'direction': 'BUY', 'confidence': '0.9'},
+        {'name': 'any', 'when': 'True', 'direction': 'SELL', 'confidence': '2'},
+    ]})
+    frame = _frame('forex', np.random.default_rng(11))
+    direction, confidence, emit = rule_set.evaluate(frame, dict)
+    up = frame.change > 0
+    assert emit.all()
+    assert np.array_equal(direction, np.where(up, 1, -1))
+    # Confidence is clipped to [0, 1]
+    assert np.array_equal(confidence, np.where(up, 0.9, 1.0))
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'rules': [{'when': 'price > 1', 'direction': 'BUY', 'confidence': 'volatility'}]}, "unknown name 'volatility'"),
+    ({'rules': [{'direction': 'frame.price', 'confidence': '1'}]}, 'Attribute is not allowed'),
+    ({'rules': [{'direction': 'BUY', 'confidence': 'round(price)'}]}, "unknown function 'round'"),
+    ({'rules': [{'direction': 'BUY', 'confidence': '"high"'}]}, 'is not a number'),
+    ({'rules': [{'direction': 'BUY', 'confidence': 'price >'}]}, 'invalid syntax'),
+    ({'rules': [{'direction': 'BUY'}]}, "missing 'confidence'"),
+    ({'let': {'price': 'change * 2'}, 'rules': []}, "cannot define 'price'"),
+])
+def test_invalid_rules_fail_to_compile(spec, message):
+    with pytest.raises(RuleError, match=message):
+        RuleSet('forex', spec)
@@ -0,0 +1,33 @@
+import orjson
+
+from snapshot import SnapshotStore
+from streaming import MarketStream, MarketSubscriber
+
+
+def _rows(*prices):
+    return [{'symbol': f'S{i}', 'price': price, 'change': 0.0, 'volume': 1.0, 'chartData': [price]}
+            for i, price in enumerate(prices)]
+
+
+def _drain(subscriber: MarketSubscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(orjson.loads(subscriber.queue.get_nowait()))
+    return messages
+
+
+def test_deltas_chain_even_when_nothing_subscribed_changed():
+    store = SnapshotStore()
+    stream = MarketStream(store)
+    stream.broadcast(store.publish_rows({'crypto': _rows(1.0), 'forex': _rows(2.0)}))
+    subscriber = MarketSubscriber(websocket=None)
+    subscriber.subscribe(classes=['crypto'])
+    stream.subscribers.add(subscriber)
+
+    # Only forex changes, then crypto
+    stream.broadcast(store.publish_rows({'forex': _rows(3.0)}))
+    stream.broadcast(store.publish_rows({'crypto': _rows(4.0)}))
+    first, second = _drain(subscriber)
+    assert (first['from'], first['version'], first['data']) == (1, 2, {})
+    assert (second['from'], second['version']) == (2, 3)
+    assert second['data']['crypto']['updated'][0]['price'] == 4.0
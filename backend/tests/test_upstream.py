@@ -0,0 +1,167 @@
+"""AlphaVantageClient against a local stub of the Alpha Vantage API."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+import upstream
+from upstream import AlphaVantageClient, UpstreamError
+
+DAILY = {
+    'Time Series (Daily)': {
+        '2024-01-03': {'1. open': '101', '2. high': '103', '3. low': '100', '4. close': '102', '5. volume': '10'},
+        '2024-01-02': {'1. open': '100', '2. high': '102', '3. low': '99', '4. close': '101', '5. volume': '12'},
+    }
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queries = []
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        with server.lock:
+            server.queries.append(params)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            symbol = params.get('symbol', '')
+            status, payload = 200, DAILY
+            if symbol == 'BAD':
+                payload = {'Error Message': 'Invalid API call.'}
+            elif symbol == 'THROTTLED':
+                payload = {'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute.'}
+            elif symbol == 'DOWN':
+                status, payload = 503, {}
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    def start(delay: float = 0.0) -> StubServer:
+        server = StubServer(delay)
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(upstream, 'ALPHA_VANTAGE_BASE_URL', server.url)
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run(client: AlphaVantageClient, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_get_daily_sends_key_and_parses_series(stub):
+    server = stub()
+    client = AlphaVantageClient(api_key='secret')
+    series = run(client, client.get_daily('IBM', outputsize='full'))
+    assert series == DAILY['Time Series (Daily)']
+    assert server.queries == [{
+        'function': 'TIME_SERIES_DAILY', 'symbol': 'IBM', 'outputsize': 'full', 'apikey': 'secret',
+    }]
+
+
+def test_requests_reuse_pooled_connections(stub):
+    server = stub()
+    client = AlphaVantageClient(api_key='secret', max_concurrency=4)
+
+    async def sequential():
+        for _ in range(10):
+            await client.get_daily('IBM')
+
+    run(client, sequential())
+    assert len(server.queries) == 10
+    assert server.connections == 1
+
+
+def test_concurrency_is_bounded(stub):
+    server = stub(delay=0.05)
+    client = AlphaVantageClient(api_key='secret', max_concurrency=3)
+
+    async def burst():
+        return await asyncio.gather(*(client.get_daily('IBM') for _ in range(12)))
+
+    results = run(client, burst())
+    assert len(results) == 12
+    assert server.max_in_flight == 3
+    assert server.connections <= 3
+
+
+@pytest.mark.parametrize('symbol', ['BAD', 'THROTTLED'])
+def test_error_payloads_raise_upstream_error(stub, symbol):
+    stub()
+    client = AlphaVantageClient(api_key='secret')
+    with pytest.raises(UpstreamError, match='TIME_SERIES_DAILY'):
+        run(client, client.get_daily(symbol))
+
+
+def test_http_errors_raise(stub):
+    stub()
+    client = AlphaVantageClient(api_key='secret')
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, client.get_daily('DOWN'))
+
+
+def test_failures_do_not_leak_concurrency_slots(stub):
+    server = stub()
+    client = AlphaVantageClient(api_key='secret', max_concurrency=2)
+
+    async def mixed():
+        results = await asyncio.gather(*(client.get_daily(symbol) for symbol in ['DOWN', 'BAD'] * 3),
+                                       return_exceptions=True)
+        return results, await client.get_daily('IBM')
+
+    results, series = run(client, mixed())
+    assert all(isinstance(result, Exception) for result in results)
+    assert series == DAILY['Time Series (Daily)']
+    assert len(server.queries) == 7
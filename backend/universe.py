@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Mapping
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SYMBOL_UNIVERSE_PATH = os.getenv('SYMBOL_UNIVERSE_PATH', os.path.join(os.path.dirname(__file__), 'symbols.json'))
+
+
+class SymbolRegistry:
+    """The instruments we track, by asset class, in a stable order.
+
+    Each symbol maps to its upstream request: a ticker string, or a
+    [from, to] currency pair for forex.
+    """
+
+    def __init__(self, universe: Mapping[str, Mapping[str, Any]]):
+        self._universe: Dict[str, Dict[str, Any]] = {
+            asset_class: {
+                symbol: tuple(request) if isinstance(request, list) else request
+                for symbol, request in symbols.items()
+            }
+            for asset_class, symbols in universe.items()
+        }
+        self._symbols = {asset_class: list(symbols) for asset_class, symbols in self._universe.items()}
+        self._index = {
+            asset_class: {symbol: i for i, symbol in enumerate(symbols)}
+            for asset_class, symbols in self._symbols.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = SYMBOL_UNIVERSE_PATH) -> 'SymbolRegistry':
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @property
+    def asset_classes(self) -> List[str]:
+        return list(self._universe)
+
+    def symbols(self, asset_class: str) -> List[str]:
+        return self._symbols.get(asset_class, [])
+
+    def symbol_map(self, asset_class: str) -> Dict[str, Any]:
+        return self._universe.get(asset_class, {})
+
+    def index(self, asset_class: str, symbol: str) -> int:
+        """Position of symbol in its class, used to keep rows in order."""
+        return self._index[asset_class][symbol]
+
+    def shards(self, asset_class: str, shard_size: int) -> List[List[str]]:
+        """Split a class into contiguous shards of at most shard_size symbols."""
+        symbols = self.symbols(asset_class)
+        return [symbols[i:i + shard_size] for i in range(0, len(symbols), shard_size)]
+
+    def __len__(self) -> int:
+        return sum(len(symbols) for symbols in self._symbols.values())
+
+
+registry = SymbolRegistry.load()
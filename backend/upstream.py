@@ -0,0 +1,85 @@
+from typing import Any, Dict, Optional
+import asyncio
+import os
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ALPHA_VANTAGE_BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL', 'https://www.alphavantage.co')
+
+# Max in-flight requests per upstream provider
+PROVIDER_CONCURRENCY = {
+    'alpha_vantage': int(os.getenv('ALPHA_VANTAGE_CONCURRENCY', '8')),
+}
+
+
+class UpstreamError(Exception):
+    """Raised when a provider answers with an error or throttling payload."""
+
+
+class AlphaVantageClient:
+    """Async Alpha Vantage client sharing one keep-alive connection pool.
+
+    base_url can point at a local stub server that serves the same JSON
+    payloads as https://www.alphavantage.co/query.
+    """
+    provider = 'alpha_vantage'
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, timeout: float = 10.0):
+        self.api_key = api_key or os.getenv('ALPHA_VANTAGE_API_KEY')
+        self.base_url = base_url or ALPHA_VANTAGE_BASE_URL
+        self.max_concurrency = max_concurrency or PROVIDER_CONCURRENCY[self.provider]
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _session(self):
+        # The pool and semaphore belong to the loop that created them.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def query(self, **params) -> Dict[str, Any]:
+        client, semaphore = self._session()
+        async with semaphore:
+            response = await client.get('/query', params={**params, 'apikey': self.api_key})
+        response.raise_for_status()
+        data = response.json()
+        for key in ('Error Message', 'Note', 'Information'):
+            if key in data:
+                raise UpstreamError(f"{params.get('function')}: {data[key]}")
+        return data
+
+    async def get_daily(self, symbol: str, outputsize: str = 'compact') -> Dict[str, Dict[str, str]]:
+        """Daily bars keyed by date, newest first (like TimeSeries.get_daily)."""
+        data = await self.query(function='TIME_SERIES_DAILY', symbol=symbol, outputsize=outputsize)
+        return data['Time Series (Daily)']
+
+    async def get_currency_exchange_daily(self, from_symbol: str, to_symbol: str,
+                                          outputsize: str = 'compact') -> Dict[str, Dict[str, str]]:
+        """Daily FX bars keyed by date, newest first."""
+        data = await self.query(function='FX_DAILY', from_symbol=from_symbol,
+                                to_symbol=to_symbol, outputsize=outputsize)
+        return data['Time Series FX (Daily)']
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+alpha_vantage = AlphaVantageClient()
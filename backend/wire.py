@@ -0,0 +1,124 @@
+"""Response encodings negotiated from the Accept header.
+
+JSON is always available. MessagePack (for mobile clients) and Arrow IPC
+streams (for analytics) are offered when their libraries are installed,
+and are encoded from column arrays rather than from row dicts.
+"""
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+import orjson
+
+from snapshot import ListColumn
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+# Alternative spellings clients send for the same format
+MEDIA_ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+}
+FORMAT_SUFFIXES = {JSON: 'json', MSGPACK: 'msgpack', ARROW: 'arrow'}
+
+
+class ColumnTable(NamedTuple):
+    """Equal-length columns (numpy arrays, lists or ListColumns) plus
+    string metadata describing them."""
+    columns: Dict[str, Any]
+    metadata: Dict[str, str] = {}
+
+
+def binary_formats():
+    return tuple(media for media, lib in ((MSGPACK, msgpack), (ARROW, pa)) if lib is not None)
+
+
+def negotiate_format(accept: Optional[str], binary: bool = True) -> str:
+    """Pick JSON, MessagePack or Arrow from an Accept header.
+
+    A binary format is chosen only when named with a higher q than JSON
+    (or a wildcard); anything else gets JSON.
+    """
+    if not accept or not binary:
+        return JSON
+    weights: Dict[str, float] = {}
+    for part in accept.split(','):
+        media, *params = part.split(';')
+        media = media.strip().lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media = MEDIA_ALIASES.get(media, media)
+        weights[media] = max(q, weights.get(media, 0.0))
+    json_q = max(weights.get(media, 0.0) for media in (JSON, 'application/*', '*/*'))
+    best, best_q = JSON, json_q
+    for media in binary_formats():
+        if weights.get(media, 0.0) > best_q:
+            best, best_q = media, weights[media]
+    return best
+
+
+def encode_json(value: Any) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _msgpack_column(column: Any) -> Any:
+    if isinstance(column, ListColumn):
+        values, offsets = column.values.tolist(), column.offsets.tolist()
+        return [values[start:stop] for start, stop in zip(offsets, offsets[1:])]
+    if isinstance(column, np.ndarray):
+        return column.tolist()
+    return list(column)
+
+
+def encode_msgpack(table: ColumnTable) -> bytes:
+    """{"metadata": {...}, "columns": {name: [values]}}; list columns
+    become one array per row."""
+    return msgpack.packb({
+        'metadata': table.metadata,
+        'columns': {name: _msgpack_column(column) for name, column in table.columns.items()},
+    })
+
+
+def _arrow_array(column: Any):
+    if isinstance(column, ListColumn):
+        return pa.ListArray.from_arrays(pa.array(column.offsets.astype(np.int32)), pa.array(column.values))
+    return pa.array(column)
+
+
+def encode_arrow(table: ColumnTable) -> bytes:
+    """The table as an Arrow IPC stream holding one record batch."""
+    batch = pa.RecordBatch.from_arrays(
+        [_arrow_array(column) for column in table.columns.values()],
+        names=list(table.columns),
+    )
+    if table.metadata:
+        batch = batch.replace_schema_metadata(table.metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS: Dict[str, Callable[[ColumnTable], bytes]] = {MSGPACK: encode_msgpack, ARROW: encode_arrow}
+
+
+def rows_to_table(rows, fields, metadata: Optional[Dict[str, str]] = None) -> ColumnTable:
+    """ColumnTable from a short list of row dicts (e.g. signals)."""
+    return ColumnTable({field: [row[field] for row in rows] for field in fields}, metadata or {})
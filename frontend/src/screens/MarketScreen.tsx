@@ -28,8 +28,16 @@ const MarketScreen = () => {
 
   const fetchMarketData = async () => {
     try {
-      const response = await axios.get<MarketResponse>('http://localhost:8000/market/analysis');
-      setMarketData(response.data[selectedAsset as keyof MarketResponse]);
+      // Only download the selected class; 'all' is joined here instead of
+      // receiving every row twice
+      const params = selectedAsset === 'all' ? { all: false } : { classes: selectedAsset, all: false };
+      const response = await axios.get<Partial<MarketResponse>>('http://localhost:8000/market/analysis', { params });
+      const { crypto = [], forex = [], stocks = [] } = response.data;
+      setMarketData(
+        selectedAsset === 'all'
+          ? [...crypto, ...forex, ...stocks]
+          : response.data[selectedAsset as keyof MarketResponse] ?? []
+      );
     } catch (error) {
       console.error('Error fetching market data:', error);
     } finally {